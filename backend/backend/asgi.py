@@ -13,12 +13,12 @@ django_asgi_app = get_asgi_application()
 
 # Now that settings are loaded, you can safely import other components
 from channels.routing import ProtocolTypeRouter, URLRouter
-from channels.auth import AuthMiddlewareStack
+from chat.middleware import JWTAuthMiddlewareStack
 import chat.routing
 
 application = ProtocolTypeRouter({
     "http": django_asgi_app,  # Use the initialized app
-    "websocket": AuthMiddlewareStack(
+    "websocket": JWTAuthMiddlewareStack(
         URLRouter(
             chat.routing.websocket_urlpatterns
         )
@@ -0,0 +1,13 @@
+"""
+Celery application for background work (e.g. push delivery).
+
+Start a worker with: celery -A backend worker
+"""
+import os
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+
+app = Celery('backend')
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
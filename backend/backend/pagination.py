@@ -0,0 +1,167 @@
+"""
+Pagination classes shared by the API apps.
+"""
+import base64
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(PageNumberPagination):
+    """
+    Page number pagination with an opt-in keyset (cursor) mode.
+
+    Without a ``cursor`` query parameter this behaves exactly like the global
+    ``PageNumberPagination``. Passing ``?cursor=`` (empty for the first page)
+    switches to keyset mode, which seeks on ``keyset_fields`` instead of using
+    ``OFFSET`` and skips the ``COUNT(*)`` query entirely.
+
+    In keyset mode ``?direction=older`` (the default) walks back in time and
+    ``?direction=newer`` walks forward from the cursor. Results are always
+    returned in the feed's display order: newest first, or oldest first when
+    ``ascending`` is set (e.g. chat history). The response carries ``older``
+    and ``newer`` links for loading further pages in either direction. New
+    rows only ever appear at the newer end, so the ``newer`` link is kept
+    even when nothing newer exists yet and can be polled.
+
+    Keyset mode can only walk the ``keyset_fields`` order in the display
+    direction. A queryset sorted any other way (``?ordering=price``,
+    ``?ordering=created_at`` on a newest-first feed, search relevance) is
+    paginated by page number instead, even when a cursor is passed.
+    """
+
+    cursor_query_param = 'cursor'
+    direction_query_param = 'direction'
+    keyset_fields = ('created_at', 'id')
+    ascending = False
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset_mode = (
+            self.cursor_query_param in request.query_params and self.keyset_ordered(queryset)
+        )
+        if not self.keyset_mode:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.direction = request.query_params.get(self.direction_query_param, 'older')
+        if self.direction not in ('older', 'newer'):
+            raise NotFound("Invalid direction.")
+        self.cursor = self.decode_cursor(request.query_params[self.cursor_query_param], queryset.model)
+
+        newer = self.direction == 'newer'
+        order = list(self.keyset_fields) if newer else [f'-{field}' for field in self.keyset_fields]
+        queryset = queryset.order_by(*order)
+        if self.cursor is not None:
+            queryset = queryset.filter(self._seek_filter(self.cursor, newer))
+
+        rows = list(queryset[:self.page_size + 1])
+        self.has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+
+        # Rows were fetched walking away from the cursor; flip them into display order.
+        if newer != self.ascending:
+            rows.reverse()
+        self.page_rows = rows
+        return rows
+
+    def keyset_ordered(self, queryset):
+        """
+        True if the queryset is unordered or sorted by a prefix of
+        ``keyset_fields`` in the feed's display direction.
+        """
+        order = queryset.query.order_by
+        if not all(isinstance(field, str) for field in order):
+            return False
+        prefix = '' if self.ascending else '-'
+        expected = tuple(f'{prefix}{field}' for field in self.keyset_fields)
+        return tuple(order) == expected[:len(order)]
+
+    def _seek_filter(self, values, newer):
+        # (a, b) > (x, y)  ==  a > x OR (a = x AND b > y), expanded for any number of fields.
+        lookup = 'gt' if newer else 'lt'
+        condition = Q()
+        for i, field in enumerate(self.keyset_fields):
+            term = Q(**{f'{field}__{lookup}': values[i]})
+            for prev_field, prev_value in zip(self.keyset_fields[:i], values[:i]):
+                term &= Q(**{prev_field: prev_value})
+            condition |= term
+        return condition
+
+    def get_paginated_response(self, data):
+        if not self.keyset_mode:
+            return super().get_paginated_response(data)
+        return Response(OrderedDict([
+            ('older', self.get_older_link()),
+            ('newer', self.get_newer_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema['properties'].update({
+            'older': {'type': 'string', 'nullable': True, 'format': 'uri'},
+            'newer': {'type': 'string', 'nullable': True, 'format': 'uri'},
+        })
+        return response_schema
+
+    # ============ Cursor helpers ============
+
+    def encode_cursor(self, row):
+        values = []
+        for field in self.keyset_fields:
+            value = getattr(row, field)
+            values.append(value.isoformat() if hasattr(value, 'isoformat') else value)
+        return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+    def decode_cursor(self, encoded, model):
+        """Decode a cursor into one value per keyset field, converted for ``model``'s fields."""
+        if not encoded:
+            return None
+        try:
+            values = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+        except (TypeError, ValueError, UnicodeDecodeError):
+            raise NotFound("Invalid cursor.")
+        if not isinstance(values, list) or len(values) != len(self.keyset_fields):
+            raise NotFound("Invalid cursor.")
+
+        decoded = []
+        for field_name, value in zip(self.keyset_fields, values):
+            if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+                raise NotFound("Invalid cursor.")
+            try:
+                value = model._meta.get_field(field_name).to_python(value)
+            except (ValidationError, TypeError, ValueError):
+                raise NotFound("Invalid cursor.")
+            if value is None:
+                raise NotFound("Invalid cursor.")
+            decoded.append(value)
+        return decoded
+
+    def _link(self, row, direction):
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.page_query_param)
+        url = replace_query_param(url, self.cursor_query_param, self.encode_cursor(row))
+        return replace_query_param(url, self.direction_query_param, direction)
+
+    def _edge_rows(self):
+        # Oldest and newest rows on the page, whatever the display order.
+        if self.ascending:
+            return self.page_rows[0], self.page_rows[-1]
+        return self.page_rows[-1], self.page_rows[0]
+
+    def get_older_link(self):
+        if not self.page_rows or (self.direction == 'older' and not self.has_more):
+            return None
+        return self._link(self._edge_rows()[0], 'older')
+
+    def get_newer_link(self):
+        if not self.page_rows:
+            return None
+        return self._link(self._edge_rows()[1], 'newer')
@@ -28,6 +28,9 @@ ALLOWED_HOSTS = [
     'jugaadu.vercel.app',
 ]
 
+# Product views are buffered in this cache (see products.counters) and only
+# written to the database by `manage.py flush_view_counts --interval N`, which
+# must run as its own long-lived process next to the web workers.
 CACHES = {
     'default': {
         'BACKEND': 'django_redis.cache.RedisCache',
@@ -148,6 +151,9 @@ CLOUDINARY_STORAGE = {
 }
 DEFAULT_FILE_STORAGE = 'cloudinary_storage.storage.MediaCloudinaryStorage'
 MEDIA_URL = '/media/'
+# Prefix for relative media URLs in API payloads built without a request
+# (WebSocket and Pusher events), e.g. avatars in chat messages.
+MEDIA_BASE_URL = os.getenv('MEDIA_BASE_URL', 'http://localhost:8000')
 MEDIA_ROOT = BASE_DIR / 'media'
 
 
@@ -187,13 +193,82 @@ CORS_ALLOW_ALL_ORIGINS = DEBUG
 
 
 # Channels settings for WebSocket support
-CHANNEL_LAYERS = {
-    "default": {
-        "BACKEND": "channels.layers.InMemoryChannelLayer",
-    },
+# The in-memory layer only reaches sockets in the same process. Set CHANNEL_REDIS_URLS
+# (comma separated) to share the user_{id} / conversation_{id} groups across Daphne
+# workers; channels_redis shards channels and groups across all listed servers.
+CHANNEL_REDIS_URLS = [url.strip() for url in os.getenv('CHANNEL_REDIS_URLS', '').split(',') if url.strip()]
+if CHANNEL_REDIS_URLS:
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "channels_redis.core.RedisChannelLayer",
+            "CONFIG": {
+                "hosts": CHANNEL_REDIS_URLS,
+                "prefix": os.getenv('CHANNEL_LAYER_PREFIX', 'jugaadu'),
+                "capacity": int(os.getenv('CHANNEL_LAYER_CAPACITY', '1000')),
+                "expiry": 60,
+                "group_expiry": 86400,
+            },
+        },
+    }
+else:
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "channels.layers.InMemoryChannelLayer",
+        },
+    }
+
+# WebSocket JWT auth: decoded tokens are cached (in process and in CACHES) for at
+# most this many seconds, and never past the token's own expiry.
+WEBSOCKET_AUTH_CACHE_TTL = 300
+WEBSOCKET_AUTH_CACHE_SIZE = 1024
+
+# "Read up to" receipts from a socket are coalesced for this many seconds and
+# then applied with one UPDATE per conversation.
+CHAT_READ_RECEIPT_DEBOUNCE = 0.5
+
+# Presence: a socket must send a frame (or a heartbeat) at least this often to
+# keep its user online. Typing broadcasts are limited to one per interval.
+CHAT_PRESENCE_TIMEOUT = 60
+CHAT_PRESENCE_MAX_SUBSCRIPTIONS = 200
+CHAT_TYPING_INTERVAL = 3
+# Conversations a single socket may follow with subscribe_conversations.
+CHAT_MAX_CONVERSATION_SUBSCRIPTIONS = 100
+
+# Token-bucket limits per incoming WebSocket frame type, as (tokens per second,
+# burst) for each socket and for each user across their sockets in a process.
+# Frame types not listed use 'default'. Excess frames are dropped.
+CHAT_RATE_LIMITS = {
+    'send_message': {'connection': (5, 20), 'user': (10, 40)},
+    'typing': {'connection': (2, 5), 'user': (4, 10)},
+    'mark_read': {'connection': (10, 50), 'user': (20, 100)},
+    'mark_read_up_to': {'connection': (5, 20), 'user': (10, 40)},
+    'default': {'connection': (10, 30), 'user': (20, 60)},
+}
+# Outbound events are written straight to the socket. The ASGI server (Daphne)
+# buffers writes in its transport and gives the consumer no signal when a
+# client falls behind, so there is no outbound queue to drop from; instead the
+# noisy events are bounded where they are produced (typing by
+# CHAT_TYPING_INTERVAL, read receipts by CHAT_READ_RECEIPT_DEBOUNCE).
+
+# Messages sent over the WebSocket are saved in micro-batches: up to BATCH_SIZE
+# messages, or whatever arrived within LINGER seconds (see chat/ingest.py).
+CHAT_INGEST = {
+    "BATCH_SIZE": 100,
+    "LINGER": 0.02,
+}
+
+# Chat attachments are uploaded straight to storage (chat/attachments.py).
+# BACKEND is 'cloudinary' (signed direct uploads) or 'local' (MEDIA_ROOT, for
+# development and tests). Image thumbnails for 'local' are made by THUMBNAIL_BACKEND:
+# 'thread' or 'celery'.
+CHAT_ATTACHMENTS = {
+    "BACKEND": os.getenv('CHAT_ATTACHMENT_BACKEND', 'cloudinary' if os.getenv('CLOUDINARY_CLOUD_NAME') else 'local'),
+    "MAX_SIZE": 25 * 1024 * 1024,
+    "THUMBNAIL_SIZE": (320, 320),
+    "THUMBNAIL_BACKEND": os.getenv('CHAT_THUMBNAIL_BACKEND', 'thread'),
 }
 
-# Pusher configuration (used directly via pusher SDK in signals/views)
+# Pusher configuration (used via the delivery queue in notifications/delivery.py)
 PUSHER_CONFIG = {
     "app_id": os.getenv('PUSHER_APP_ID'),
     "key": os.getenv('PUSHER_KEY'),
@@ -202,6 +277,37 @@ PUSHER_CONFIG = {
     "ssl": True,
 }
 
+# Pusher events are sent after commit, in batches, off the request thread.
+# BACKEND is 'thread' (in-process pool) or 'celery' (needs a running Celery worker).
+PUSH_DELIVERY = {
+    "BACKEND": os.getenv('PUSH_DELIVERY_BACKEND', 'thread'),
+    "BATCH_SIZE": 10,  # Pusher's trigger_batch limit
+    "LINGER": 0.05,  # seconds to wait for more events before sending a batch
+    "WORKERS": 2,
+    "MAX_RETRIES": 3,
+    "RETRY_BACKOFF": 0.5,  # seconds, doubled on every retry
+}
+
+# How notifications reach clients: 'pusher' and/or 'stream' (the SSE endpoint
+# at /api/notifications/stream/, fed by the channel layer).
+NOTIFICATION_DELIVERY = [
+    backend.strip() for backend in os.getenv('NOTIFICATION_DELIVERY', 'pusher,stream').split(',') if backend.strip()
+]
+
+# Notification coalescing: repeated events of the same type and target within the
+# window (seconds) update one unread notification instead of creating new ones.
+NOTIFICATION_COALESCE_WINDOWS = {
+    'product_like': 60 * 10,
+    'message': 60 * 2,
+}
+# Pushes for a coalesced notification are sent at most once per this many seconds.
+NOTIFICATION_COALESCE_PUSH_INTERVAL = 10
+
+# Celery
+CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', os.getenv('REDIS_URL'))
+CELERY_TASK_SERIALIZER = 'json'
+CELERY_ACCEPT_CONTENT = ['json']
+
 
 # Email settings (for development)
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
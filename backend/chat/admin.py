@@ -18,7 +18,7 @@ class ConversationAdmin(admin.ModelAdmin):
     list_display = ['id', 'get_participants', 'product', 'created_at', 'updated_at']
     list_filter = ['created_at', 'updated_at']
     search_fields = ['participants__username', 'product__title']
-    readonly_fields = ['created_at', 'updated_at']
+    readonly_fields = ['last_message', 'last_message_at', 'last_message_preview', 'created_at', 'updated_at']
     inlines = [MessageInline]
     
     def get_participants(self, obj):
@@ -0,0 +1,316 @@
+"""
+Upload pipeline for chat attachments.
+
+1. ``POST /api/chat/attachments/`` registers the file and returns upload
+   instructions for the configured storage backend.
+2. The client uploads the file straight to storage: a signed direct upload
+   to Cloudinary, or (``local`` backend, for development and tests) a signed
+   PUT to ``/api/chat/attachments/<id>/upload/`` that is streamed to disk.
+3. ``POST /api/chat/attachments/<id>/complete/`` checks the stored object and
+   schedules a size-bounded thumbnail for images in the background.
+4. Messages reference the attachment by id (``attachment_ids``).
+5. Downloads go through ``/api/chat/attachments/<id>/download/`` with a
+   signed link; the requester must take part in the attachment's
+   conversation. Local files are streamed, Cloudinary files redirect.
+
+The file bytes never pass through a Daphne worker when Cloudinary is used.
+"""
+import logging
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core import signing
+from django.db import connection, transaction
+from django.urls import reverse
+from django.utils._os import safe_join
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'BACKEND': 'local',
+    'LOCAL_ROOT': os.path.join(settings.MEDIA_ROOT, 'chat_attachments'),
+    'MAX_SIZE': 25 * 1024 * 1024,
+    'UPLOAD_EXPIRY': 15 * 60,
+    'DOWNLOAD_EXPIRY': 24 * 60 * 60,
+    'THUMBNAIL_SIZE': (320, 320),
+    'THUMBNAIL_BACKEND': 'thread',
+}
+
+UPLOAD_SALT = 'chat.attachment.upload'
+DOWNLOAD_SALT = 'chat.attachment.download'
+CHUNK_SIZE = 64 * 1024
+
+# Types a browser may render inline; anything else is served as a download.
+INLINE_CONTENT_TYPES = {'image/jpeg', 'image/png', 'image/gif', 'image/webp'}
+
+
+def get_setting(name):
+    return getattr(settings, 'CHAT_ATTACHMENTS', {}).get(name, DEFAULTS[name])
+
+
+def file_type_for(content_type):
+    if content_type.startswith('image/'):
+        return 'image'
+    if content_type in ('application/pdf', 'text/plain') or content_type.startswith('application/vnd.'):
+        return 'document'
+    return 'other'
+
+
+# ============ Storage backends ============
+
+class LocalAttachmentStorage:
+    """Filesystem stand-in for the object store."""
+
+    def __init__(self):
+        self.root = get_setting('LOCAL_ROOT')
+
+    def path(self, key):
+        return safe_join(self.root, key)
+
+    def upload_instructions(self, attachment, request):
+        token = signing.dumps({'id': attachment.id, 'key': attachment.storage_key}, salt=UPLOAD_SALT)
+        url = reverse('attachment-upload', args=[attachment.id])
+        return {
+            'method': 'PUT',
+            'url': request.build_absolute_uri(f'{url}?token={token}'),
+            'headers': {'Content-Type': attachment.content_type},
+            'fields': {},
+        }
+
+    def write_stream(self, key, stream, max_size):
+        """Copy ``stream`` to storage in chunks. Returns the size, or None if over ``max_size``."""
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        partial_path = f'{path}.part'
+        size = 0
+        with open(partial_path, 'wb') as out:
+            for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                size += len(chunk)
+                if size > max_size:
+                    break
+                out.write(chunk)
+        if size > max_size:
+            os.remove(partial_path)
+            return None
+        os.replace(partial_path, path)
+        return size
+
+    def size(self, attachment):
+        try:
+            return os.path.getsize(self.path(attachment.storage_key))
+        except OSError:
+            return None
+
+    def open(self, key):
+        return open(self.path(key), 'rb')
+
+
+class CloudinaryAttachmentStorage:
+    """Signed direct uploads to Cloudinary; thumbnails are Cloudinary transformations."""
+
+    def resource_type(self, attachment):
+        return 'image' if attachment.file_type == 'image' else 'raw'
+
+    def upload_instructions(self, attachment, request):
+        import time
+        import cloudinary
+        from cloudinary.utils import api_sign_request
+
+        config = cloudinary.config()
+        params = {'public_id': attachment.storage_key, 'timestamp': int(time.time())}
+        params['signature'] = api_sign_request(params, config.api_secret)
+        params['api_key'] = config.api_key
+        resource_type = self.resource_type(attachment)
+        return {
+            'method': 'POST',
+            'url': f'https://api.cloudinary.com/v1_1/{config.cloud_name}/{resource_type}/upload',
+            'headers': {},
+            'fields': params,
+        }
+
+    def size(self, attachment):
+        import cloudinary.api
+        try:
+            resource = cloudinary.api.resource(attachment.storage_key, resource_type=self.resource_type(attachment))
+        except Exception:
+            return None
+        return resource.get('bytes')
+
+    def url(self, attachment, thumbnail=False):
+        """The CDN address the download view redirects to."""
+        from cloudinary.utils import cloudinary_url
+
+        options = {'resource_type': self.resource_type(attachment), 'secure': True}
+        if thumbnail:
+            width, height = get_setting('THUMBNAIL_SIZE')
+            options.update(crop='limit', width=width, height=height)
+        return cloudinary_url(attachment.storage_key, **options)[0]
+
+
+_storage = None
+
+
+def get_storage():
+    global _storage
+    if _storage is None:
+        backend = get_setting('BACKEND')
+        _storage = CloudinaryAttachmentStorage() if backend == 'cloudinary' else LocalAttachmentStorage()
+    return _storage
+
+
+def is_local():
+    return isinstance(get_storage(), LocalAttachmentStorage)
+
+
+# ============ Pipeline ============
+
+def new_storage_key(file_name):
+    extension = os.path.splitext(file_name)[1].lower()[:10]
+    if is_local():
+        return f'{uuid.uuid4().hex}{extension}'
+    # Cloudinary keeps the extension of raw files in the public id
+    return f'chat_attachments/{uuid.uuid4().hex}' + ('' if extension in ('.jpg', '.jpeg', '.png', '.gif', '.webp') else extension)
+
+
+def check_upload_token(attachment, token):
+    try:
+        data = signing.loads(token, salt=UPLOAD_SALT, max_age=get_setting('UPLOAD_EXPIRY'))
+    except signing.BadSignature:
+        return False
+    return data == {'id': attachment.id, 'key': attachment.storage_key}
+
+
+def download_url(attachment, thumbnail=False, request=None):
+    """
+    A signed, expiring download link. When built for an authenticated request
+    it names that user, so it works in <img> tags without a JWT; otherwise the
+    client must send its access token with the download.
+    """
+    user = getattr(request, 'user', None)
+    signature = signing.dumps({
+        'id': attachment.id,
+        'key': attachment.thumbnail_key if thumbnail and is_local() else attachment.storage_key,
+        'thumbnail': bool(thumbnail),
+        'user': user.id if user is not None and user.is_authenticated else None,
+    }, salt=DOWNLOAD_SALT)
+    url = f"{reverse('attachment-download', args=[attachment.id])}?sig={signature}"
+    return request.build_absolute_uri(url) if request is not None else url
+
+
+def check_download_signature(attachment, signature):
+    """
+    Return the signed link's data (``key``, ``thumbnail`` and ``user``) if it
+    is valid for ``attachment``, or None.
+    """
+    try:
+        data = signing.loads(signature, salt=DOWNLOAD_SALT, max_age=get_setting('DOWNLOAD_EXPIRY'))
+    except signing.BadSignature:
+        return None
+    if not isinstance(data, dict) or data.get('id') != attachment.id:
+        return None
+    if not data.get('key') or data['key'] not in (attachment.storage_key, attachment.thumbnail_key):
+        return None
+    return data
+
+
+def can_download(attachment, user_id):
+    """Participants of the attachment's conversation, or the uploader before it is sent."""
+    from .models import Conversation
+
+    if user_id is None:
+        return False
+    if attachment.message_id is None:
+        return attachment.uploader_id == user_id
+    return Conversation.objects.filter(messages__id=attachment.message_id, participants__id=user_id).exists()
+
+
+def is_inline_safe(content_type):
+    return content_type.split(';')[0].strip().lower() in INLINE_CONTENT_TYPES
+
+
+def complete_upload(attachment):
+    """
+    Confirm the uploaded object exists and is within MAX_SIZE, record its
+    real size and mark the attachment usable. Returns False otherwise.
+    """
+    size = get_storage().size(attachment)
+    if size is None or size > get_setting('MAX_SIZE'):
+        return False
+
+    attachment.file_size = size
+    # Cloudinary renders thumbnails on request; local images get one in the background.
+    needs_thumbnail = attachment.file_type == 'image' and is_local()
+    attachment.status = 'uploaded' if needs_thumbnail else 'ready'
+    attachment.save(update_fields=['file_size', 'status'])
+    if needs_thumbnail:
+        schedule_thumbnail(attachment.id)
+    return True
+
+
+def attach_to_message(message, attachment_ids, user_id):
+    """Link the user's completed, unattached uploads to a message. Returns how many were linked."""
+    from .models import MessageAttachment
+
+    if not attachment_ids:
+        return 0
+    return MessageAttachment.objects.filter(
+        id__in=attachment_ids, uploader_id=user_id, message__isnull=True, status__in=('uploaded', 'ready')
+    ).update(message=message)
+
+
+# ============ Thumbnails ============
+
+def make_thumbnail(attachment_id):
+    """Write a thumbnail no larger than THUMBNAIL_SIZE for a locally stored image."""
+    from PIL import Image
+    from .models import MessageAttachment
+
+    attachment = MessageAttachment.objects.filter(id=attachment_id, status='uploaded').first()
+    if attachment is None:
+        return
+    storage = get_storage()
+    thumbnail_key = f'thumbnails/{os.path.splitext(attachment.storage_key)[0]}.jpg'
+    try:
+        with storage.open(attachment.storage_key) as source, Image.open(source) as image:
+            # Lets JPEG decode at reduced size instead of the full resolution
+            image.draft('RGB', get_setting('THUMBNAIL_SIZE'))
+            image.thumbnail(get_setting('THUMBNAIL_SIZE'))
+            path = storage.path(thumbnail_key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            image.convert('RGB').save(path, 'JPEG', quality=80)
+    except Exception as e:
+        logger.error("Could not make a thumbnail for attachment %s: %s", attachment_id, e)
+        MessageAttachment.objects.filter(id=attachment_id).update(status='failed')
+        return
+    MessageAttachment.objects.filter(id=attachment_id).update(thumbnail_key=thumbnail_key, status='ready')
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _run_in_thread(attachment_id):
+    try:
+        make_thumbnail(attachment_id)
+    finally:
+        connection.close()
+
+
+def schedule_thumbnail(attachment_id):
+    """Make the thumbnail after commit, in a Celery worker or a background thread."""
+    def submit():
+        global _executor
+        if get_setting('THUMBNAIL_BACKEND') == 'celery':
+            from .tasks import make_attachment_thumbnail
+            make_attachment_thumbnail.delay(attachment_id)
+            return
+        if _executor is None:
+            with _executor_lock:
+                if _executor is None:
+                    _executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='attachment-thumbnails')
+        _executor.submit(_run_in_thread, attachment_id)
+
+    transaction.on_commit(submit)
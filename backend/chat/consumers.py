@@ -1,80 +1,65 @@
 # chat/consumers.py
 
+import asyncio
 import json
+import logging
+import time
+import uuid
+from asgiref.sync import sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import AnonymousUser
-from rest_framework_simplejwt.tokens import UntypedToken
-from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
-from jwt import decode as jwt_decode
-from django.conf import settings
-from .models import Conversation, Message
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from users.snapshots import UserSnapshot
+from . import events, ingest, presence, throttle
+from .models import Conversation, ConversationParticipant, Message
 
 User = get_user_model()
+logger = logging.getLogger(__name__)
 
-@database_sync_to_async
-def get_user_from_token(token_string):
-    """
-    Authenticates a user from a JWT token string with debugging.
-    """
-    print(f"Attempting to validate token: {token_string[:30]}...") # Print first 30 chars
-    try:
-        UntypedToken(token_string)
-
-        decoded_data = jwt_decode(token_string, settings.SECRET_KEY, algorithms=["HS256"])
-        user_id = decoded_data.get('user_id')
-        print(f"Token decoded successfully. User ID: {user_id}")
-
-        if user_id:
-            user = User.objects.get(id=user_id)
-            print(f"User found: {user.username}")
-            return user
+# Cache.aadd() runs on the ORM's thread; the typing throttle shouldn't wait for it
+cache_add = sync_to_async(cache.add, thread_sensitive=False)
 
-        print("User ID not in token.")
-        return AnonymousUser()
+# Longest temporary message id a client may send; it is echoed to the room
+CLIENT_ID_MAX_LENGTH = 64
 
-    except (InvalidToken, TokenError, User.DoesNotExist) as e:
-        # Print the specific error!
-        print(f"❌ TOKEN VALIDATION FAILED: {e}") 
-        return AnonymousUser()
-    """
-    Authenticates a user from a JWT token string.
-    """
-    try:
-        # This will validate the token's signature and expiration
-        UntypedToken(token_string)
-        
-        # Decode the token to get the user_id
-        decoded_data = jwt_decode(token_string, settings.SECRET_KEY, algorithms=["HS256"])
-        user_id = decoded_data.get('user_id')
-        
-        if user_id:
-            return User.objects.get(id=user_id)
-        return AnonymousUser()
-        
-    except (InvalidToken, TokenError, User.DoesNotExist):
-        return AnonymousUser()
 
 class ChatConsumer(AsyncWebsocketConsumer):
     """WebSocket consumer for real-time chat"""
     
     async def connect(self):
         """Handle WebSocket connection"""
-        # Get token from query string
-        query_string = self.scope['query_string'].decode()
-        params = dict(p.split('=') for p in query_string.split('&'))
-        token = params.get('token')
-
-        if token:
-            self.user = await get_user_from_token(token)
-        else:
-            self.user = self.scope.get('user', AnonymousUser())
+        # Authenticated by JWTAuthMiddleware from the `token` query parameter
+        user = self.scope.get('user', AnonymousUser())
         
-        if not self.user.is_authenticated:
+        if not user.is_authenticated:
             await self.close()
             return
         
+        # Keep only the compact public snapshot for the lifetime of the socket
+        self.user = user if isinstance(user, UserSnapshot) else UserSnapshot.from_user(user)
+        
+        self.limiter = throttle.FrameLimiter(self.user.id)
+        self.throttle_notified = {}
+        
+        # Highest message id read per conversation, waiting for the debounced flush
+        self.pending_reads = {}
+        # The debounced flush while it waits, and every flush still running
+        self.read_flush_task = None
+        self.read_flushes = set()
+        # Last typing broadcast per conversation group, and subscribed presence groups
+        self.typing_sent = {}
+        self.presence_subscriptions = set()
+        # Conversations followed through subscribe_conversations, besides the joined one
+        self.subscribed_conversations = set()
+        # Conversations this user is known to take part in, to skip the check per message
+        self.participant_conversations = set()
+        
         self.user_group_name = f"user_{self.user.id}"
         await self.channel_layer.group_add(
             self.user_group_name,
@@ -82,9 +67,33 @@ class ChatConsumer(AsyncWebsocketConsumer):
         )
         
         await self.accept()
+        
+        came_online = await presence.aconnect(self.user.id)
+        self.last_heartbeat = time.monotonic()
+        if came_online:
+            await self.broadcast_presence(online=True)
     
     async def disconnect(self, close_code):
         """Handle WebSocket disconnection"""
+        if hasattr(self, 'limiter'):
+            self.limiter.close()
+        
+        if getattr(self, 'read_flush_task', None):
+            # Still waiting out the debounce; its receipts are flushed below.
+            self.read_flush_task.cancel()
+        if getattr(self, 'read_flushes', None):
+            # A flush already writing has taken its receipts out of pending_reads.
+            await asyncio.gather(*self.read_flushes, return_exceptions=True)
+        if getattr(self, 'pending_reads', None):
+            await self.flush_read_receipts()
+        
+        for user_id in getattr(self, 'presence_subscriptions', ()):
+            await self.channel_layer.group_discard(presence.group_name(user_id), self.channel_name)
+        if hasattr(self, 'last_heartbeat'):
+            went_offline = await presence.adisconnect(self.user.id)
+            if went_offline:
+                await self.broadcast_presence(online=False)
+        
         if hasattr(self, 'user_group_name'):
             await self.channel_layer.group_discard(
                 self.user_group_name,
@@ -96,14 +105,30 @@ class ChatConsumer(AsyncWebsocketConsumer):
                 self.conversation_group_name,
                 self.channel_name
             )
+        
+        for conversation_id in getattr(self, 'subscribed_conversations', ()):
+            await self.channel_layer.group_discard(f"conversation_{conversation_id}", self.channel_name)
     
     async def receive(self, text_data):
         """Handle incoming WebSocket messages"""
         try:
             data = json.loads(text_data)
+            if not isinstance(data, dict):
+                await self.send_error('Expected a JSON object')
+                return
             message_type = data.get('type')
             
-            if message_type == 'join_conversation':
+            # Any frame proves the socket is alive
+            await self.touch_presence()
+            
+            if not self.limiter.allow(str(message_type)):
+                await self.throttled(message_type)
+                return
+            
+            if message_type == 'heartbeat':
+                pass
+            
+            elif message_type == 'join_conversation':
                 await self.join_conversation(data.get('conversation_id'))
             
             elif message_type == 'leave_conversation':
@@ -117,6 +142,21 @@ class ChatConsumer(AsyncWebsocketConsumer):
             
             elif message_type == 'mark_read':
                 await self.mark_message_read_handler(data.get('message_id'))
+            
+            elif message_type == 'mark_read_up_to':
+                await self.mark_read_up_to_handler(data)
+            
+            elif message_type == 'subscribe_conversations':
+                await self.subscribe_conversations(data.get('conversation_ids'))
+            
+            elif message_type == 'unsubscribe_conversations':
+                await self.unsubscribe_conversations(data.get('conversation_ids'))
+            
+            elif message_type == 'subscribe_presence':
+                await self.subscribe_presence(data.get('user_ids'))
+            
+            elif message_type == 'unsubscribe_presence':
+                await self.unsubscribe_presence(data.get('user_ids'))
         
         except json.JSONDecodeError:
             await self.send_error('Invalid JSON')
@@ -126,16 +166,24 @@ class ChatConsumer(AsyncWebsocketConsumer):
         if not conversation_id:
             await self.send_error('Conversation ID not provided')
             return
+        try:
+            conversation_id = int(conversation_id)
+        except (TypeError, ValueError):
+            await self.send_error('Invalid conversation ID')
+            return
         
         is_participant = await self.is_conversation_participant(conversation_id)
         if not is_participant:
             await self.send_error('Not authorized for this conversation')
             return
         
+        self.participant_conversations.add(conversation_id)
+        
         # Leave previous conversation group if exists
         await self.leave_conversation()
         
         # Join new conversation group
+        self.conversation_id = conversation_id
         self.conversation_group_name = f"conversation_{conversation_id}"
         await self.channel_layer.group_add(
             self.conversation_group_name,
@@ -150,61 +198,186 @@ class ChatConsumer(AsyncWebsocketConsumer):
     async def leave_conversation(self):
         """Leave the current conversation room"""
         if hasattr(self, 'conversation_group_name'):
-            await self.channel_layer.group_discard(
-                self.conversation_group_name,
-                self.channel_name
-            )
+            # Stay in the group if the conversation is also subscribed to
+            if self.conversation_id not in self.subscribed_conversations:
+                await self.channel_layer.group_discard(
+                    self.conversation_group_name,
+                    self.channel_name
+                )
             delattr(self, 'conversation_group_name')
+            delattr(self, 'conversation_id')
+    
+    async def subscribe_conversations(self, conversation_ids):
+        """Follow several conversations at once; participation is checked in one query."""
+        try:
+            conversation_ids = {int(conversation_id) for conversation_id in conversation_ids or []}
+        except (TypeError, ValueError):
+            await self.send_error('conversation_ids must be a list of ids')
+            return
+        
+        new_ids = conversation_ids - self.subscribed_conversations
+        limit = getattr(settings, 'CHAT_MAX_CONVERSATION_SUBSCRIPTIONS', 100)
+        if len(self.subscribed_conversations) + len(new_ids) > limit:
+            await self.send_error(f'Cannot subscribe to more than {limit} conversations')
+            return
+        
+        allowed = await self.participant_conversation_ids(new_ids) if new_ids else set()
+        for conversation_id in allowed:
+            await self.channel_layer.group_add(f"conversation_{conversation_id}", self.channel_name)
+        self.subscribed_conversations |= allowed
+        self.participant_conversations |= allowed
+        
+        await self.send(text_data=json.dumps({
+            'type': 'subscribed_conversations',
+            'conversation_ids': sorted(self.subscribed_conversations & conversation_ids),
+            'denied': sorted(new_ids - allowed),
+        }))
+    
+    async def unsubscribe_conversations(self, conversation_ids):
+        for conversation_id in conversation_ids or []:
+            conversation_id = int(conversation_id) if str(conversation_id).isdigit() else None
+            if conversation_id not in self.subscribed_conversations:
+                continue
+            self.subscribed_conversations.discard(conversation_id)
+            # The joined conversation keeps its group until leave_conversation
+            if conversation_id != getattr(self, 'conversation_id', None):
+                await self.channel_layer.group_discard(f"conversation_{conversation_id}", self.channel_name)
 
     async def send_message_handler(self, data):
-        """Handle sending a message."""
-        print(f"✅ Message received by consumer: {data}")
-
-        conversation_id = data.get('conversation_id')
+        """
+        Handle sending a message. It is saved in the next micro-batch (see
+        chat.ingest), then broadcast to the room with its real id and the
+        client's temporary ``client_id``, and acknowledged to the sender.
+        """
+        try:
+            conversation_id = int(data.get('conversation_id'))
+        except (TypeError, ValueError):
+            conversation_id = None
         content = data.get('content')
         
-        if not all([conversation_id, content]):
+        if not conversation_id or not isinstance(content, str) or not content.strip():
             await self.send_error('Missing conversation_id or content')
             return
+        if len(content) > Message._meta.get_field('content').max_length:
+            await self.send_error('Message is too long')
+            return
         
-        # Save message to DB
-        message = await self.save_message(conversation_id, content)
+        client_id = data.get('client_id') or uuid.uuid4().hex
+        if not isinstance(client_id, str) or len(client_id) > CLIENT_ID_MAX_LENGTH:
+            await self.send_error(f'client_id must be a string of at most {CLIENT_ID_MAX_LENGTH} characters')
+            return
         
-        if message:
-            # Broadcast the new message to the conversation group
-            await self.channel_layer.group_send(
-                f"conversation_{conversation_id}",
-                {
-                    'type': 'new_message',
-                    'message': {
-                        'id': message.id,
-                        'conversation': conversation_id,
-                        'sender': {
-                            'id': self.user.id,
-                            'username': self.user.username,
-                            'name': self.user.get_full_name(),
-                        },
-                        'content': message.content,
-                        'created_at': message.timestamp.isoformat(),
-                        'is_read': False
-                    }
-                }
-            )
+        if conversation_id not in self.participant_conversations:
+            if not await self.is_conversation_participant(conversation_id):
+                await self.send_error('Not authorized for this conversation')
+                return
+            self.participant_conversations.add(conversation_id)
+        
+        # Attachments are uploaded beforehand and referenced by id
+        attachment_ids = [int(pk) for pk in data.get('attachment_ids') or [] if str(pk).isdigit()]
+        
+        ingest.get_writer().add({
+            'conversation_id': conversation_id,
+            'sender_id': self.user.id,
+            'sender': self.user.as_dict(),
+            'content': content,
+            'attachment_ids': attachment_ids,
+            'client_id': client_id,
+            'reply_channel': self.channel_name,
+        })
 
     async def handle_typing(self, data):
-        """Handle typing indicators."""
-        if hasattr(self, 'conversation_group_name'):
-            await self.channel_layer.group_send(
-                self.conversation_group_name,
-                {
-                    'type': 'typing_indicator',
-                    'user': {
-                        'id': self.user.id,
-                        'name': self.user.get_full_name()
-                    },
-                    'is_typing': data.get('is_typing', False)
-                }
-            )
+        """
+        Handle typing indicators. "Started typing" is broadcast at most once
+        per CHAT_TYPING_INTERVAL per user and conversation; "stopped typing"
+        only follows a broadcast start.
+        """
+        try:
+            conversation_id = int(data.get('conversation_id'))
+        except (TypeError, ValueError):
+            conversation_id = None
+        if conversation_id not in self.subscribed_conversations:
+            if not hasattr(self, 'conversation_group_name'):
+                return
+            conversation_id = self.conversation_id
+        
+        group = f"conversation_{conversation_id}"
+        is_typing = bool(data.get('is_typing', False))
+        if is_typing:
+            interval = getattr(settings, 'CHAT_TYPING_INTERVAL', 3)
+            last_sent = self.typing_sent.get(group)
+            if last_sent is not None and time.monotonic() - last_sent < interval:
+                return
+            # Shares the throttle with the user's other sockets
+            if not await cache_add(f'typing:{self.user.id}:{group}', 1, interval):
+                return
+            self.typing_sent[group] = time.monotonic()
+        elif self.typing_sent.pop(group, None) is None:
+            return
+        
+        await self.channel_layer.group_send(
+            group,
+            {
+                'type': 'typing_indicator',
+                'conversation_id': conversation_id,
+                'user': {
+                    'id': self.user.id,
+                    'name': self.user.name
+                },
+                'is_typing': is_typing
+            }
+        )
+    
+    # ============ Presence ============
+    
+    async def touch_presence(self):
+        """Refresh the user's online key, at most a few times per presence timeout."""
+        if time.monotonic() - self.last_heartbeat < presence.presence_timeout() / 3:
+            return
+        self.last_heartbeat = time.monotonic()
+        await presence.aheartbeat(self.user.id)
+    
+    async def broadcast_presence(self, online):
+        await self.channel_layer.group_send(
+            presence.group_name(self.user.id),
+            {
+                'type': 'presence_update',
+                'user_id': self.user.id,
+                'online': online,
+                'last_seen': timezone.now().isoformat(),
+            }
+        )
+    
+    async def subscribe_presence(self, user_ids):
+        """Follow presence changes of ``user_ids`` and reply with their current state."""
+        try:
+            user_ids = [int(user_id) for user_id in user_ids or []]
+        except (TypeError, ValueError):
+            await self.send_error('user_ids must be a list of ids')
+            return
+        
+        limit = getattr(settings, 'CHAT_PRESENCE_MAX_SUBSCRIPTIONS', 200)
+        new_ids = [user_id for user_id in dict.fromkeys(user_ids) if user_id not in self.presence_subscriptions]
+        if len(self.presence_subscriptions) + len(new_ids) > limit:
+            await self.send_error(f'Cannot follow the presence of more than {limit} users')
+            return
+        
+        for user_id in new_ids:
+            await self.channel_layer.group_add(presence.group_name(user_id), self.channel_name)
+        self.presence_subscriptions.update(new_ids)
+        
+        state = await presence.aget_presence(user_ids)
+        await self.send(text_data=json.dumps({
+            'type': 'presence_state',
+            'presence': {str(user_id): value for user_id, value in state.items()}
+        }))
+    
+    async def unsubscribe_presence(self, user_ids):
+        for user_id in user_ids or []:
+            user_id = int(user_id) if str(user_id).isdigit() else None
+            if user_id in self.presence_subscriptions:
+                self.presence_subscriptions.discard(user_id)
+                await self.channel_layer.group_discard(presence.group_name(user_id), self.channel_name)
     
     async def mark_message_read_handler(self, message_id):
         """Mark a message as read."""
@@ -225,11 +398,68 @@ class ChatConsumer(AsyncWebsocketConsumer):
                     }
                 )
 
+    async def mark_read_up_to_handler(self, data):
+        """Queue a "read up to message N" receipt; rapid frames are coalesced."""
+        try:
+            conversation_id = int(data.get('conversation_id'))
+            message_id = int(data.get('message_id'))
+        except (TypeError, ValueError):
+            await self.send_error('Missing conversation_id or message_id')
+            return
+        
+        if message_id > self.pending_reads.get(conversation_id, 0):
+            self.pending_reads[conversation_id] = message_id
+        if self.read_flush_task is None:
+            task = asyncio.ensure_future(
+                self.flush_read_receipts(getattr(settings, 'CHAT_READ_RECEIPT_DEBOUNCE', 0.5))
+            )
+            self.read_flush_task = task
+            self.read_flushes.add(task)
+            task.add_done_callback(self._read_flush_done)
+    
+    def _read_flush_done(self, task):
+        self.read_flushes.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Failed to apply read receipts for user %s", self.user.id, exc_info=task.exception())
+    
+    async def flush_read_receipts(self, delay=0):
+        """Apply pending read receipts and send one coalesced receipt per conversation."""
+        if delay:
+            await asyncio.sleep(delay)
+        pending, self.pending_reads = self.pending_reads, {}
+        self.read_flush_task = None
+        
+        for conversation_id, message_id in pending.items():
+            result = await self.db_mark_read_up_to(conversation_id, message_id)
+            if not result:
+                continue
+            count, read_at, other_ids = result
+            for user_id in other_ids:
+                await self.channel_layer.group_send(
+                    f"user_{user_id}",
+                    {
+                        'type': 'messages_read_receipt',
+                        'conversation_id': conversation_id,
+                        'up_to_message_id': message_id,
+                        'reader_id': self.user.id,
+                        'read_count': count,
+                        'read_at': read_at.isoformat(),
+                    }
+                )
+
     # WebSocket Event Handlers
     async def new_message(self, event):
         """Send a new_message event to the client."""
         await self.send(text_data=json.dumps(event))
 
+    async def message_ack(self, event):
+        """Tell the sender the real id of a message it sent with a temporary client_id."""
+        await self.send(text_data=json.dumps(event))
+
+    async def message_failed(self, event):
+        """Tell the sender a message could not be saved."""
+        await self.send(text_data=json.dumps(event))
+
     async def typing_indicator(self, event):
         """Send a typing_indicator event to the client."""
         if event['user']['id'] != self.user.id:
@@ -239,6 +469,32 @@ class ChatConsumer(AsyncWebsocketConsumer):
         """Send a message_read_receipt event to the client."""
         await self.send(text_data=json.dumps(event))
 
+    async def presence_update(self, event):
+        """Send a presence_update event to the client."""
+        await self.send(text_data=json.dumps(event))
+
+    async def counters_updated(self, event):
+        """Send a counters_updated (badge delta) event to the client."""
+        await self.send(text_data=json.dumps(event))
+
+    async def conversation_updated(self, event):
+        """Send an inbox-level conversation_updated event to the client."""
+        await self.send(text_data=json.dumps(event))
+
+    async def messages_read_receipt(self, event):
+        """Send a coalesced messages_read_receipt event to the client."""
+        await self.send(text_data=json.dumps(event))
+
+    async def throttled(self, frame_type):
+        """Tell the client a frame was dropped, at most once a second per frame type."""
+        now = time.monotonic()
+        if now - self.throttle_notified.get(frame_type, 0) >= 1:
+            self.throttle_notified[frame_type] = now
+            await self.send(text_data=json.dumps({
+                'type': 'rate_limited',
+                'frame_type': frame_type,
+            }))
+
     async def send_error(self, message):
         """Send an error message to the client."""
         await self.send(text_data=json.dumps({
@@ -249,31 +505,42 @@ class ChatConsumer(AsyncWebsocketConsumer):
     # Database Operations
     @database_sync_to_async
     def is_conversation_participant(self, conversation_id):
-        return Conversation.objects.filter(id=conversation_id, participants=self.user).exists()
+        return Conversation.objects.filter(id=conversation_id, participants=self.user.id).exists()
 
     @database_sync_to_async
-    def save_message(self, conversation_id, content):
-        try:
-            conversation = Conversation.objects.get(id=conversation_id)
-            if self.user in conversation.participants.all():
-                message = Message.objects.create(
-                    conversation=conversation,
-                    sender=self.user,
-                    content=content
-                )
-                conversation.save() # To update the `updated_at` timestamp
-                return message
-            return None
-        except Conversation.DoesNotExist:
-            return None
+    def participant_conversation_ids(self, conversation_ids):
+        return set(
+            Conversation.objects.filter(id__in=conversation_ids, participants=self.user.id).values_list('id', flat=True)
+        )
 
     @database_sync_to_async
     def db_mark_message_read(self, message_id):
         try:
             message = Message.objects.select_related('conversation').get(id=message_id)
-            if self.user in message.conversation.participants.all() and message.sender != self.user:
-                message.mark_as_read()
+            if message.sender_id != self.user.id and message.conversation.participants.filter(id=self.user.id).exists():
+                if not message.is_read:
+                    with transaction.atomic():
+                        message.mark_as_read()
+                        decremented = ConversationParticipant.objects.filter(
+                            conversation_id=message.conversation_id, user_id=self.user.id, unread_count__gt=0
+                        ).update(unread_count=F('unread_count') - 1)
+                        events.messages_read(message.conversation_id, self.user.id, decremented)
                 return message
             return None
         except Message.DoesNotExist:
-            return None
\ No newline at end of file
+            return None
+
+    @database_sync_to_async
+    def db_mark_read_up_to(self, conversation_id, message_id):
+        conversation = Conversation.objects.filter(id=conversation_id, participants=self.user.id).first()
+        if conversation is None:
+            return None
+        count, read_at = conversation.mark_read_up_to(self.user.id, message_id)
+        if not count:
+            return None
+        # Keep the reader's other tabs and badge in sync
+        events.messages_read(conversation_id, self.user.id, count)
+        other_ids = list(
+            conversation.memberships.exclude(user_id=self.user.id).values_list('user_id', flat=True)
+        )
+        return count, read_at, other_ids
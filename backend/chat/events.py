@@ -0,0 +1,77 @@
+"""
+Inbox-level WebSocket events.
+
+Whenever a conversation's summary or a participant's unread counter changes,
+each affected participant gets a ``conversation_updated`` event with their
+own unread count on their ``user_{id}`` group, so the sidebar hears about
+every conversation (including ones someone else just started) instead of
+polling the conversation list. The sends go through the delivery queue in
+one batch. Unread-message badge deltas go through ``users.counters``.
+"""
+from collections import Counter
+
+from django.db import transaction
+
+from notifications import delivery
+from users import counters
+from .models import Conversation, ConversationParticipant
+
+
+def message_recorded(message):
+    """Inbox and unread-badge updates for a message saved with record_message()."""
+    messages_recorded(message.conversation_id, [message])
+
+
+def messages_recorded(conversation_id, messages):
+    """Inbox and unread-badge updates for messages saved with record_messages()."""
+    conversation_updated(conversation_id)
+    member_ids = set(
+        ConversationParticipant.objects.filter(conversation_id=conversation_id).values_list('user_id', flat=True)
+    )
+    for sender_id, count in Counter(message.sender_id for message in messages).items():
+        counters.changed(member_ids - {sender_id}, unread_messages=count)
+
+
+def messages_read(conversation_id, user_id, count):
+    """Inbox and unread-badge updates after ``user_id`` read ``count`` messages."""
+    conversation_updated(conversation_id, [user_id])
+    counters.changed([user_id], unread_messages=-count)
+
+
+def conversation_updated(conversation_id, user_ids=None):
+    """
+    Send the conversation's summary to its participants (or only to
+    ``user_ids``) once the current transaction commits.
+    """
+    transaction.on_commit(lambda: send_conversation_updated(conversation_id, user_ids))
+
+
+def send_conversation_updated(conversation_id, user_ids=None):
+    summary = Conversation.objects.filter(id=conversation_id).values(
+        'last_message_id', 'last_message__sender_id', 'last_message_at', 'last_message_preview'
+    ).first()
+    if summary is None:
+        return
+
+    memberships = ConversationParticipant.objects.filter(conversation_id=conversation_id)
+    if user_ids is not None:
+        memberships = memberships.filter(user_id__in=user_ids)
+
+    last_message = None
+    if summary['last_message_id']:
+        last_message = {
+            'id': summary['last_message_id'],
+            'sender_id': summary['last_message__sender_id'],
+            'content': summary['last_message_preview'],
+            'timestamp': summary['last_message_at'].isoformat(),
+        }
+
+    delivery.enqueue_group_sends([
+        (f'user_{user_id}', {
+            'type': 'conversation_updated',
+            'conversation_id': conversation_id,
+            'last_message': last_message,
+            'unread_count': unread_count,
+        })
+        for user_id, unread_count in memberships.values_list('user_id', 'unread_count')
+    ])
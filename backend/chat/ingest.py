@@ -0,0 +1,156 @@
+"""
+Write-behind persistence for messages sent over the WebSocket.
+
+The consumer hands each message to the process's ``MessageWriter``, tagged
+with the client's temporary id. The writer collects messages for up to
+``LINGER`` seconds (or ``BATCH_SIZE`` messages), then saves the batch in one
+transaction:
+
+* one ``bulk_create`` for the messages,
+* one summary ``UPDATE`` per conversation and one unread ``UPDATE`` per
+  sender (``Conversation.record_messages``).
+
+Once committed, the conversation group gets ``new_message`` with the real id
+and the client's temporary id, and each sender gets a ``message_ack`` too.
+If the batch fails, its messages are retried one at a time and only the
+ones that still fail get ``message_failed``. Messages still waiting in
+memory are lost if the process dies, so the window is kept short.
+"""
+import asyncio
+import logging
+import weakref
+from collections import defaultdict
+
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import transaction
+
+from . import attachments, events
+from .models import Conversation, Message
+from .signals import queue_new_messages
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'BATCH_SIZE': 100,
+    'LINGER': 0.02,
+}
+
+
+def get_setting(name):
+    return getattr(settings, 'CHAT_INGEST', {}).get(name, DEFAULTS[name])
+
+
+def persist_messages(pending):
+    """
+    Save pending messages (dicts with ``conversation_id``, ``sender_id``,
+    ``content`` and optional ``attachment_ids``), in order, and return the
+    saved ``Message`` objects.
+    """
+    with transaction.atomic():
+        messages = Message.objects.bulk_create([
+            Message(conversation_id=item['conversation_id'], sender_id=item['sender_id'], content=item['content'])
+            for item in pending
+        ])
+        by_conversation = defaultdict(list)
+        for item, message in zip(pending, messages):
+            attachments.attach_to_message(message, item.get('attachment_ids'), message.sender_id)
+            by_conversation[message.conversation_id].append(message)
+        for conversation_id, conversation_messages in by_conversation.items():
+            Conversation(pk=conversation_id).record_messages(conversation_messages)
+            events.messages_recorded(conversation_id, conversation_messages)
+
+        # bulk_create skips post_save, so queue the Pusher events here.
+        queue_new_messages(
+            Message.objects.filter(id__in=[message.id for message in messages])
+            .prefetch_related('attachments')
+        )
+    return messages
+
+
+class MessageWriter:
+    """Collects messages on the event loop and persists them in micro-batches."""
+
+    def __init__(self, batch_size, linger):
+        self.batch_size = batch_size
+        self.linger = linger
+        self.pending = []
+        self.timer = None
+        # One batch at a time, so messages are saved in arrival order.
+        self.lock = asyncio.Lock()
+
+    def add(self, item):
+        self.pending.append(item)
+        if len(self.pending) >= self.batch_size:
+            self.start_flush()
+        elif self.timer is None:
+            self.timer = asyncio.get_running_loop().call_later(self.linger, self.start_flush)
+
+    def start_flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        batch, self.pending = self.pending, []
+        if batch:
+            asyncio.ensure_future(self.flush(batch))
+
+    async def flush(self, batch):
+        channel_layer = get_channel_layer()
+        async with self.lock:
+            try:
+                saved = list(zip(batch, await database_sync_to_async(persist_messages)(batch)))
+            except Exception as e:
+                # One bad row (e.g. a conversation deleted meanwhile) must not
+                # drop the rest of the batch.
+                logger.warning("Failed to save %d chat messages, retrying one by one: %s", len(batch), e)
+                saved = []
+                for item in batch:
+                    try:
+                        [message] = await database_sync_to_async(persist_messages)([item])
+                    except Exception:
+                        logger.exception("Failed to save chat message %s", item['client_id'])
+                        await channel_layer.send(item['reply_channel'], {
+                            'type': 'message_failed',
+                            'client_id': item['client_id'],
+                            'conversation_id': item['conversation_id'],
+                        })
+                    else:
+                        saved.append((item, message))
+
+        for item, message in saved:
+            await channel_layer.group_send(
+                f"conversation_{message.conversation_id}",
+                {
+                    'type': 'new_message',
+                    'message': {
+                        'id': message.id,
+                        'client_id': item['client_id'],
+                        'conversation': message.conversation_id,
+                        'sender': item['sender'],
+                        'content': message.content,
+                        'attachment_ids': item.get('attachment_ids') or [],
+                        'created_at': message.timestamp.isoformat(),
+                        'is_read': False,
+                    }
+                }
+            )
+            await channel_layer.send(item['reply_channel'], {
+                'type': 'message_ack',
+                'client_id': item['client_id'],
+                'id': message.id,
+                'conversation_id': message.conversation_id,
+                'created_at': message.timestamp.isoformat(),
+            })
+
+
+_writers = weakref.WeakKeyDictionary()
+
+
+def get_writer():
+    """Return the message writer for the running event loop."""
+    loop = asyncio.get_running_loop()
+    writer = _writers.get(loop)
+    if writer is None:
+        writer = _writers[loop] = MessageWriter(get_setting('BATCH_SIZE'), get_setting('LINGER'))
+    return writer
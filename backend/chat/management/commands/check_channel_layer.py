@@ -0,0 +1,84 @@
+import asyncio
+import multiprocessing
+import queue
+import uuid
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+def _run_worker(index, group, ready, results, timeout):
+    """Join ``group`` from a fresh process and report the first message received."""
+    import django
+    django.setup()
+
+    async def listen():
+        layer = get_channel_layer()
+        channel = await layer.new_channel()
+        await layer.group_add(group, channel)
+        ready.put(index)
+        try:
+            message = await asyncio.wait_for(layer.receive(channel), timeout)
+            results.put((index, message.get('token')))
+        except asyncio.TimeoutError:
+            results.put((index, None))
+        finally:
+            await layer.group_discard(group, channel)
+
+    asyncio.run(listen())
+
+
+class Command(BaseCommand):
+    help = (
+        "Start several worker processes that join the same group and check that a "
+        "group_send from another process reaches all of them through the channel layer."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help="Number of worker processes to start.")
+        parser.add_argument('--timeout', type=float, default=5.0, help="Seconds to wait for delivery.")
+
+    def handle(self, *args, **options):
+        workers, timeout = options['workers'], options['timeout']
+        backend = settings.CHANNEL_LAYERS['default']['BACKEND']
+        self.stdout.write(f"Channel layer: {backend}")
+
+        group = f"layer_check_{uuid.uuid4().hex}"
+        token = uuid.uuid4().hex
+        context = multiprocessing.get_context('spawn')
+        ready, results = context.Queue(), context.Queue()
+        processes = [
+            context.Process(target=_run_worker, args=(i, group, ready, results, timeout), daemon=True)
+            for i in range(workers)
+        ]
+        for process in processes:
+            process.start()
+
+        try:
+            for _ in processes:
+                ready.get(timeout=timeout + 30)
+        except queue.Empty:
+            raise CommandError("Worker processes did not start in time.")
+
+        async_to_sync(get_channel_layer().group_send)(group, {'type': 'layer.check', 'token': token})
+
+        received = {}
+        try:
+            for _ in processes:
+                index, value = results.get(timeout=timeout + 5)
+                received[index] = value
+        except queue.Empty:
+            pass
+        for process in processes:
+            process.join(timeout=5)
+
+        delivered = sorted(i for i, value in received.items() if value == token)
+        self.stdout.write(f"Delivered to {len(delivered)} of {workers} worker processes.")
+        if len(delivered) != workers:
+            raise CommandError(
+                "Cross-process delivery failed. The in-memory channel layer only works within "
+                "one process; set CHANNEL_REDIS_URLS to use the Redis channel layer."
+            )
+        self.stdout.write(self.style.SUCCESS("Channel layer delivers across processes."))
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Substr
+from chat.models import Conversation, ConversationParticipant, Message
+
+
+class Command(BaseCommand):
+    help = "Rebuild conversation last-message summaries and per-participant unread counters from Message rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--conversation', type=int, action='append', dest='conversation_ids',
+            help="Only rebuild the given conversation id (may be repeated)."
+        )
+
+    def handle(self, *args, **options):
+        conversations = Conversation.objects.all()
+        memberships = ConversationParticipant.objects.all()
+        if options['conversation_ids']:
+            conversations = conversations.filter(id__in=options['conversation_ids'])
+            memberships = memberships.filter(conversation_id__in=options['conversation_ids'])
+
+        last = Message.objects.filter(conversation=OuterRef('pk')).order_by('-timestamp', '-id')
+        unread = Message.objects.filter(
+            conversation=OuterRef('conversation'), is_read=False
+        ).exclude(sender=OuterRef('user')).values('conversation').annotate(total=Count('id')).values('total')
+
+        with transaction.atomic():
+            updated = conversations.update(
+                last_message_id=Subquery(last.values('id')[:1]),
+                last_message_at=Subquery(last.values('timestamp')[:1]),
+                last_message_preview=Coalesce(
+                    Substr(Subquery(last.values('content')[:1]), 1, Conversation.PREVIEW_LENGTH), Value('')
+                ),
+            )
+            counters = memberships.update(unread_count=Coalesce(Subquery(unread), 0))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {updated} conversation summaries and {counters} unread counters."
+        ))
@@ -0,0 +1,117 @@
+"""
+JWT authentication for WebSocket connections.
+
+The access token is read from the ``token`` query parameter and decoded
+once; a small in-process LRU remembers which user a token belongs to until
+it expires. The user's ``UserSnapshot`` comes from the shared cache (see
+``users.snapshots.get_auth_snapshot_key``), which ``users.signals`` clears
+whenever the user is saved, so a reconnect storm after a deploy is answered
+from Redis instead of queueing on the database thread pool, and a
+deactivated user is not let back in from a stale entry. Cache calls run on
+a non-thread-sensitive executor so they never wait behind the ORM thread.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from channels.auth import AuthMiddlewareStack
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import AccessToken
+from users.snapshots import UserSnapshot, get_auth_snapshot_key
+
+User = get_user_model()
+
+cache_get = sync_to_async(cache.get, thread_sensitive=False)
+cache_set = sync_to_async(cache.set, thread_sensitive=False)
+
+
+class TokenUserCache:
+    """Thread-safe LRU of token -> (user_id, expires_at) with per-entry expiry."""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            user_id, expires_at = entry
+            if expires_at <= time.time():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return user_id
+
+    def set(self, key, user_id, expires_at):
+        with self.lock:
+            self.entries[key] = (user_id, expires_at)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+
+_local_cache = TokenUserCache(getattr(settings, 'WEBSOCKET_AUTH_CACHE_SIZE', 1024))
+
+
+def _cache_key(token_string):
+    return 'ws-auth:' + hashlib.sha256(token_string.encode()).hexdigest()
+
+
+@database_sync_to_async
+def _load_user(user_id):
+    try:
+        return UserSnapshot.from_user(User.objects.get(id=user_id, is_active=True))
+    except User.DoesNotExist:
+        return None
+
+
+async def get_user_from_token(token_string):
+    """Return the UserSnapshot for a JWT access token, or AnonymousUser if it is invalid."""
+    key = _cache_key(token_string)
+    user_id = _local_cache.get(key)
+    if user_id is None:
+        try:
+            # Validates the signature, expiry and token type in a single decode.
+            token = AccessToken(token_string)
+        except TokenError:
+            return AnonymousUser()
+        user_id = token.get(jwt_settings.USER_ID_CLAIM)
+        _local_cache.set(key, user_id, token['exp'])
+
+    snapshot_key = get_auth_snapshot_key(user_id)
+    user = await cache_get(snapshot_key)
+    if user is None:
+        user = await _load_user(user_id)
+        if user is None:
+            return AnonymousUser()
+        await cache_set(snapshot_key, user, getattr(settings, 'WEBSOCKET_AUTH_CACHE_TTL', 300))
+    return user
+
+
+class JWTAuthMiddleware(BaseMiddleware):
+    """Sets ``scope['user']`` from the ``token`` query parameter, when present."""
+
+    async def __call__(self, scope, receive, send):
+        params = parse_qs(scope.get('query_string', b'').decode())
+        token = params.get('token', [None])[0]
+        if token:
+            scope = dict(scope, user=await get_user_from_token(token))
+        return await super().__call__(scope, receive, send)
+
+
+def JWTAuthMiddlewareStack(inner):
+    """Session auth (for the admin/browsable clients) with JWT query-token auth on top."""
+    return AuthMiddlewareStack(JWTAuthMiddleware(inner))
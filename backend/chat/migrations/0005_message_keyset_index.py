@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:22
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0004_alter_conversation_options_alter_message_options_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['conversation', 'timestamp', 'id'], name='chat_messag_convers_fa4db4_idx'),
+        ),
+    ]
@@ -0,0 +1,77 @@
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Substr
+
+
+def rebuild_summaries(apps, schema_editor):
+    Conversation = apps.get_model('chat', 'Conversation')
+    ConversationParticipant = apps.get_model('chat', 'ConversationParticipant')
+    Message = apps.get_model('chat', 'Message')
+
+    last = Message.objects.filter(conversation=OuterRef('pk')).order_by('-timestamp', '-id')
+    Conversation.objects.update(
+        last_message_id=Subquery(last.values('id')[:1]),
+        last_message_at=Subquery(last.values('timestamp')[:1]),
+        last_message_preview=Coalesce(Substr(Subquery(last.values('content')[:1]), 1, 255), Value('')),
+    )
+    unread = Message.objects.filter(
+        conversation=OuterRef('conversation'), is_read=False
+    ).exclude(sender=OuterRef('user')).values('conversation').annotate(total=Count('id')).values('total')
+    ConversationParticipant.objects.update(unread_count=Coalesce(Subquery(unread), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0005_message_keyset_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # Turn the auto-created M2M table into an explicit through model
+        # without touching the database, then add the unread counter to it.
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='ConversationParticipant',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('conversation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='memberships', to='chat.conversation')),
+                        ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='conversation_memberships', to=settings.AUTH_USER_MODEL)),
+                    ],
+                    options={
+                        'db_table': 'chat_conversation_participants',
+                        'unique_together': {('conversation', 'user')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='conversation',
+                    name='participants',
+                    field=models.ManyToManyField(related_name='conversations', through='chat.ConversationParticipant', to=settings.AUTH_USER_MODEL),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name='conversationparticipant',
+            name='unread_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='last_message',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='chat.message'),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='last_message_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='last_message_preview',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.RunPython(rebuild_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:49
+
+import cloudinary.models
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0006_conversation_summary'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='messageattachment',
+            name='content_type',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='messageattachment',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Waiting for upload'), ('uploaded', 'Uploaded'), ('ready', 'Ready'), ('failed', 'Failed')], default='ready', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='messageattachment',
+            name='storage_key',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='messageattachment',
+            name='thumbnail_key',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='messageattachment',
+            name='uploader',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='message_attachments', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='messageattachment',
+            name='file',
+            field=cloudinary.models.CloudinaryField(blank=True, max_length=255, null=True, verbose_name='chat_attachments'),
+        ),
+        migrations.AlterField(
+            model_name='messageattachment',
+            name='message',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='attachments', to='chat.message'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0008_message_unread_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='message',
+            name='content',
+            field=models.TextField(max_length=5000),
+        ),
+    ]
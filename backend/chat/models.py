@@ -1,4 +1,8 @@
-from django.db import models
+from collections import Counter
+
+from django.db import models, transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
 from django.contrib.auth import get_user_model
 from django.utils import timezone # Corrected timezone import
 from products.models import Product
@@ -10,7 +14,9 @@ User = get_user_model()
 class Conversation(models.Model):
     """Conversation model for chat"""
     
-    participants = models.ManyToManyField(User, related_name='conversations')
+    PREVIEW_LENGTH = 255
+    
+    participants = models.ManyToManyField(User, through='ConversationParticipant', related_name='conversations')
     product = models.ForeignKey(
         Product, 
         on_delete=models.SET_NULL, 
@@ -19,6 +25,17 @@ class Conversation(models.Model):
         related_name='conversations'
     )
     
+    # Denormalized summary of the latest message, maintained by record_message()
+    last_message = models.ForeignKey(
+        'Message',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    last_message_at = models.DateTimeField(null=True, blank=True)
+    last_message_preview = models.CharField(max_length=PREVIEW_LENGTH, blank=True)
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -30,22 +47,100 @@ class Conversation(models.Model):
         participant_names = ", ".join([p.username for p in self.participants.all()[:2]])
         return f"Conversation: {participant_names}"
     
-    @property
-    def last_message(self):
-        """Get the last message in this conversation"""
-        return self.messages.order_by('-timestamp').first()
+    def record_message(self, message):
+        """
+        Update the denormalized summary for a newly created message and bump
+        the unread counter of every other participant. Call inside the same
+        transaction that creates the message.
+        """
+        self.record_messages([message])
+    
+    def record_messages(self, messages):
+        """
+        Batch form of record_message() for messages of this conversation,
+        oldest first: one summary UPDATE plus one unread UPDATE per sender.
+        """
+        latest = messages[-1]
+        # Only move the summary forward, so a slower concurrent write can't regress it.
+        Conversation.objects.filter(
+            Q(last_message_at__isnull=True) | Q(last_message_at__lte=latest.timestamp),
+            pk=self.pk,
+        ).update(
+            last_message=latest,
+            last_message_at=latest.timestamp,
+            last_message_preview=latest.content[:self.PREVIEW_LENGTH],
+            updated_at=latest.timestamp,
+        )
+        for sender_id, count in Counter(message.sender_id for message in messages).items():
+            ConversationParticipant.objects.filter(conversation=self).exclude(
+                user_id=sender_id
+            ).update(unread_count=F('unread_count') + count)
+    
+    def reset_unread(self, user):
+        """
+        Resync the unread counter of ``user`` after they read the conversation.
+        The counter is recounted from the messages in the same UPDATE rather
+        than set to 0, so a message that arrived meanwhile stays counted.
+        """
+        self.resync_unread(user.pk)
+    
+    def resync_unread(self, user_id):
+        """Set ``user_id``'s unread counter to their unread messages from others, in one UPDATE."""
+        unread = Message.objects.filter(
+            conversation=OuterRef('conversation'), is_read=False
+        ).exclude(sender_id=user_id).order_by().values('conversation').annotate(count=Count('pk')).values('count')
+        ConversationParticipant.objects.filter(conversation=self, user_id=user_id).update(
+            unread_count=Coalesce(Subquery(unread), 0)
+        )
+    
+    def mark_read_up_to(self, user_id, message_id):
+        """
+        Mark every unread message from other participants up to and including
+        ``message_id`` as read with a single UPDATE, and resync the reader's
+        unread counter. Returns ``(count, read_at)``.
+        """
+        target = self.messages.filter(id=message_id).values('timestamp').first()
+        if target is None:
+            return 0, None
+        
+        read_at = timezone.now()
+        unread = self.messages.filter(is_read=False).exclude(sender_id=user_id)
+        with transaction.atomic():
+            count = unread.filter(
+                Q(timestamp__lt=target['timestamp']) | Q(timestamp=target['timestamp'], id__lte=message_id)
+            ).update(is_read=True, read_at=read_at)
+            if count:
+                self.resync_unread(user_id)
+        return count, read_at
     
     def get_other_participant(self, user):
         """Get the other participant in the conversation"""
         return self.participants.exclude(id=user.id).first()
 
 
+class ConversationParticipant(models.Model):
+    """Membership of a user in a conversation, with their unread counter"""
+    
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='memberships')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='conversation_memberships')
+    unread_count = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        # Reuses the table Django created for the original auto-generated M2M.
+        db_table = 'chat_conversation_participants'
+        unique_together = ['conversation', 'user']
+    
+    def __str__(self):
+        return f"{self.user} in conversation {self.conversation_id}"
+
+
 class Message(models.Model):
     """Message model for chat"""
     
     conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='messages')
     sender = models.ForeignKey(User, on_delete=models.CASCADE, related_name='sent_messages')
-    content = models.TextField()
+    # Enforced by the serializers and the WebSocket consumer, not the database
+    content = models.TextField(max_length=5000)
     
     # Message status
     is_read = models.BooleanField(default=False)
@@ -59,6 +154,15 @@ class Message(models.Model):
     class Meta:
         # Removed db_table to follow Django conventions
         ordering = ['timestamp']
+        indexes = [
+            # Keyset pagination of a conversation's history seeks on (timestamp, id).
+            models.Index(fields=['conversation', 'timestamp', 'id']),
+            # Marking a conversation read only touches its unread messages.
+            models.Index(
+                fields=['conversation', 'sender'], condition=Q(is_read=False),
+                name='message_unread_idx',
+            ),
+        ]
     
     def __str__(self):
         return f"Message from {self.sender.username}: {self.content[:50]}..."
@@ -72,7 +176,11 @@ class Message(models.Model):
 
 
 class MessageAttachment(models.Model):
-    """Message attachment model"""
+    """
+    Message attachment model. Files are uploaded straight to storage (see
+    chat/attachments.py) before the message is sent, so ``message`` is empty
+    until a message references the attachment by id.
+    """
     
     ATTACHMENT_TYPES = [
         ('image', 'Image'),
@@ -80,9 +188,22 @@ class MessageAttachment(models.Model):
         ('other', 'Other'),
     ]
     
-    message = models.ForeignKey(Message, on_delete=models.CASCADE, related_name='attachments')
+    STATUS_CHOICES = [
+        ('pending', 'Waiting for upload'),
+        ('uploaded', 'Uploaded'),
+        ('ready', 'Ready'),
+        ('failed', 'Failed'),
+    ]
+    
+    message = models.ForeignKey(Message, on_delete=models.CASCADE, related_name='attachments', null=True, blank=True)
+    uploader = models.ForeignKey(User, on_delete=models.CASCADE, related_name='message_attachments', null=True, blank=True)
     # Changed to CloudinaryField for consistency with the rest of the project
-    file = CloudinaryField('chat_attachments')
+    # (attachments from the upload pipeline use storage_key instead)
+    file = CloudinaryField('chat_attachments', blank=True, null=True)
+    storage_key = models.CharField(max_length=255, blank=True)
+    thumbnail_key = models.CharField(max_length=255, blank=True)
+    content_type = models.CharField(max_length=100, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='ready')
     file_type = models.CharField(max_length=20, choices=ATTACHMENT_TYPES)
     file_name = models.CharField(max_length=255)
     file_size = models.IntegerField()  # in bytes
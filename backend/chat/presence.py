@@ -0,0 +1,138 @@
+"""
+Online presence and last-seen tracking for chat users.
+
+Presence lives in the Django cache (Redis in production) so every worker
+sees the same state. A connected socket keeps its user's ``online`` key
+alive with heartbeats; if the socket dies without a clean disconnect the key
+simply expires after ``CHAT_PRESENCE_TIMEOUT`` seconds. ``last_seen`` is
+kept for longer and falls back to ``User.last_active`` once it expires.
+
+Consumers use the ``a*`` variants. Their cache calls run on a
+non-thread-sensitive executor, so a busy database thread never delays a
+heartbeat; only the ``last_active`` read and write go through the ORM thread.
+"""
+from asgiref.sync import sync_to_async
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+LAST_SEEN_TIMEOUT = 60 * 60 * 24 * 7
+
+
+def presence_timeout():
+    return getattr(settings, 'CHAT_PRESENCE_TIMEOUT', 60)
+
+
+def _online_key(user_id):
+    return f'presence:online:{user_id}'
+
+
+def _connections_key(user_id):
+    return f'presence:connections:{user_id}'
+
+
+def _last_seen_key(user_id):
+    return f'presence:last_seen:{user_id}'
+
+
+def group_name(user_id):
+    """Channel layer group that receives presence updates for ``user_id``."""
+    return f'presence_{user_id}'
+
+
+def connect(user_id):
+    """Register a new socket for the user. Returns True if they just came online."""
+    timeout = presence_timeout()
+    cache.add(_connections_key(user_id), 0, timeout)
+    try:
+        connections = cache.incr(_connections_key(user_id))
+    except ValueError:
+        # The counter expired between add() and incr().
+        cache.set(_connections_key(user_id), 1, timeout)
+        connections = 1
+    was_online = cache.get(_online_key(user_id)) is not None
+    heartbeat(user_id)
+    return connections == 1 or not was_online
+
+
+def heartbeat(user_id):
+    """Keep the user online for another ``CHAT_PRESENCE_TIMEOUT`` seconds."""
+    timeout = presence_timeout()
+    now = timezone.now().isoformat()
+    cache.set(_online_key(user_id), now, timeout)
+    cache.set(_last_seen_key(user_id), now, LAST_SEEN_TIMEOUT)
+    cache.touch(_connections_key(user_id), timeout)
+
+
+def disconnect(user_id):
+    """Unregister a socket. Returns True if it was the user's last one."""
+    went_offline = _disconnect_cached(user_id)
+    if went_offline:
+        record_last_active(user_id)
+    return went_offline
+
+
+def _disconnect_cached(user_id):
+    try:
+        connections = cache.decr(_connections_key(user_id))
+    except ValueError:
+        connections = 0
+    cache.set(_last_seen_key(user_id), timezone.now().isoformat(), LAST_SEEN_TIMEOUT)
+    if connections > 0:
+        return False
+    cache.delete_many([_online_key(user_id), _connections_key(user_id)])
+    return True
+
+
+def record_last_active(user_id):
+    from users.models import User
+    User.objects.filter(id=user_id).update(last_active=timezone.now())
+
+
+def get_presence(user_ids):
+    """Return ``{user_id: {'online': bool, 'last_seen': iso or None}}`` for the given ids."""
+    presence = _cached_presence(user_ids)
+    _fill_last_active(presence)
+    return presence
+
+
+def _cached_presence(user_ids):
+    user_ids = list(dict.fromkeys(user_ids))
+    keys = [_online_key(user_id) for user_id in user_ids] + [_last_seen_key(user_id) for user_id in user_ids]
+    values = cache.get_many(keys)
+    return {
+        user_id: {
+            'online': _online_key(user_id) in values,
+            'last_seen': values.get(_last_seen_key(user_id)),
+        }
+        for user_id in user_ids
+    }
+
+
+def _fill_last_active(presence):
+    missing = [user_id for user_id, state in presence.items() if state['last_seen'] is None]
+    if missing:
+        from users.models import User
+        for user_id, last_active in User.objects.filter(id__in=missing).values_list('id', 'last_active'):
+            presence[user_id]['last_seen'] = last_active.isoformat() if last_active else None
+
+
+# ============ Async ============
+
+aconnect = sync_to_async(connect, thread_sensitive=False)
+aheartbeat = sync_to_async(heartbeat, thread_sensitive=False)
+
+
+async def adisconnect(user_id):
+    went_offline = await sync_to_async(_disconnect_cached, thread_sensitive=False)(user_id)
+    if went_offline:
+        await database_sync_to_async(record_last_active)(user_id)
+    return went_offline
+
+
+async def aget_presence(user_ids):
+    presence = await sync_to_async(_cached_presence, thread_sensitive=False)(user_ids)
+    if any(state['last_seen'] is None for state in presence.values()):
+        await database_sync_to_async(_fill_last_active)(presence)
+    return presence
@@ -0,0 +1,18 @@
+"""
+Hot query shapes of the chat API, checked for full table scans by
+``manage.py explain_queries``.
+"""
+from django.db.models import Sum
+
+from .models import Conversation, ConversationParticipant, Message
+
+QUERY_SHAPES = {
+    'inbox': lambda: Conversation.objects.filter(memberships__user_id=1).order_by('-updated_at'),
+    'conversation history': lambda: Message.objects.filter(conversation_id=1).order_by('-timestamp', '-id')[:50],
+    'unread messages in conversation': lambda: (
+        Message.objects.filter(conversation_id=1, is_read=False).exclude(sender_id=1)
+    ),
+    'unread message total': lambda: (
+        ConversationParticipant.objects.filter(user_id=1).values('user_id').annotate(total=Sum('unread_count'))
+    ),
+}
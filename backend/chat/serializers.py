@@ -1,6 +1,7 @@
 from rest_framework import serializers
+from . import attachments
 from .models import Conversation, Message, MessageAttachment
-from users.serializers import UserSerializer
+from users.serializers import PublicUserSerializer
 from products.serializers import ProductSerializer
 
 
@@ -8,36 +9,55 @@ class MessageAttachmentSerializer(serializers.ModelSerializer):
     """Serializer for message attachments"""
     # Use a SerializerMethodField to ensure the full URL is always returned
     file_url = serializers.SerializerMethodField()
+    thumbnail_url = serializers.SerializerMethodField()
 
     class Meta:
         model = MessageAttachment
-        fields = ['id', 'file_url', 'file_type', 'file_name', 'file_size', 'created_at']
+        fields = ['id', 'file_url', 'thumbnail_url', 'file_type', 'file_name', 'file_size', 'status', 'created_at']
 
     def get_file_url(self, obj):
+        if obj.storage_key:
+            return attachments.download_url(obj, request=self.context.get('request'))
         if obj.file and hasattr(obj.file, 'url'):
             return obj.file.url
         return None
 
+    def get_thumbnail_url(self, obj):
+        if obj.storage_key and obj.file_type == 'image' and obj.status == 'ready':
+            if attachments.is_local() and not obj.thumbnail_key:
+                return None
+            return attachments.download_url(obj, thumbnail=True, request=self.context.get('request'))
+        return None
+
 
 class MessageSerializer(serializers.ModelSerializer):
     """Serializer for messages"""
     
-    sender = UserSerializer(read_only=True)
+    sender = serializers.SerializerMethodField()
     attachments = MessageAttachmentSerializer(many=True, read_only=True)
+    # Uploads from the attachment pipeline to link to a new message
+    attachment_ids = serializers.ListField(child=serializers.IntegerField(), write_only=True, required=False)
     
     class Meta:
         model = Message
         fields = [
             'id', 'conversation', 'sender', 'content', 'is_read', 'is_edited',
-            'timestamp', 'edited_at', 'read_at', 'attachments'
+            'timestamp', 'edited_at', 'read_at', 'attachments', 'attachment_ids'
         ]
         read_only_fields = ['sender', 'timestamp', 'edited_at', 'read_at']
 
+    def get_sender(self, obj):
+        """Use a cached snapshot from the ``senders`` context when given, to skip loading the user."""
+        snapshot = self.context.get('senders', {}).get(obj.sender_id)
+        if snapshot is not None:
+            return snapshot.as_dict()
+        return PublicUserSerializer(obj.sender, context=self.context).data
+
 
 class ConversationSerializer(serializers.ModelSerializer):
     """Serializer for conversations"""
     
-    participants = UserSerializer(many=True, read_only=True)
+    participants = PublicUserSerializer(many=True, read_only=True)
     product = ProductSerializer(read_only=True)
     last_message = serializers.SerializerMethodField()
     unread_count = serializers.SerializerMethodField()
@@ -50,25 +70,26 @@ class ConversationSerializer(serializers.ModelSerializer):
         ]
     
     def get_last_message(self, obj):
-        """Get the last message in the conversation"""
-        last_message = obj.last_message
-        if last_message:
-            return {
-                'id': last_message.id,
-                'content': last_message.content,
-                'timestamp': last_message.timestamp,
-                'sender_id': last_message.sender.id,
-                'is_read': last_message.is_read
-            }
-        return None
+        """Get the last message in the conversation from the denormalized summary"""
+        if obj.last_message_id is None:
+            return None
+        return {
+            'id': obj.last_message_id,
+            'content': obj.last_message_preview,
+            'timestamp': obj.last_message_at,
+            'sender_id': obj.last_message.sender_id,
+            'is_read': obj.last_message.is_read
+        }
     
     def get_unread_count(self, obj):
         """Get unread message count for the current user"""
+        # MyChatsView annotates the counter from the user's membership row.
+        if hasattr(obj, 'unread_count'):
+            return obj.unread_count
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            return obj.messages.filter(
-                is_read=False
-            ).exclude(sender=request.user).count()
+            membership = obj.memberships.filter(user=request.user).first()
+            return membership.unread_count if membership else 0
         return 0
 
 
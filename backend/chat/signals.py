@@ -1,34 +1,37 @@
+from functools import partial
+
+from django.db import transaction
 from django.db.models.signals import post_save
 from django.dispatch import receiver
-import pusher
-from django.conf import settings
+from notifications import delivery
+from users.snapshots import get_user_snapshots
 from .models import Message
 from .serializers import MessageSerializer
 
+
+def queue_new_messages(messages):
+    """
+    Queue 'new-message' Pusher events for messages. Delivery happens after
+    commit, off the request thread. Senders come from the user snapshot cache.
+    """
+    if not delivery.pusher_enabled():
+        return
+    messages = list(messages)
+    context = {'senders': get_user_snapshots({message.sender_id for message in messages})}
+    # The channel name must be consistent with the frontend
+    delivery.enqueue_many([
+        (f'private-conversation-{message.conversation_id}', 'new-message', MessageSerializer(message, context=context).data)
+        for message in messages
+    ])
+
+
 @receiver(post_save, sender=Message)
 def message_created(sender, instance, created, **kwargs):
     """
-    Signal handler to send a new message to Pusher when it's created.
+    Signal handler to queue a new message for Pusher when it's created.
+    Serialized at commit, so attachments linked later in the same
+    transaction are included. Messages saved with bulk_create are queued
+    by chat.ingest instead.
     """
     if created:
-        try:
-            pusher_client = pusher.Pusher(
-                app_id=settings.PUSHER_CONFIG['app_id'],
-                key=settings.PUSHER_CONFIG['key'],
-                secret=settings.PUSHER_CONFIG['secret'],
-                cluster=settings.PUSHER_CONFIG['cluster'],
-                ssl=True
-            )
-
-            # Serialize the message data to send to the frontend
-            serializer = MessageSerializer(instance)
-            
-            # The channel name must be consistent with the frontend
-            channel_name = f'private-conversation-{instance.conversation.id}'
-            
-            # Trigger the 'new-message' event
-            pusher_client.trigger(channel_name, 'new-message', serializer.data)
-            
-        except Exception as e:
-            # It's good practice to log errors
-            print(f"Error sending message to Pusher: {e}")
\ No newline at end of file
+        transaction.on_commit(partial(queue_new_messages, [instance]))
@@ -0,0 +1,8 @@
+from celery import shared_task
+from . import attachments
+
+
+@shared_task(ignore_result=True)
+def make_attachment_thumbnail(attachment_id):
+    """Make the thumbnail for an uploaded image attachment."""
+    attachments.make_thumbnail(attachment_id)
@@ -0,0 +1,214 @@
+import unittest
+from unittest import mock
+
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from products.models import Category, Product, ProductImage, ProductTag, ProductTagRelation
+from users.models import User
+from . import throttle
+from .models import Conversation, Message
+
+
+class MyChatsViewQueryTests(TestCase):
+    """The inbox is a fixed number of queries, however many conversations it lists."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('buyer', 'buyer@example.com', 'password')
+        cls.category = Category.objects.get_or_create(slug='books', defaults={'name': 'Textbooks'})[0]
+        cls.tag = ProductTag.objects.create(name='physics', slug='physics')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def add_conversations(self, count):
+        for _ in range(count):
+            number = Conversation.objects.count()
+            seller = User.objects.create_user(f'seller{number}', f'seller{number}@example.com', 'password')
+            product = Product.objects.create(
+                title=f'Book {number}', description='Used', price=100, seller=seller,
+                category=self.category, condition='good',
+            )
+            ProductImage.objects.create(product=product, image='sample', is_primary=True)
+            ProductTagRelation.objects.create(product=product, tag=self.tag)
+            conversation = Conversation.objects.create(product=product)
+            conversation.participants.add(self.user, seller)
+            message = Message.objects.create(conversation=conversation, sender=seller, content='Still available?')
+            conversation.record_message(message)
+
+    def count_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/chat/conversations/')
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response.json()
+
+    def test_query_count_does_not_grow_with_conversations(self):
+        self.add_conversations(2)
+        # Warm per-process lookups (e.g. categories) so both requests compare like for like
+        self.count_queries()
+        expected, data = self.count_queries()
+        self.assertEqual(len(data.get('results', data)), 2)
+
+        self.add_conversations(8)
+        with self.assertNumQueries(expected):
+            response = self.client.get('/api/chat/conversations/')
+        data = response.json()
+        conversations = data.get('results', data)
+        self.assertEqual(len(conversations), 10)
+        self.assertTrue(all(conversation['unread_count'] == 1 for conversation in conversations))
+
+
+@override_settings(CHAT_RATE_LIMITS={
+    'send_message': {'connection': (1, 2), 'user': (1, 3)},
+    'default': {'connection': (1, 5), 'user': (1, 5)},
+})
+@mock.patch('chat.throttle.time.monotonic', return_value=1000.0)
+class FrameLimiterTests(SimpleTestCase):
+    """Token buckets per socket and per user, with the clock frozen."""
+
+    def limiter(self, user_id=1):
+        limiter = throttle.FrameLimiter(user_id)
+        self.addCleanup(limiter.close)
+        return limiter
+
+    def test_connection_bucket_rejects_after_burst(self, monotonic):
+        limiter = self.limiter()
+        self.assertEqual([limiter.allow('send_message') for _ in range(3)], [True, True, False])
+        # Other frame types have their own buckets
+        self.assertTrue(limiter.allow('typing'))
+
+    def test_user_bucket_is_shared_between_sockets(self, monotonic):
+        first, second = self.limiter(), self.limiter()
+        self.assertEqual([first.allow('send_message') for _ in range(2)], [True, True])
+        self.assertEqual([second.allow('send_message') for _ in range(2)], [True, False])
+        # Another user is not affected
+        self.assertTrue(self.limiter(user_id=2).allow('send_message'))
+
+    def test_rejected_frame_takes_no_tokens(self, monotonic):
+        first, second = self.limiter(), self.limiter()
+        self.assertEqual([first.allow('send_message') for _ in range(3)], [True, True, False])
+        # The connection bucket rejected the third frame, so the user bucket kept its token
+        self.assertTrue(second.allow('send_message'))
+        # Now the user bucket rejects, and the second socket's connection bucket keeps its token
+        self.assertFalse(second.allow('send_message'))
+        self.assertEqual(second.buckets['send_message'].tokens, 1)
+
+    def test_tokens_refill_over_time(self, monotonic):
+        limiter = self.limiter()
+        limiter.allow('send_message')
+        limiter.allow('send_message')
+        self.assertFalse(limiter.allow('send_message'))
+        monotonic.return_value += 1
+        self.assertTrue(limiter.allow('send_message'))
+
+
+def redis_channel_layer_available():
+    """True when the configured channel layer is Redis and its first server answers."""
+    backend = settings.CHANNEL_LAYERS['default']['BACKEND']
+    if not backend.startswith('channels_redis.') or not settings.CHANNEL_REDIS_URLS:
+        return False
+    try:
+        import redis
+        return redis.Redis.from_url(settings.CHANNEL_REDIS_URLS[0], socket_connect_timeout=1).ping()
+    except Exception:
+        return False
+
+
+class ChatSocketTestCase(TransactionTestCase):
+    """A sender and a receiver sharing a conversation, with socket helpers."""
+
+    def setUp(self):
+        cache.clear()
+        self.sender = User.objects.create_user('sender', 'sender@example.com', 'password')
+        self.receiver = User.objects.create_user('receiver', 'receiver@example.com', 'password')
+        self.conversation = Conversation.objects.create()
+        self.conversation.participants.add(self.sender, self.receiver)
+
+    def communicator(self, user):
+        from backend.asgi import application
+        return WebsocketCommunicator(application, f'/ws/chat/?token={AccessToken.for_user(user)}')
+
+    async def receive_until(self, communicator, event_type):
+        while True:
+            event = await communicator.receive_json_from(timeout=5)
+            if event['type'] == event_type:
+                return event
+
+    async def received_types(self, communicator, timeout=0.3):
+        """Types of every event that arrives before the socket goes quiet."""
+        types = []
+        while not await communicator.receive_nothing(timeout=timeout):
+            types.append((await communicator.receive_json_from())['type'])
+        return types
+
+
+@unittest.skipUnless(redis_channel_layer_available(), "Set CHANNEL_REDIS_URLS to a reachable Redis server.")
+class RedisChannelLayerTests(ChatSocketTestCase):
+    """Two chat sockets talking through the configured Redis channel layer."""
+
+    async def test_message_reaches_the_other_participant(self):
+        sender, receiver = self.communicator(self.sender), self.communicator(self.receiver)
+        self.assertTrue((await sender.connect())[0])
+        self.assertTrue((await receiver.connect())[0])
+        try:
+            await receiver.send_json_to({'type': 'join_conversation', 'conversation_id': self.conversation.id})
+            await self.receive_until(receiver, 'joined_conversation')
+
+            await sender.send_json_to({
+                'type': 'send_message', 'conversation_id': self.conversation.id,
+                'content': 'Is this still available?', 'client_id': 'tmp-1',
+            })
+            new_message = await self.receive_until(receiver, 'new_message')
+            self.assertEqual(new_message['message']['content'], 'Is this still available?')
+            self.assertEqual(new_message['message']['sender']['id'], self.sender.id)
+            self.assertEqual(new_message['message']['client_id'], 'tmp-1')
+
+            ack = await self.receive_until(sender, 'message_ack')
+            self.assertEqual(ack['client_id'], 'tmp-1')
+            self.assertEqual(new_message['message']['id'], ack['id'])
+        finally:
+            await sender.disconnect()
+            await receiver.disconnect()
+
+
+@override_settings(
+    CHAT_READ_RECEIPT_DEBOUNCE=0.05,
+    CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+)
+class ReadReceiptCoalescingTests(ChatSocketTestCase):
+    """Rapid mark_read_up_to frames become one write and one receipt."""
+
+    async def test_rapid_frames_send_one_receipt(self):
+        messages = await Message.objects.abulk_create([
+            Message(conversation=self.conversation, sender=self.sender, content=f'Message {i}')
+            for i in range(3)
+        ])
+        sender, receiver = self.communicator(self.sender), self.communicator(self.receiver)
+        self.assertTrue((await sender.connect())[0])
+        self.assertTrue((await receiver.connect())[0])
+        try:
+            for message in (messages[0], messages[2], messages[1]):
+                await receiver.send_json_to({
+                    'type': 'mark_read_up_to', 'conversation_id': self.conversation.id,
+                    'message_id': message.id,
+                })
+
+            receipt = await self.receive_until(sender, 'messages_read_receipt')
+            self.assertEqual(receipt['up_to_message_id'], messages[2].id)
+            self.assertEqual(receipt['reader_id'], self.receiver.id)
+            self.assertEqual(receipt['read_count'], 3)
+            self.assertNotIn('messages_read_receipt', await self.received_types(sender))
+        finally:
+            await sender.disconnect()
+            await receiver.disconnect()
+
+        self.assertFalse(await Message.objects.filter(conversation=self.conversation, is_read=False).aexists())
@@ -0,0 +1,89 @@
+"""
+Rate limits and throttling counters for WebSocket frames.
+
+Every incoming frame type has two token buckets: one per connection and one
+per user, shared by all of that user's sockets in this process. Rates and
+burst sizes come from ``settings.CHAT_RATE_LIMITS``. ``stats`` counts
+throttled frames for this process.
+"""
+import time
+from collections import Counter
+
+from django.conf import settings
+
+stats = Counter()
+
+
+class TokenBucket:
+    """Allows ``rate`` events per second on average, with bursts of up to ``burst``."""
+
+    __slots__ = ('rate', 'burst', 'tokens', 'updated')
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def available(self):
+        """Refill for the time passed and return True if a token can be taken."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return self.tokens >= 1
+
+    def take(self):
+        self.tokens -= 1
+
+
+def limit_key(frame_type):
+    """Frame types without their own limits share the 'default' buckets."""
+    return frame_type if frame_type in settings.CHAT_RATE_LIMITS else 'default'
+
+
+def get_limits(frame_type):
+    return settings.CHAT_RATE_LIMITS[limit_key(frame_type)]
+
+
+class FrameLimiter:
+    """Per-connection and per-user buckets for one socket."""
+
+    # user id -> frame type -> bucket, kept while the user has a socket in this process
+    user_buckets = {}
+    user_sockets = Counter()
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.buckets = {}
+        FrameLimiter.user_sockets[user_id] += 1
+        FrameLimiter.user_buckets.setdefault(user_id, {})
+
+    def _bucket(self, buckets, frame_type, scope):
+        bucket = buckets.get(frame_type)
+        if bucket is None:
+            rate, burst = get_limits(frame_type)[scope]
+            bucket = buckets[frame_type] = TokenBucket(rate, burst)
+        return bucket
+
+    def allow(self, frame_type):
+        """
+        Take a token for the frame from both buckets, or count it as throttled.
+        Both are checked first, so a rejected frame takes no token from either.
+        """
+        frame_type = limit_key(frame_type)
+        buckets = (
+            self._bucket(self.buckets, frame_type, 'connection'),
+            self._bucket(FrameLimiter.user_buckets[self.user_id], frame_type, 'user'),
+        )
+        if all([bucket.available() for bucket in buckets]):
+            for bucket in buckets:
+                bucket.take()
+            return True
+        stats[f'throttled.{frame_type}'] += 1
+        return False
+
+    def close(self):
+        FrameLimiter.user_sockets[self.user_id] -= 1
+        if FrameLimiter.user_sockets[self.user_id] <= 0:
+            del FrameLimiter.user_sockets[self.user_id]
+            FrameLimiter.user_buckets.pop(self.user_id, None)
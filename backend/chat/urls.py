@@ -11,6 +11,14 @@ urlpatterns = [
     
     path('chat/conversations/<int:conversation_id>/mark-read/', views.mark_messages_read, name='mark-messages-read'),
     path('messages/unread-count/', views.unread_count, name='unread-count'),
+    path('chat/presence/', views.presence_status, name='presence-status'),
+    path('chat/socket-stats/', views.socket_stats, name='socket-stats'),
+    
+    # Attachments
+    path('chat/attachments/', views.create_attachment, name='attachment-create'),
+    path('chat/attachments/<int:pk>/upload/', views.upload_attachment, name='attachment-upload'),
+    path('chat/attachments/<int:pk>/complete/', views.complete_attachment, name='attachment-complete'),
+    path('chat/attachments/<int:pk>/download/', views.download_attachment, name='attachment-download'),
     
     # Messages
     path('chat/messages/create/', views.CreateMessageView.as_view(), name='message-create'),
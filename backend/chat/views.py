@@ -1,18 +1,34 @@
+import os
+
 from rest_framework import generics, status, permissions
 from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from django.shortcuts import get_object_or_404
-from django.db.models import Q
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from django.shortcuts import get_object_or_404, redirect
+from django.http import FileResponse, HttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+from django.db import transaction
+from django.db.models import Q, F, Sum
 from django.utils import timezone
-from django.conf import settings
-import pusher
 
-from .models import Conversation, Message
-from .serializers import ConversationSerializer, MessageSerializer, ConversationCreateSerializer
+from . import attachments, events, presence, throttle
+from .models import Conversation, ConversationParticipant, Message, MessageAttachment
+from .serializers import ConversationSerializer, MessageSerializer, ConversationCreateSerializer, MessageAttachmentSerializer
 from users.models import User
 from products.models import Product
 from notifications.views import notify_new_message
+from notifications import delivery
+from backend.pagination import KeysetPagination
+
+
+class MessageKeysetPagination(KeysetPagination):
+    """Keyset pagination over a conversation's history, oldest message first."""
+    keyset_fields = ('timestamp', 'id')
+    ascending = True
 
 
 class MyChatsView(generics.ListAPIView):
@@ -23,7 +39,15 @@ class MyChatsView(generics.ListAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return self.request.user.conversations.prefetch_related('participants', 'product').order_by('-updated_at')
+        # The summary and unread counter are denormalized onto the conversation
+        # and membership rows, so the inbox is a single joined read.
+        return Conversation.objects.filter(
+            memberships__user=self.request.user
+        ).annotate(
+            unread_count=F('memberships__unread_count')
+        ).select_related('last_message', 'product__seller').prefetch_related(
+            'participants', 'product__images', 'product__product_tags__tag',
+        ).order_by('-updated_at')
 
 class ChatMessagesView(generics.ListAPIView):
     """
@@ -31,6 +55,7 @@ class ChatMessagesView(generics.ListAPIView):
     """
     serializer_class = MessageSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = MessageKeysetPagination
 
     def get_queryset(self):
         chat_id = self.kwargs['chat_id']
@@ -50,9 +75,14 @@ class CreateMessageView(generics.CreateAPIView):
         conversation = serializer.validated_data['conversation']
         if self.request.user not in conversation.participants.all():
             raise permissions.PermissionDenied("You are not a participant in this conversation.")
-        message = serializer.save(sender=self.request.user)
-        # Update conversation timestamp
-        conversation.save()
+        attachment_ids = serializer.validated_data.pop('attachment_ids', None)
+        with transaction.atomic():
+            message = serializer.save(sender=self.request.user)
+            # Link attachments uploaded beforehand through the attachment pipeline
+            attachments.attach_to_message(message, attachment_ids, self.request.user.id)
+            # Update the conversation summary, timestamp and unread counters
+            conversation.record_message(message)
+            events.message_recorded(message)
         # Create notification for other participants
         notify_new_message(conversation, self.request.user, message.content)
 
@@ -100,13 +130,42 @@ def unread_count(request):
     """
     Get the total count of unread messages across all conversations for the current user.
     """
-    count = Message.objects.filter(
-        conversation__participants=request.user,
-        is_read=False
-    ).exclude(sender=request.user).count()
+    count = ConversationParticipant.objects.filter(
+        user=request.user
+    ).aggregate(total=Sum('unread_count'))['total'] or 0
     return Response({'unread_count': count})
 
 
+PRESENCE_MAX_IDS = 100
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def presence_status(request):
+    """
+    Get online status and last-seen time for several users at once,
+    e.g. ``?ids=1,2,3``.
+    """
+    try:
+        user_ids = [int(user_id) for user_id in request.query_params.get('ids', '').split(',') if user_id]
+    except ValueError:
+        return Response({'error': 'ids must be a comma-separated list of user ids.'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(user_ids) > PRESENCE_MAX_IDS:
+        return Response({'error': f'At most {PRESENCE_MAX_IDS} ids per request.'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    state = presence.get_presence(user_ids)
+    return Response({str(user_id): value for user_id, value in state.items()})
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def socket_stats(request):
+    """
+    Throttled WebSocket frames, counted since this server process started.
+    """
+    return Response({'pid': os.getpid(), 'counters': dict(throttle.stats)})
+
+
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def mark_messages_read(request, conversation_id):
@@ -115,27 +174,130 @@ def mark_messages_read(request, conversation_id):
     """
     conversation = get_object_or_404(Conversation, id=conversation_id, participants=request.user)
     
-    Message.objects.filter(
-        conversation=conversation, 
-        is_read=False
-    ).exclude(
-        sender=request.user
-    ).update(is_read=True, read_at=timezone.now())
+    with transaction.atomic():
+        count = Message.objects.filter(
+            conversation=conversation, 
+            is_read=False
+        ).exclude(
+            sender=request.user
+        ).update(is_read=True, read_at=timezone.now())
+        conversation.reset_unread(request.user)
+        events.messages_read(conversation.id, request.user.id, count)
     
     return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-@api_view(['GET'])
+# ============ Attachments ============
+
+@api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
-def unread_count(request):
+def create_attachment(request):
     """
-    Get the total count of unread messages across all conversations for the current user.
+    Register an attachment and get instructions for uploading it straight
+    to storage. Send ``attachment_ids`` with a message once it is complete.
     """
-    count = Message.objects.filter(
-        conversation__participants=request.user,
-        is_read=False
-    ).exclude(sender=request.user).count()
-    return Response({'unread_count': count})
+    file_name = (request.data.get('file_name') or '').strip()
+    content_type = request.data.get('content_type') or 'application/octet-stream'
+    try:
+        file_size = int(request.data.get('file_size'))
+    except (TypeError, ValueError):
+        file_size = 0
+    
+    if not file_name or file_size <= 0:
+        return Response({'error': 'file_name and file_size are required.'}, status=status.HTTP_400_BAD_REQUEST)
+    if file_size > attachments.get_setting('MAX_SIZE'):
+        return Response({'error': 'File is too large.'}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+    
+    attachment = MessageAttachment.objects.create(
+        uploader=request.user,
+        file_name=file_name[:255],
+        file_size=file_size,
+        content_type=content_type[:100],
+        file_type=attachments.file_type_for(content_type),
+        storage_key=attachments.new_storage_key(file_name),
+        status='pending',
+    )
+    return Response({
+        'id': attachment.id,
+        'upload': attachments.get_storage().upload_instructions(attachment, request),
+    }, status=status.HTTP_201_CREATED)
+
+
+@csrf_exempt
+@require_http_methods(['PUT'])
+def upload_attachment(request, pk):
+    """
+    Local stand-in for a presigned upload URL: streams the request body to
+    disk in chunks. Authorized by the signed token, not the session.
+    """
+    attachment = get_object_or_404(MessageAttachment, pk=pk, status='pending')
+    if not attachments.is_local() or not attachments.check_upload_token(attachment, request.GET.get('token', '')):
+        return HttpResponse(status=403)
+    
+    max_size = min(attachment.file_size, attachments.get_setting('MAX_SIZE'))
+    if attachments.get_storage().write_stream(attachment.storage_key, request, max_size) is None:
+        return HttpResponse(status=413)
+    return HttpResponse(status=204)
+
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def complete_attachment(request, pk):
+    """Confirm an upload finished; images get a thumbnail in the background."""
+    attachment = get_object_or_404(MessageAttachment, pk=pk, uploader=request.user, status='pending')
+    if not attachments.complete_upload(attachment):
+        return Response({'error': 'The file has not been uploaded.'}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(MessageAttachmentSerializer(attachment, context={'request': request}).data)
+
+
+def _download_user_id(request, signed_user_id):
+    """The user named in the signed link, or else the one whose access token was sent."""
+    if signed_user_id is not None:
+        return signed_user_id
+    token = request.GET.get('token')
+    authorization = request.headers.get('Authorization', '')
+    if authorization.startswith('Bearer '):
+        token = authorization[len('Bearer '):]
+    if not token:
+        return None
+    authentication = JWTAuthentication()
+    try:
+        return authentication.get_user(authentication.get_validated_token(token)).id
+    except (InvalidToken, AuthenticationFailed):
+        return None
+
+
+def download_attachment(request, pk):
+    """
+    Serve an attachment (or its thumbnail) through a signed link to a
+    participant of its conversation. Local files are streamed; Cloudinary
+    files redirect to the CDN.
+    """
+    attachment = get_object_or_404(MessageAttachment, pk=pk)
+    grant = attachments.check_download_signature(attachment, request.GET.get('sig', ''))
+    if grant is None:
+        return HttpResponse(status=403)
+    if not attachments.can_download(attachment, _download_user_id(request, grant.get('user'))):
+        return HttpResponse(status=403)
+    
+    if not attachments.is_local():
+        return redirect(attachments.get_storage().url(attachment, thumbnail=grant.get('thumbnail', False)))
+    
+    if grant['key'] == attachment.thumbnail_key:
+        content_type = 'image/jpeg'
+    else:
+        content_type = attachment.content_type or 'application/octet-stream'
+    # Only plain raster images are shown inline; the declared type is the
+    # uploader's word, so anything else is downloaded and never sniffed.
+    inline = attachments.is_inline_safe(content_type)
+    response = FileResponse(
+        attachments.get_storage().open(grant['key']),
+        content_type=content_type if inline else 'application/octet-stream',
+        as_attachment=not inline,
+        filename=attachment.file_name,
+    )
+    response['X-Content-Type-Options'] = 'nosniff'
+    return response
 
 
 class PusherAuthView(APIView):
@@ -145,13 +307,7 @@ class PusherAuthView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def post(self, request, *args, **kwargs):
-        pusher_client = pusher.Pusher(
-            app_id=settings.PUSHER_CONFIG['app_id'],
-            key=settings.PUSHER_CONFIG['key'],
-            secret=settings.PUSHER_CONFIG['secret'],
-            cluster=settings.PUSHER_CONFIG['cluster'],
-            ssl=True
-        )
+        pusher_client = delivery.get_pusher_client()
 
         channel_name = request.data.get('channel_name')
         socket_id = request.data.get('socket_id')
@@ -0,0 +1,248 @@
+"""
+Asynchronous Pusher delivery queue.
+
+Push events are queued only after the surrounding transaction commits, so
+the request never waits on a Pusher round-trip and never pushes data that
+was rolled back. A dispatcher thread groups queued events into batches of up
+to ``BATCH_SIZE`` (Pusher's ``trigger_batch`` limit) and hands each batch to
+the configured backend:
+
+* ``thread`` (default): sent from a small thread pool, retried with
+  exponential backoff.
+* ``celery``: sent by the ``notifications.tasks.send_push_batch`` task,
+  which retries with the same backoff.
+
+All sends share one pooled ``pusher.Pusher`` client per process.
+
+Channel layer fan-out (``enqueue_group_sends``) uses a second queue of the
+same kind: after commit, each batch of ``group_send`` calls runs concurrently
+in one event loop call, so a request never makes a channel layer round-trip
+per recipient.
+"""
+import asyncio
+import atexit
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pusher
+from asgiref.sync import async_to_sync
+from channels.layers import InMemoryChannelLayer, get_channel_layer
+from django.conf import settings
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'BACKEND': 'thread',
+    'BATCH_SIZE': 10,
+    'LINGER': 0.05,
+    'WORKERS': 2,
+    'MAX_RETRIES': 3,
+    'RETRY_BACKOFF': 0.5,
+    'GROUP_BATCH_SIZE': 100,
+}
+
+
+def get_setting(name):
+    return getattr(settings, 'PUSH_DELIVERY', {}).get(name, DEFAULTS[name])
+
+
+def pusher_enabled():
+    """True when settings.NOTIFICATION_DELIVERY includes Pusher."""
+    return 'pusher' in getattr(settings, 'NOTIFICATION_DELIVERY', ('pusher', 'stream'))
+
+
+# ============ Pooled client ============
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_pusher_client():
+    """Return the process-wide Pusher client, creating it on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                config = settings.PUSHER_CONFIG
+                _client = pusher.Pusher(
+                    app_id=config['app_id'],
+                    key=config['key'],
+                    secret=config['secret'],
+                    cluster=config['cluster'],
+                    ssl=True
+                )
+    return _client
+
+
+def send_batch(events):
+    """Send a batch of events to Pusher in a single request (one attempt)."""
+    get_pusher_client().trigger_batch(events)
+
+
+def send_batch_with_retry(events):
+    """Send a batch, retrying with exponential backoff before giving up."""
+    max_retries, backoff = get_setting('MAX_RETRIES'), get_setting('RETRY_BACKOFF')
+    for attempt in range(max_retries + 1):
+        try:
+            send_batch(events)
+            return True
+        except Exception as e:
+            if attempt == max_retries:
+                logger.error("Dropping %d Pusher events after %d attempts: %s", len(events), attempt + 1, e)
+                return False
+            time.sleep(backoff * (2 ** attempt))
+
+
+def _send_via_celery(events):
+    from .tasks import send_push_batch
+    send_push_batch.delay(events)
+
+
+# ============ Queue ============
+
+class PushQueue:
+    """Collects events from any thread and dispatches them in batches."""
+
+    def __init__(self, sender, batch_size, linger, workers):
+        self.sender = sender
+        self.batch_size = batch_size
+        self.linger = linger
+        self.events = queue.Queue()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='push-delivery')
+        self.dispatcher = threading.Thread(target=self._dispatch, name='push-dispatcher', daemon=True)
+        self.dispatcher.start()
+
+    def put(self, event):
+        self.events.put(event)
+
+    def _dispatch(self):
+        while True:
+            batch = [self.events.get()]
+            deadline = time.monotonic() + self.linger
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.events.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                self.executor.submit(self._send, batch)
+            except RuntimeError:
+                # The executor refuses new work at interpreter shutdown; send
+                # inline so the atexit join() can still complete.
+                self._send(batch)
+
+    def _send(self, batch):
+        try:
+            self.sender(batch)
+        except Exception as e:
+            logger.error("Error delivering Pusher events: %s", e)
+        finally:
+            for _ in batch:
+                self.events.task_done()
+
+    def join(self):
+        """Block until every queued event has been handed to the backend."""
+        self.events.join()
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_queue():
+    """Return the process-wide push queue for the configured backend."""
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                sender = _send_via_celery if get_setting('BACKEND') == 'celery' else send_batch_with_retry
+                _queue = PushQueue(
+                    sender,
+                    batch_size=get_setting('BATCH_SIZE'),
+                    linger=get_setting('LINGER'),
+                    workers=get_setting('WORKERS'),
+                )
+                atexit.register(_queue.join)
+    return _queue
+
+
+def enqueue(channel, event, data):
+    """Queue a Pusher event to be delivered after the current transaction commits."""
+    enqueue_many([(channel, event, data)])
+
+
+def enqueue_many(events):
+    """Queue several ``(channel, event, data)`` Pusher events with a single commit hook."""
+    payloads = [{'channel': channel, 'name': event, 'data': data} for channel, event, data in events]
+    if not payloads:
+        return
+
+    def put_all():
+        push_queue = get_queue()
+        for payload in payloads:
+            push_queue.put(payload)
+
+    transaction.on_commit(put_all)
+
+
+# ============ Channel layer fan-out ============
+
+def send_group_batch(messages):
+    """Send ``{'group', 'message'}`` items to the channel layer concurrently."""
+    channel_layer = get_channel_layer()
+
+    async def send_all():
+        results = await asyncio.gather(
+            *(channel_layer.group_send(item['group'], item['message']) for item in messages),
+            return_exceptions=True
+        )
+        failed = [result for result in results if isinstance(result, Exception)]
+        if failed:
+            logger.error("Failed to send %d of %d channel layer messages: %s", len(failed), len(messages), failed[0])
+
+    async_to_sync(send_all)()
+
+
+_group_queue = None
+
+
+def get_group_queue():
+    """Return the process-wide channel layer fan-out queue."""
+    global _group_queue
+    if _group_queue is None:
+        with _queue_lock:
+            if _group_queue is None:
+                _group_queue = PushQueue(
+                    send_group_batch,
+                    batch_size=get_setting('GROUP_BATCH_SIZE'),
+                    linger=get_setting('LINGER'),
+                    workers=1,
+                )
+                atexit.register(_group_queue.join)
+    return _group_queue
+
+
+def enqueue_group_sends(messages):
+    """Queue ``(group, message)`` channel layer sends to run after the current transaction commits."""
+    items = [{'group': group, 'message': message} for group, message in messages]
+    if not items:
+        return
+
+    def put_all():
+        if isinstance(get_channel_layer(), InMemoryChannelLayer):
+            # The in-memory (development) layer only works from the event
+            # loop serving the consumers, not from the queue's thread.
+            send_group_batch(items)
+            return
+        group_queue = get_group_queue()
+        for item in items:
+            group_queue.put(item)
+
+    transaction.on_commit(put_all)
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:23
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0005_message_keyset_index'),
+        ('notifications', '0003_initial'),
+        ('products', '0005_product_keyset_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['recipient', 'created_at', 'id'], name='notificatio_recipie_1609ca_idx'),
+        ),
+    ]
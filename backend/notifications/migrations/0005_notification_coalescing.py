@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:29
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def backfill_last_event_at(apps, schema_editor):
+    Notification = apps.get_model('notifications', 'Notification')
+    Notification.objects.update(last_event_at=models.F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0004_notification_keyset_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='event_count',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='last_event_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(backfill_last_event_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:50
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0009_message_content_max_length'),
+        ('notifications', '0006_notification_actor_ids'),
+        ('products', '0007_category_foreign_key'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='notification',
+            name='notificatio_recipie_1609ca_idx',
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['recipient', 'last_event_at', 'id'], name='notificatio_recipie_14143c_idx'),
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 from products.models import Product
 from chat.models import Conversation
 
@@ -33,6 +34,12 @@ class Notification(models.Model):
     is_read = models.BooleanField(default=False)
     is_sent = models.BooleanField(default=False)  # For push notifications
     
+    # Coalescing: repeated events of the same type and target update one row
+    event_count = models.PositiveIntegerField(default=1)
+    last_event_at = models.DateTimeField(default=timezone.now)
+    # Distinct senders merged into this notification
+    actor_ids = models.JSONField(default=list, blank=True)
+    
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
     read_at = models.DateTimeField(null=True, blank=True)
@@ -43,6 +50,7 @@ class Notification(models.Model):
         indexes = [
             models.Index(fields=['recipient', 'is_read']),
             models.Index(fields=['created_at']),
+            models.Index(fields=['recipient', 'last_event_at', 'id']),
         ]
     
     def __str__(self):
@@ -51,7 +59,6 @@ class Notification(models.Model):
     def mark_as_read(self):
         """Mark notification as read"""
         if not self.is_read:
-            from django.utils import timezone
             self.is_read = True
             self.read_at = timezone.now()
             self.save(update_fields=['is_read', 'read_at'])
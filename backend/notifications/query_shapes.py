@@ -0,0 +1,10 @@
+"""
+Hot query shapes of the notifications API, checked for full table scans by
+``manage.py explain_queries``.
+"""
+from .models import Notification
+
+QUERY_SHAPES = {
+    'notification feed': lambda: Notification.objects.filter(recipient_id=1).order_by('-last_event_at', '-id')[:20],
+    'unread notifications': lambda: Notification.objects.filter(recipient_id=1, is_read=False),
+}
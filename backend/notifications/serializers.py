@@ -14,9 +14,10 @@ class NotificationSerializer(serializers.ModelSerializer):
         model = Notification
         fields = [
             'id', 'sender', 'notification_type', 'title', 'message',
-            'product', 'conversation', 'is_read', 'created_at', 'read_at'
+            'product', 'conversation', 'is_read', 'event_count', 'last_event_at',
+            'created_at', 'read_at'
         ]
-        read_only_fields = ['created_at', 'read_at']
+        read_only_fields = ['event_count', 'last_event_at', 'created_at', 'read_at']
 
 
 class NotificationPreferenceSerializer(serializers.ModelSerializer):
@@ -0,0 +1,126 @@
+"""
+Server-Sent Events delivery of notifications.
+
+Notifications are published to a per-user channel layer group after commit
+(through the delivery queue's channel layer fan-out) and streamed to ``GET /api/notifications/stream/`` by an async view on the
+ASGI server, so clients can receive them without Pusher. New notifications
+carry their id as the SSE event id; a reconnecting client sends it back in
+``Last-Event-ID`` and first receives whatever it missed from the database:
+new notifications after that id, then a ``notification-updated`` for each
+coalesced notification at or below it that got new events since that
+notification was created (updates already seen live may be sent again; they
+carry the full state). If more than ``RESUME_LIMIT`` would be replayed, or the
+``Last-Event-ID`` notification no longer exists, a single ``resync`` event is
+sent instead and the client should refetch the notification list.
+"""
+import asyncio
+import json
+
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+from . import delivery
+
+KEEPALIVE_INTERVAL = 15
+RESUME_LIMIT = 100
+
+
+def stream_enabled():
+    return 'stream' in getattr(settings, 'NOTIFICATION_DELIVERY', ('pusher', 'stream'))
+
+
+def group_name(user_id):
+    return f'notifications_{user_id}'
+
+
+def publish(events, event='new-notification'):
+    """Publish ``(recipient_id, payload)`` pairs to the recipients' streams after commit."""
+    if not stream_enabled():
+        return
+    delivery.enqueue_group_sends(
+        (group_name(recipient_id), {'type': 'notification.event', 'event': event, 'payload': payload})
+        for recipient_id, payload in events
+    )
+
+
+def format_event(event, payload, event_id=None):
+    """Encode one SSE message."""
+    lines = [f'event: {event}']
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'data: {json.dumps(payload)}')
+    return '\n'.join(lines) + '\n\n'
+
+
+@database_sync_to_async
+def _missed_notifications(user_id, last_event_id):
+    """
+    Return ``(new, updated)`` payload lists to replay after ``last_event_id``,
+    or None when the client must resync instead.
+    """
+    from users.snapshots import get_user_snapshots
+    from .models import Notification
+    from .views import _notification_payload
+
+    notifications = Notification.objects.filter(recipient_id=user_id)
+    anchor = notifications.filter(id=last_event_id).values_list('created_at', flat=True).first()
+    if anchor is None:
+        return None
+    new = list(notifications.filter(id__gt=last_event_id).order_by('id')[:RESUME_LIMIT + 1])
+    updated = list(notifications.filter(
+        id__lte=last_event_id, event_count__gt=1, last_event_at__gt=anchor
+    ).order_by('last_event_at')[:RESUME_LIMIT + 1])
+    if len(new) + len(updated) > RESUME_LIMIT:
+        return None
+
+    senders = get_user_snapshots({notification.sender_id for notification in new + updated if notification.sender_id})
+    return tuple(
+        [_notification_payload(notification, senders.get(notification.sender_id)) for notification in rows]
+        for rows in (new, updated)
+    )
+
+
+async def event_stream(user_id, last_event_id=None):
+    """
+    Yield SSE messages for a user until the client disconnects. The group is
+    joined before missed notifications are loaded, so nothing falls between
+    the replay and the live stream.
+    """
+    channel_layer = get_channel_layer()
+    channel = await channel_layer.new_channel()
+    await channel_layer.group_add(group_name(user_id), channel)
+    try:
+        yield 'retry: 3000\n\n'
+
+        replayed = set()
+        if last_event_id is not None:
+            missed = await _missed_notifications(user_id, last_event_id)
+            if missed is None:
+                yield format_event('resync', {})
+            else:
+                new, updated = missed
+                for payload in new:
+                    replayed.add(payload['id'])
+                    yield format_event('new-notification', payload, payload['id'])
+                for payload in updated:
+                    yield format_event('notification-updated', payload)
+
+        while True:
+            try:
+                message = await asyncio.wait_for(channel_layer.receive(channel), KEEPALIVE_INTERVAL)
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+                continue
+
+            payload = message['payload']
+            if message['event'] == 'new-notification':
+                # Already replayed from the database
+                if payload['id'] in replayed:
+                    continue
+                yield format_event(message['event'], payload, payload['id'])
+            else:
+                # Updates don't move the resume position
+                yield format_event(message['event'], payload)
+    finally:
+        await channel_layer.group_discard(group_name(user_id), channel)
@@ -0,0 +1,21 @@
+from celery import shared_task
+from . import delivery
+
+
+@shared_task(bind=True, max_retries=None, ignore_result=True)
+def send_push_batch(self, events):
+    """Send a batch of Pusher events, retrying with exponential backoff."""
+    try:
+        delivery.send_batch(events)
+    except Exception as exc:
+        if self.request.retries >= delivery.get_setting('MAX_RETRIES'):
+            raise
+        countdown = delivery.get_setting('RETRY_BACKOFF') * (2 ** self.request.retries)
+        raise self.retry(exc=exc, countdown=countdown)
+
+
+@shared_task(ignore_result=True)
+def push_coalesced_update(notification_id):
+    """Send the trailing push for a coalesced notification whose updates were throttled."""
+    from .views import push_trailing_update
+    push_trailing_update(notification_id)
@@ -7,6 +7,8 @@ urlpatterns = [
     path('notifications/<int:pk>/', views.NotificationDetailView.as_view(), name='notification-detail'),
     path('notifications/mark-all-read/', views.mark_all_read, name='mark-all-read'),
     path('notifications/unread-count/', views.unread_count, name='notification-unread-count'),
+    path('notifications/announce/', views.announce, name='notification-announce'),
+    path('notifications/stream/', views.notification_stream, name='notification-stream'),
     
     # Preferences
     path('notifications/preferences/', views.NotificationPreferenceView.as_view(), name='notification-preferences'),
@@ -1,23 +1,49 @@
+import logging
+import threading
+from functools import partial
+
 from rest_framework import generics, status, permissions
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
-from django.utils import timezone
+from django.contrib.auth.models import AnonymousUser
+from django.http import JsonResponse, StreamingHttpResponse
 from django.conf import settings
-import pusher
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils import timezone
+from datetime import timedelta
 from .models import Notification, NotificationPreference
 from .serializers import NotificationSerializer, NotificationPreferenceSerializer
+from backend.pagination import KeysetPagination
+from . import delivery, stream
+from chat.middleware import get_user_from_token
+from users import counters
+from users.snapshots import get_user_snapshot
+
+User = get_user_model()
+logger = logging.getLogger(__name__)
+
+
+class NotificationKeysetPagination(KeysetPagination):
+    """Keyset pagination over the feed, most recent activity first."""
+    keyset_fields = ('last_event_at', 'id')
 
 
 class NotificationListView(generics.ListAPIView):
-    """List user notifications"""
+    """
+    List user notifications. A coalesced notification moves to the top when
+    it gets a new event.
+    """
     
     serializer_class = NotificationSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = NotificationKeysetPagination
     
     def get_queryset(self):
         return Notification.objects.filter(
             recipient=self.request.user
-        ).select_related('sender', 'product').order_by('-created_at')
+        ).select_related('sender', 'product').order_by('-last_event_at', '-id')
 
 
 class NotificationDetailView(generics.RetrieveUpdateAPIView):
@@ -32,9 +58,17 @@ class NotificationDetailView(generics.RetrieveUpdateAPIView):
     def retrieve(self, request, *args, **kwargs):
         """Mark notification as read when retrieved"""
         instance = self.get_object()
-        instance.mark_as_read()
+        if not instance.is_read:
+            instance.mark_as_read()
+            counters.changed([instance.recipient_id], unread_notifications=-1)
         serializer = self.get_serializer(instance)
         return Response(serializer.data)
+    
+    def perform_update(self, serializer):
+        was_read = serializer.instance.is_read
+        notification = serializer.save()
+        if notification.is_read != was_read:
+            counters.changed([notification.recipient_id], unread_notifications=-1 if notification.is_read else 1)
 
 
 @api_view(['POST'])
@@ -47,11 +81,11 @@ def mark_all_read(request):
         is_read=False
     )
     
-    count = notifications.count()
-    notifications.update(
+    count = notifications.update(
         is_read=True,
         read_at=timezone.now()
     )
+    counters.changed([request.user.id], unread_notifications=-count)
     
     return Response({
         'message': f'{count} notifications marked as read'
@@ -71,6 +105,20 @@ def unread_count(request):
     return Response({'unread_count': count})
 
 
+@api_view(['POST'])
+@permission_classes([permissions.IsAdminUser])
+def announce(request):
+    """Broadcast a system notification to all users, or to one college"""
+    
+    title = request.data.get('title')
+    message = request.data.get('message')
+    if not title or not message:
+        return Response({'error': 'title and message are required.'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    notifications = notify_system_announcement(title, message, college=request.data.get('college'))
+    return Response({'sent': len(notifications)}, status=status.HTTP_201_CREATED)
+
+
 class NotificationPreferenceView(generics.RetrieveUpdateAPIView):
     """User notification preferences"""
     
@@ -84,108 +132,304 @@ class NotificationPreferenceView(generics.RetrieveUpdateAPIView):
         return preferences
 
 
-# ============ Pusher Push Helper ============
+# ============ Server-Sent Events ============
 
-def _get_pusher_client():
-    """Get a configured Pusher client instance."""
-    config = settings.PUSHER_CONFIG
-    return pusher.Pusher(
-        app_id=config['app_id'],
-        key=config['key'],
-        secret=config['secret'],
-        cluster=config['cluster'],
-        ssl=True
+async def notification_stream(request):
+    """
+    Stream the current user's notifications as Server-Sent Events.
+    EventSource can't send headers, so the access token may also be passed
+    as ``?token=``. Resumes after the id in ``Last-Event-ID``.
+    """
+    token = request.GET.get('token')
+    authorization = request.headers.get('Authorization', '')
+    if authorization.startswith('Bearer '):
+        token = authorization[len('Bearer '):]
+    user = await get_user_from_token(token) if token else AnonymousUser()
+    if not user.is_authenticated:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+    
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+    
+    response = StreamingHttpResponse(
+        stream.event_stream(user.id, last_event_id),
+        content_type='text/event-stream'
     )
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
 
 
-def _push_notification(notification):
-    """Push a notification to the user via Pusher."""
+# ============ Pusher Push Helper ============
+
+def _notification_payload(notification, sender):
+    """Build the Pusher payload for a notification."""
+    return {
+        'id': notification.id,
+        'type': notification.notification_type,
+        'title': notification.title,
+        'message': notification.message,
+        'sender': {
+            'id': sender.id,
+            'username': sender.username,
+            'name': sender.get_full_name(),
+        } if sender else None,
+        'product_id': notification.product_id,
+        'conversation_id': notification.conversation_id,
+        'event_count': notification.event_count,
+        'created_at': notification.created_at.isoformat(),
+    }
+
+
+def _push_notifications(notifications, sender=None, event='new-notification'):
+    """
+    Queue notifications for delivery to their recipients, as one batch, via
+    the backends in settings.NOTIFICATION_DELIVERY (Pusher and/or the SSE stream).
+    """
+    events = [
+        (notification.recipient_id, _notification_payload(notification, sender))
+        for notification in notifications
+    ]
     try:
-        pusher_client = _get_pusher_client()
-        channel_name = f'private-notifications-{notification.recipient.id}'
-        
-        data = {
-            'id': notification.id,
-            'type': notification.notification_type,
-            'title': notification.title,
-            'message': notification.message,
-            'sender': {
-                'id': notification.sender.id,
-                'username': notification.sender.username,
-                'name': notification.sender.get_full_name(),
-            } if notification.sender else None,
-            'product_id': notification.product_id,
-            'conversation_id': notification.conversation_id,
-            'created_at': notification.created_at.isoformat(),
-        }
-        
-        pusher_client.trigger(channel_name, 'new-notification', data)
-    except Exception as e:
-        print(f"Error pushing notification via Pusher: {e}")
+        if delivery.pusher_enabled():
+            delivery.enqueue_many([
+                (f'private-notifications-{recipient_id}', event, payload)
+                for recipient_id, payload in events
+            ])
+        stream.publish(events, event)
+    except Exception:
+        logger.exception("Could not queue %d notifications for delivery", len(events))
+
+
+def _coalesced_push_key(notification_id):
+    return f'notification:coalesced-push:{notification_id}'
+
+
+def _push_coalesced_notifications(notifications, sender=None):
+    """
+    Push updates for coalesced notifications, at most once per
+    NOTIFICATION_COALESCE_PUSH_INTERVAL per notification. A throttled update
+    schedules one trailing push at the end of the interval, so the client
+    always ends up with the latest count.
+    """
+    interval = getattr(settings, 'NOTIFICATION_COALESCE_PUSH_INTERVAL', 10)
+    due = []
+    for notification in notifications:
+        if cache.add(_coalesced_push_key(notification.id), 1, interval):
+            due.append(notification)
+        elif cache.add(f'notification:coalesced-trailing:{notification.id}', 1, interval):
+            transaction.on_commit(partial(_schedule_trailing_push, notification.id, interval))
+    _push_notifications(due, sender, event='notification-updated')
+
+
+def _schedule_trailing_push(notification_id, delay):
+    if delivery.get_setting('BACKEND') == 'celery':
+        from .tasks import push_coalesced_update
+        push_coalesced_update.apply_async(args=[notification_id], countdown=delay)
+        return
+    timer = threading.Timer(delay, _push_trailing_update_in_thread, args=[notification_id])
+    timer.daemon = True
+    timer.start()
+
+
+def _push_trailing_update_in_thread(notification_id):
+    try:
+        push_trailing_update(notification_id)
+    except Exception:
+        logger.exception("Could not send the trailing update for notification %s", notification_id)
+    finally:
+        connection.close()
+
+
+def push_trailing_update(notification_id):
+    """Push the current state of a coalesced notification and restart its push interval."""
+    cache.delete(f'notification:coalesced-trailing:{notification_id}')
+    notification = Notification.objects.filter(id=notification_id, is_read=False).first()
+    if notification is None:
+        return
+    cache.set(_coalesced_push_key(notification_id), 1, getattr(settings, 'NOTIFICATION_COALESCE_PUSH_INTERVAL', 10))
+    sender = get_user_snapshot(notification.sender_id) if notification.sender_id else None
+    _push_notifications([notification], sender, event='notification-updated')
 
 
 # ============ Notification Creation Utilities ============
 
+BULK_BATCH_SIZE = 500
+
+
+def create_notifications(recipient_ids, notification_type, title, message, sender=None, product=None, conversation=None):
+    """
+    Create the same notification for many recipients and push them via Pusher.
+
+    Rows are inserted with ``bulk_create`` in batches of ``BULK_BATCH_SIZE``
+    and each batch is queued for Pusher together, so broadcasting to
+    thousands of users costs a handful of INSERTs and batched triggers.
+    """
+    recipient_ids = list(recipient_ids)
+    created = []
+    for start in range(0, len(recipient_ids), BULK_BATCH_SIZE):
+        notifications = Notification.objects.bulk_create([
+            Notification(
+                recipient_id=recipient_id,
+                sender=sender,
+                notification_type=notification_type,
+                title=title,
+                message=message,
+                product=product,
+                conversation=conversation,
+                actor_ids=[sender.id] if sender else [],
+            )
+            for recipient_id in recipient_ids[start:start + BULK_BATCH_SIZE]
+        ])
+        # Push real-time notifications via Pusher
+        _push_notifications(notifications, sender)
+        counters.changed([notification.recipient_id for notification in notifications], unread_notifications=1)
+        created.extend(notifications)
+    return created
+
+
+def create_or_coalesce_notifications(recipient_ids, notification_type, title, render_message, sender=None,
+                                     product=None, conversation=None, count_repeat_sender=True):
+    """
+    Like create_notifications(), but merges into an existing notification instead
+    of inserting a new one when the recipient still has an unread notification of
+    the same type and target whose last event is inside the coalescing window
+    (settings.NOTIFICATION_COALESCE_WINDOWS). Types without a window are never merged.
+
+    ``render_message(event_count)`` builds the message text for the merged count.
+    The distinct senders are kept in ``actor_ids``; with
+    ``count_repeat_sender=False`` the count only rises for a sender not yet in
+    that set, so it counts people rather than events (e.g. like/unlike/like).
+    """
+    recipient_ids = list(recipient_ids)
+    window = getattr(settings, 'NOTIFICATION_COALESCE_WINDOWS', {}).get(notification_type)
+    if not window:
+        return create_notifications(
+            recipient_ids, notification_type, title, render_message(1),
+            sender=sender, product=product, conversation=conversation
+        )
+    
+    now = timezone.now()
+    with transaction.atomic():
+        open_notifications = Notification.objects.select_for_update().filter(
+            recipient_id__in=recipient_ids,
+            notification_type=notification_type,
+            product=product,
+            conversation=conversation,
+            is_read=False,
+            last_event_at__gte=now - timedelta(seconds=window),
+        ).order_by('recipient_id', '-last_event_at')
+        
+        merged = {}
+        for notification in open_notifications:
+            merged.setdefault(notification.recipient_id, notification)
+        
+        for notification in merged.values():
+            # Rows from before actor_ids was tracked start from their last sender.
+            actor_ids = notification.actor_ids or ([notification.sender_id] if notification.sender_id else [])
+            new_actor = sender is not None and sender.id not in actor_ids
+            if new_actor:
+                actor_ids.append(sender.id)
+            if count_repeat_sender or new_actor:
+                notification.event_count += 1
+            notification.actor_ids = actor_ids
+            notification.sender = sender
+            notification.message = render_message(notification.event_count)
+            notification.last_event_at = now
+            notification.save(update_fields=['event_count', 'actor_ids', 'sender', 'message', 'last_event_at'])
+        _push_coalesced_notifications(merged.values(), sender)
+        
+        created = create_notifications(
+            [recipient_id for recipient_id in recipient_ids if recipient_id not in merged],
+            notification_type, title, render_message(1),
+            sender=sender, product=product, conversation=conversation
+        )
+    return list(merged.values()) + created
+
+
 def create_notification(recipient, notification_type, title, message, sender=None, product=None, conversation=None):
     """Create a new notification and push it via Pusher."""
     
-    notification = Notification.objects.create(
-        recipient=recipient,
-        sender=sender,
-        notification_type=notification_type,
-        title=title,
-        message=message,
-        product=product,
-        conversation=conversation
-    )
-    
-    # Push real-time notification via Pusher
-    _push_notification(notification)
-    
-    return notification
+    return create_notifications(
+        [recipient.id], notification_type, title, message,
+        sender=sender, product=product, conversation=conversation
+    )[0]
 
 
 def notify_new_message(conversation, sender, message_content):
     """Create notification for new message"""
     
     # Get other participants
-    other_participants = conversation.participants.exclude(id=sender.id)
-    
-    for participant in other_participants:
-        create_notification(
-            recipient=participant,
-            sender=sender,
-            notification_type='message',
-            title='New Message',
-            message=f'{sender.get_full_name() or sender.username} sent you a message: {message_content[:50]}...',
-            conversation=conversation
-        )
+    recipient_ids = conversation.participants.exclude(id=sender.id).values_list('id', flat=True)
+    sender_name = sender.get_full_name() or sender.username
+    
+    def render_message(count):
+        if count == 1:
+            return f'{sender_name} sent you a message: {message_content[:50]}...'
+        return f'{sender_name} sent you {count} messages: {message_content[:50]}...'
+    
+    create_or_coalesce_notifications(
+        recipient_ids,
+        sender=sender,
+        notification_type='message',
+        title='New Message',
+        render_message=render_message,
+        conversation=conversation
+    )
 
 
 def notify_product_liked(product, liker):
     """Create notification for product like"""
     
-    if product.seller.id == liker.id:
+    if product.seller_id == liker.id:
         return  # Don't notify if user likes their own product
     
-    create_notification(
-        recipient=product.seller,
+    liker_name = liker.get_full_name() or liker.username
+    
+    def render_message(count):
+        if count == 1:
+            return f'{liker_name} liked your product "{product.title}"'
+        others = count - 1
+        return f'{liker_name} and {others} other{"s" if others > 1 else ""} liked your product "{product.title}"'
+    
+    create_or_coalesce_notifications(
+        [product.seller_id],
         sender=liker,
         notification_type='product_like',
         title='Product Liked',
-        message=f'{liker.get_full_name() or liker.username} liked your product "{product.title}"',
-        product=product
+        render_message=render_message,
+        product=product,
+        count_repeat_sender=False
     )
 
 
 def notify_product_sold(product, buyer=None):
     """Create notification for product sold"""
     
-    create_notification(
-        recipient=product.seller,
+    create_notifications(
+        [product.seller_id],
         sender=buyer,
         notification_type='product_sold',
         title='Product Sold',
         message=f'Your product "{product.title}" has been sold!',
         product=product
     )
+
+
+def notify_system_announcement(title, message, college=None):
+    """Broadcast a system notification to all active users, or only those of one college"""
+    
+    recipients = User.objects.filter(is_active=True)
+    if college:
+        recipients = recipients.filter(college__iexact=college)
+    
+    return create_notifications(
+        recipients.values_list('id', flat=True).iterator(),
+        notification_type='system',
+        title=title,
+        message=message
+    )
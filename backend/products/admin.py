@@ -38,6 +38,7 @@ class ProductAdmin(admin.ModelAdmin):
         'is_active', 'created_at'
     ]
     search_fields = ['title', 'description', 'seller__username', 'brand']
+    list_select_related = ['seller', 'category']
     ordering = ['-created_at']
     readonly_fields = [
         'views_count', 'likes_count', 'created_at', 
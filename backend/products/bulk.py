@@ -0,0 +1,229 @@
+"""
+Bulk import and export of product listings as CSV or JSON Lines.
+
+Imports are read as a stream of rows and handled in chunks. Each chunk is
+validated with ``ProductCreateUpdateSerializer``, then its valid rows are
+saved in one transaction: one ``bulk_create`` for the products, one tag
+lookup plus one ``bulk_create`` for new tags, and one ``bulk_create`` for
+the tag relations. Every row gets a result (created, or its errors), so
+callers can stream a report back while the import runs.
+
+CSV columns match the JSON keys; tags are separated by ``|`` in CSV and
+given as a list in JSON Lines. Exports use the same layout, so an export
+can be imported again.
+"""
+import csv
+import io
+import json
+import logging
+from itertools import islice
+
+from django.db import transaction
+from django.utils.text import slugify
+
+from . import categories, facets, search
+from .models import Product, ProductTag, ProductTagRelation
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ('csv', 'jsonl')
+CHUNK_SIZE = 200
+TAG_SEPARATOR = '|'
+
+IMPORT_FIELDS = (
+    'title', 'description', 'price', 'original_price', 'category',
+    'condition', 'brand', 'location', 'tags',
+)
+EXPORT_FIELDS = ('id',) + IMPORT_FIELDS + ('is_sold', 'created_at')
+
+
+def detect_format(file_name='', content_type=''):
+    """Guess the import format from a file name or content type; defaults to CSV."""
+    if file_name.lower().endswith(('.jsonl', '.ndjson')) or 'json' in content_type:
+        return 'jsonl'
+    return 'csv'
+
+
+# ============ Tags ============
+
+def get_or_create_tags(names):
+    """
+    Return ``{name: ProductTag}`` for normalized tag ``names``, creating the
+    missing ones with a single ``bulk_create``.
+    """
+    names = {name.strip().lower() for name in names if name and name.strip()}
+    if not names:
+        return {}
+    tags = {tag.name: tag for tag in ProductTag.objects.filter(name__in=names)}
+    missing = names - tags.keys()
+    if missing:
+        # bulk_create skips ProductTag.save(), so the slug is set here.
+        ProductTag.objects.bulk_create(
+            [ProductTag(name=name, slug=slugify(name) or name) for name in missing],
+            ignore_conflicts=True,
+        )
+        tags.update({tag.name: tag for tag in ProductTag.objects.filter(name__in=missing)})
+        # A tag whose slug is already taken by another name was skipped above.
+        for name in missing - tags.keys():
+            tags[name] = ProductTag.objects.get_or_create(
+                name=name, defaults={'slug': f'{slugify(name) or "tag"}-{len(tags)}'}
+            )[0]
+    return tags
+
+
+# ============ Import ============
+
+def read_rows(stream, file_format):
+    """
+    Yield ``(row_number, data)`` pairs from a binary stream. ``data`` is None
+    for a line that could not be parsed.
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if file_format == 'jsonl':
+        for row_number, line in enumerate(text, 1):
+            if not line.strip():
+                continue
+            try:
+                data = json.loads(line)
+            except ValueError:
+                data = None
+            yield row_number, data if isinstance(data, dict) else None
+    else:
+        reader = csv.DictReader(text)
+        # Row 1 is the header
+        for row_number, data in enumerate(reader, 2):
+            if data.get('tags'):
+                data['tags'] = data['tags'].split(TAG_SEPARATOR)
+            yield row_number, data
+
+
+def _clean(data):
+    """Keep known fields, drop empty CSV cells and accept condition display names."""
+    cleaned = {field: data[field] for field in IMPORT_FIELDS if data.get(field) not in (None, '')}
+    if 'tags' in cleaned:
+        tags = cleaned['tags'] if isinstance(cleaned['tags'], list) else [cleaned['tags']]
+        cleaned['tags'] = [tag.strip() for tag in map(str, tags) if tag.strip()]
+    conditions = {display.lower(): value for value, display in Product.CONDITION_CHOICES}
+    condition = str(cleaned.get('condition', ''))
+    cleaned['condition'] = conditions.get(condition.lower(), condition)
+    return cleaned
+
+
+def _save_chunk(seller, valid):
+    """Save ``[(row_number, validated_data), ...]`` in one transaction and return the products."""
+    with transaction.atomic():
+        products = Product.objects.bulk_create([
+            Product(seller=seller, **{key: value for key, value in data.items() if key not in ('tags', 'images')})
+            for _, data in valid
+        ])
+        tags = get_or_create_tags(name for _, data in valid for name in data.get('tags', []))
+        ProductTagRelation.objects.bulk_create([
+            ProductTagRelation(product=product, tag=tags[name])
+            for product, (_, data) in zip(products, valid)
+            for name in {name.strip().lower() for name in data.get('tags', []) if name.strip()}
+        ], ignore_conflicts=True)
+        # bulk_create skips the post_save handlers in products.signals.
+        search.index_products([product.pk for product in products])
+        transaction.on_commit(facets.invalidate)
+    return products
+
+
+def _error(row_number, message):
+    return {'row': row_number, 'status': 'error', 'errors': {'non_field_errors': [message]}}
+
+
+def import_products(rows, seller, chunk_size=CHUNK_SIZE, max_rows=None):
+    """
+    Import ``(row_number, data)`` pairs for ``seller`` and yield one result
+    dict per row, in row order: ``{'row', 'status': 'created', 'id'}`` or
+    ``{'row', 'status': 'error', 'errors'}``. Reading stops after ``max_rows``;
+    if more rows follow, a single ``{'row', 'status': 'truncated', 'errors'}``
+    result for the first skipped row ends the import.
+    """
+    # Imported here: the serializers import this module's tag helpers.
+    from .serializers import ProductCreateUpdateSerializer
+
+    rows = iter(rows)
+    remaining = max_rows
+    while True:
+        if remaining is not None and remaining <= 0:
+            extra = next(rows, None)
+            if extra is not None:
+                yield {
+                    'row': extra[0], 'status': 'truncated',
+                    'errors': {'non_field_errors': [f'Only {max_rows} rows can be imported at once.']},
+                }
+            return
+        chunk = list(islice(rows, chunk_size if remaining is None else min(chunk_size, remaining)))
+        if not chunk:
+            return
+        if remaining is not None:
+            remaining -= len(chunk)
+
+        results, valid = {}, []
+        for row_number, data in chunk:
+            if data is None:
+                results[row_number] = _error(row_number, 'Row could not be parsed.')
+                continue
+            serializer = ProductCreateUpdateSerializer(data=_clean(data))
+            if serializer.is_valid():
+                valid.append((row_number, serializer.validated_data))
+            else:
+                results[row_number] = {'row': row_number, 'status': 'error', 'errors': serializer.errors}
+
+        if valid:
+            try:
+                products = _save_chunk(seller, valid)
+            except Exception:
+                logger.exception("Could not save %d imported products for user %s", len(valid), seller.pk)
+                for row_number, _ in valid:
+                    results[row_number] = _error(row_number, 'Could not be saved.')
+            else:
+                for product, (row_number, _) in zip(products, valid):
+                    results[row_number] = {'row': row_number, 'status': 'created', 'id': product.pk}
+
+        for row_number, _ in chunk:
+            yield results[row_number]
+
+
+# ============ Export ============
+
+class _Echo:
+    """File-like object whose write() returns the line, for streaming csv.writer output."""
+
+    def write(self, value):
+        return value
+
+
+def _export_record(product):
+    category = categories.get(product.category_id)
+    return {
+        'id': product.pk,
+        'title': product.title,
+        'description': product.description,
+        'price': str(product.price),
+        'original_price': str(product.original_price) if product.original_price is not None else None,
+        'category': category.name if category else '',
+        'condition': product.condition,
+        'brand': product.brand,
+        'location': product.location,
+        'tags': [relation.tag.name for relation in product.product_tags.all()],
+        'is_sold': product.is_sold,
+        'created_at': product.created_at.isoformat(),
+    }
+
+
+def export_products(queryset, file_format):
+    """Yield ``queryset`` as CSV or JSON Lines text, one line at a time."""
+    products = queryset.order_by('pk').prefetch_related('product_tags__tag').iterator(chunk_size=CHUNK_SIZE)
+    if file_format == 'jsonl':
+        for product in products:
+            yield json.dumps(_export_record(product)) + '\n'
+        return
+
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for product in products:
+        record = _export_record(product)
+        record['tags'] = TAG_SEPARATOR.join(record['tags'])
+        yield writer.writerow(['' if record[field] is None else record[field] for field in EXPORT_FIELDS])
@@ -0,0 +1,117 @@
+"""
+Layered cache for product listings.
+
+Product cards (the ``ProductSerializer`` payload without per-user flags) are
+shared between all users and cached under
+``product:card:<id>:<cards version>.<version>``. Saving a product, its images
+or its tags bumps the product's version, so a stale card is never read again
+even if a concurrent request writes it back. Changes that touch many cards
+at once (e.g. a renamed category) bump the shared cards version instead.
+
+The per-user ``is_in_wishlist`` / ``is_liked`` flags come from a small
+overlay of wishlist and like ids per user, merged in at response time.
+"""
+from django.core.cache import cache
+
+CARD_TIMEOUT = 60 * 5
+VERSION_TIMEOUT = 60 * 60 * 24
+USER_FLAGS_TIMEOUT = 60 * 10
+
+USER_FLAG_FIELDS = ('is_in_wishlist', 'is_liked')
+
+CARDS_VERSION_KEY = 'product:cards:version'
+
+
+def _version_key(product_id):
+    return f'product:version:{product_id}'
+
+
+def _card_key(product_id, cards_version, version):
+    return f'product:card:{product_id}:{cards_version}.{version}'
+
+
+def _user_flags_key(user_id):
+    return f'product:user-flags:{user_id}'
+
+
+# ============ Product cards ============
+
+def invalidate_product(product_id):
+    """Bump the cache version of a product so its cached card is no longer used."""
+    try:
+        cache.incr(_version_key(product_id))
+    except ValueError:
+        cache.set(_version_key(product_id), 1, VERSION_TIMEOUT)
+
+
+def invalidate_all():
+    """Bump the shared cards version so no cached card is used again."""
+    try:
+        cache.incr(CARDS_VERSION_KEY)
+    except ValueError:
+        cache.set(CARDS_VERSION_KEY, 1, VERSION_TIMEOUT)
+
+
+def get_product_cards(product_ids, serializer_context=None):
+    """
+    Return serialized product cards for ``product_ids``, in the same order.
+    Cards missing from the cache are loaded in one query and cached.
+    """
+    from .models import Product
+    from .serializers import ProductSerializer
+
+    product_ids = list(product_ids)
+    versions = cache.get_many([CARDS_VERSION_KEY] + [_version_key(pk) for pk in product_ids])
+    cards_version = versions.get(CARDS_VERSION_KEY, 0)
+    card_keys = {pk: _card_key(pk, cards_version, versions.get(_version_key(pk), 0)) for pk in product_ids}
+    cached = cache.get_many(list(card_keys.values()))
+
+    cards = {pk: cached[key] for pk, key in card_keys.items() if key in cached}
+    missing = [pk for pk in product_ids if pk not in cards]
+    if missing:
+        products = Product.objects.filter(pk__in=missing).select_related('seller').prefetch_related(
+            'images', 'product_tags__tag'
+        )
+        fresh = {}
+        for product in products:
+            # The per-user fields are not annotated here, so the serializer skips them.
+            card = ProductSerializer(product, context=serializer_context).data
+            cards[product.pk] = card
+            fresh[card_keys[product.pk]] = card
+        cache.set_many(fresh, CARD_TIMEOUT)
+
+    return [cards[pk] for pk in product_ids if pk in cards]
+
+
+# ============ Per-user overlay ============
+
+def get_user_flags(user):
+    """Return ``(wishlist_ids, liked_ids)`` for ``user`` as sets of product ids."""
+    if not user.is_authenticated:
+        return set(), set()
+
+    from .models import Wishlist, ProductLike
+
+    key = _user_flags_key(user.pk)
+    flags = cache.get(key)
+    if flags is None:
+        flags = (
+            set(Wishlist.objects.filter(user=user).values_list('product_id', flat=True)),
+            set(ProductLike.objects.filter(user=user).values_list('product_id', flat=True)),
+        )
+        cache.set(key, flags, USER_FLAGS_TIMEOUT)
+    return flags
+
+
+def invalidate_user_flags(user_id):
+    """Drop the cached wishlist/like overlay for a user."""
+    cache.delete(_user_flags_key(user_id))
+
+
+def apply_user_flags(cards, user):
+    """Return copies of ``cards`` with the user's wishlist/like flags merged in."""
+    wishlist_ids, liked_ids = get_user_flags(user)
+    return [
+        {**card, 'is_in_wishlist': card['id'] in wishlist_ids, 'is_liked': card['id'] in liked_ids}
+        for card in cards
+    ]
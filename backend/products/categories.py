@@ -0,0 +1,93 @@
+"""
+In-process lookup of categories by id, name or slug.
+
+Categories change rarely but are read on every product list, facet and
+write request, so each process keeps the whole table in memory. Saving or
+deleting a category clears this process's copy and bumps a shared version
+in the cache, which other processes check at most every ``CHECK_INTERVAL``
+seconds. Lookups that miss fall back to the database.
+"""
+import threading
+import time
+from collections import namedtuple
+
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils.text import slugify
+
+CategoryInfo = namedtuple('CategoryInfo', ['id', 'name', 'slug'])
+
+VERSION_KEY = 'product:categories:version'
+VERSION_TIMEOUT = 60 * 60 * 24
+CHECK_INTERVAL = 5
+
+_lock = threading.Lock()
+_state = {'by_id': None, 'by_key': None, 'version': None, 'checked': 0.0}
+
+
+def _load():
+    from .models import Category
+
+    by_id, by_key = {}, {}
+    for category in Category.objects.values_list('id', 'name', 'slug'):
+        info = CategoryInfo(*category)
+        by_id[info.id] = info
+        by_key.setdefault(info.slug.lower(), info)
+        # A name wins over another category's identical slug.
+        by_key[info.name.lower()] = info
+    return by_id, by_key
+
+
+def _tables():
+    now = time.monotonic()
+    if _state['by_id'] is not None and now - _state['checked'] < CHECK_INTERVAL:
+        return _state['by_id'], _state['by_key']
+
+    version = cache.get(VERSION_KEY, 0)
+    with _lock:
+        if _state['by_id'] is None or _state['version'] != version:
+            _state['by_id'], _state['by_key'] = _load()
+            _state['version'] = version
+        _state['checked'] = now
+        return _state['by_id'], _state['by_key']
+
+
+def resolve(value):
+    """Return the ``CategoryInfo`` for a category name or slug (any case), or None."""
+    from .models import Category
+
+    value = str(value).strip()
+    if not value:
+        return None
+    _, by_key = _tables()
+    info = by_key.get(value.lower()) or by_key.get(slugify(value))
+    if info is None:
+        category = Category.objects.filter(
+            Q(name__iexact=value) | Q(slug__iexact=value) | Q(slug=slugify(value))
+        ).values_list('id', 'name', 'slug').first()
+        info = CategoryInfo(*category) if category else None
+    return info
+
+
+def get(category_id):
+    """Return the ``CategoryInfo`` for a category id, or None."""
+    from .models import Category
+
+    if category_id is None:
+        return None
+    by_id, _ = _tables()
+    info = by_id.get(category_id)
+    if info is None:
+        category = Category.objects.filter(pk=category_id).values_list('id', 'name', 'slug').first()
+        info = CategoryInfo(*category) if category else None
+    return info
+
+
+def invalidate():
+    """Drop this process's copy and tell other processes to reload theirs."""
+    with _lock:
+        _state['by_id'] = _state['by_key'] = None
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 1, VERSION_TIMEOUT)
@@ -0,0 +1,168 @@
+"""
+Write-coalescing counters for product views.
+
+Product page views are buffered instead of written on every request, then
+flushed to ``Product.views_count`` in batches of ``F()`` updates by the
+``flush_view_counts`` management command. With django-redis as the default
+cache the buffer is a Redis hash shared by every worker; otherwise (tests,
+local development) it lives in process memory and the process flushes it
+itself, once ``LOCAL_FLUSH_SIZE`` views are pending or ``LOCAL_FLUSH_INTERVAL``
+seconds after the first unflushed view, since the command cannot reach it.
+"""
+import logging
+import threading
+import uuid
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+
+logger = logging.getLogger(__name__)
+
+PENDING_KEY = 'product:views:pending'
+LOCAL_FLUSH_SIZE = 100
+LOCAL_FLUSH_INTERVAL = 5
+
+
+class RedisViewBuffer:
+    """View buffer kept in a Redis hash of product id -> pending views."""
+
+    def __init__(self):
+        from django_redis import get_redis_connection
+        self.client = get_redis_connection('default')
+
+    def add(self, product_id, amount=1):
+        return self.client.hincrby(PENDING_KEY, product_id, amount)
+
+    def pending(self, product_id):
+        return int(self.client.hget(PENDING_KEY, product_id) or 0)
+
+    def restore(self, pending):
+        """Put drained views back after a failed flush."""
+        pipe = self.client.pipeline(transaction=False)
+        for product_id, amount in pending.items():
+            pipe.hincrby(PENDING_KEY, product_id, amount)
+        pipe.execute()
+
+    def drain(self):
+        from redis.exceptions import ResponseError
+
+        # Rename first so increments that arrive during the flush go to a fresh hash.
+        flushing_key = f'{PENDING_KEY}:flushing:{uuid.uuid4().hex}'
+        try:
+            self.client.rename(PENDING_KEY, flushing_key)
+        except ResponseError:
+            # Nothing is pending (RENAME fails on a missing key).
+            return {}
+        pending = self.client.hgetall(flushing_key)
+        self.client.delete(flushing_key)
+        return {int(pk): int(count) for pk, count in pending.items()}
+
+
+class LocalViewBuffer:
+    """In-process view buffer, used when the cache is not Redis. Flushes itself."""
+
+    def __init__(self, flush_size=LOCAL_FLUSH_SIZE, flush_interval=LOCAL_FLUSH_INTERVAL):
+        self.lock = threading.Lock()
+        self.counts = defaultdict(int)
+        self.total = 0
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.timer = None
+
+    def add(self, product_id, amount=1):
+        with self.lock:
+            self.counts[product_id] += amount
+            self.total += amount
+            count = self.counts[product_id]
+            flush_now = self.total >= self.flush_size
+            if not flush_now:
+                self._schedule()
+        if flush_now:
+            flush_views()
+        return count
+
+    def restore(self, pending):
+        """Put drained views back after a failed flush; the timer retries them."""
+        with self.lock:
+            for product_id, amount in pending.items():
+                self.counts[product_id] += amount
+                self.total += amount
+            self._schedule()
+
+    def _schedule(self):
+        if self.timer is None:
+            self.timer = threading.Timer(self.flush_interval, self._flush_in_thread)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def _flush_in_thread(self):
+        try:
+            flush_views()
+        except Exception:
+            logger.exception("Could not flush buffered product views")
+        finally:
+            connection.close()
+
+    def pending(self, product_id):
+        with self.lock:
+            return self.counts.get(product_id, 0)
+
+    def drain(self):
+        with self.lock:
+            pending, self.counts, self.total = dict(self.counts), defaultdict(int), 0
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+        return pending
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_view_buffer():
+    """Return the process-wide view buffer for the configured cache."""
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                backend = settings.CACHES.get('default', {}).get('BACKEND', '')
+                _buffer = RedisViewBuffer() if backend.startswith('django_redis') else LocalViewBuffer()
+    return _buffer
+
+
+def record_view(product_id):
+    """Buffer a view of a product and return its number of unflushed views."""
+    return get_view_buffer().add(product_id)
+
+
+def pending_views(product_id):
+    """Return the number of buffered views not yet written for a product."""
+    return get_view_buffer().pending(product_id)
+
+
+def flush_views():
+    """
+    Write buffered views to the database. Products with the same pending
+    count share one ``UPDATE``. Returns the total number of views written.
+    """
+    from .models import Product
+
+    view_buffer = get_view_buffer()
+    pending = view_buffer.drain()
+    by_amount = defaultdict(list)
+    for product_id, amount in pending.items():
+        if amount > 0:
+            by_amount[amount].append(product_id)
+
+    try:
+        with transaction.atomic():
+            for amount, product_ids in by_amount.items():
+                Product.objects.filter(pk__in=product_ids).update(views_count=F('views_count') + amount)
+    except Exception:
+        # Put the views back so the next flush can retry them.
+        view_buffer.restore(pending)
+        raise
+    return sum(amount * len(ids) for amount, ids in by_amount.items())
@@ -0,0 +1,104 @@
+"""
+Facet counts for the marketplace filters.
+
+One ``GROUP BY (category, condition, price bucket)`` over the filtered
+listings gives a small count cube, cached per facet version and per filter
+set that the cube cannot answer itself (search text and price range). The
+category and condition selections are applied to the cube in Python, so
+each facet is counted with every *other* active filter and a page load runs
+at most one aggregate query. Product writes that can move a listing between
+facets bump the version (see ``products.signals``).
+"""
+import hashlib
+import json
+from collections import Counter
+
+from django.core.cache import cache
+from django.db.models import Case, Count, IntegerField, Value, When
+
+from . import categories
+
+CUBE_TIMEOUT = 60 * 10
+VERSION_TIMEOUT = 60 * 60 * 24
+VERSION_KEY = 'product:facets:version'
+
+# Fields whose changes can move a product between facets or in/out of the feed.
+FACET_FIELDS = {'category', 'condition', 'price', 'is_active', 'is_sold'}
+
+# (min, max) price buckets; max is exclusive and None means unbounded.
+PRICE_BUCKETS = ((0, 500), (500, 2000), (2000, 10000), (10000, None))
+
+
+def invalidate():
+    """Bump the facet version so every cached cube is recomputed."""
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 1, VERSION_TIMEOUT)
+
+
+def _price_bucket():
+    whens = [
+        When(price__gte=low, then=Value(index)) if high is None
+        else When(price__gte=low, price__lt=high, then=Value(index))
+        for index, (low, high) in enumerate(PRICE_BUCKETS)
+    ]
+    return Case(*whens, default=Value(0), output_field=IntegerField())
+
+
+def get_cube(queryset, params):
+    """
+    Return ``[(category_id, condition, bucket, count), ...]`` for ``queryset``.
+    ``params`` are the filters already applied to it, used in the cache key.
+    """
+    digest = hashlib.md5(json.dumps(params, sort_keys=True).encode()).hexdigest()
+    key = f'product:facets:{cache.get(VERSION_KEY, 0)}:{digest}'
+    cube = cache.get(key)
+    if cube is None:
+        rows = (
+            queryset.order_by().annotate(bucket=_price_bucket())
+            .values_list('category_id', 'condition', 'bucket').annotate(count=Count('id'))
+        )
+        cube = [tuple(row) for row in rows]
+        cache.set(key, cube, CUBE_TIMEOUT)
+    return cube
+
+
+def facet_counts(cube, category_id=None, conditions=(), condition_choices=()):
+    """
+    Count each facet value under the other selected filters. ``conditions``
+    are stored condition values. Categories are reported by slug and name.
+    """
+    conditions = set(conditions)
+    by_category, by_condition, by_bucket = Counter(), Counter(), Counter()
+    total = 0
+
+    for row_category_id, condition, bucket, count in cube:
+        category_match = category_id is None or row_category_id == category_id
+        condition_match = not conditions or condition in conditions
+        if condition_match and row_category_id is not None:
+            by_category[row_category_id] += count
+        if category_match:
+            by_condition[condition] += count
+        if category_match and condition_match:
+            by_bucket[bucket] += count
+            total += count
+
+    return {
+        'total': total,
+        'category': [
+            {'value': category.slug, 'label': category.name, 'count': count}
+            for category, count in (
+                (categories.get(row_category_id), count) for row_category_id, count in by_category.most_common()
+            )
+            if category is not None
+        ],
+        'condition': [
+            {'value': value, 'label': label, 'count': by_condition[value]}
+            for value, label in condition_choices
+        ],
+        'price': [
+            {'min': low, 'max': high, 'count': by_bucket[index]}
+            for index, (low, high) in enumerate(PRICE_BUCKETS)
+        ],
+    }
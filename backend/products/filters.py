@@ -1,5 +1,8 @@
 import django_filters
+from rest_framework import filters
+from rest_framework.settings import api_settings
 from .models import Product
+from . import search
 
 class ProductFilter(django_filters.FilterSet):
     """
@@ -8,13 +11,35 @@ class ProductFilter(django_filters.FilterSet):
     min_price = django_filters.NumberFilter(field_name="price", lookup_expr='gte')
     max_price = django_filters.NumberFilter(field_name="price", lookup_expr='lte')
     
-    # --- FIX APPLIED ---
-    # The filter was trying to perform a relational lookup (category__slug) on a non-relational CharField.
-    # This has been corrected to filter directly on the 'category' field using a case-insensitive match.
-    category = django_filters.CharFilter(field_name='category', lookup_expr='iexact')
+    # Category is a foreign key to Category, filtered by slug.
+    category = django_filters.CharFilter(field_name='category__slug', lookup_expr='iexact')
     
     condition = django_filters.ChoiceFilter(choices=Product.CONDITION_CHOICES)
     
     class Meta:
         model = Product
         fields = ['category', 'condition', 'brand', 'is_sold', 'is_featured', 'location']
+
+
+class ProductSearchFilter(filters.SearchFilter):
+    """
+    SearchFilter backed by the product full-text index (see products.search).
+
+    Accepts the same ``search`` query parameter as DRF's SearchFilter. Results
+    are ranked by relevance unless the client asks for an explicit ``ordering``;
+    databases without a native index fall back to the ``icontains`` search over
+    the view's ``search_fields``.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        if not search.is_supported():
+            return super().filter_queryset(request, queryset, view)
+
+        search_text = request.query_params.get(self.search_param, '').replace('\x00', '').strip()
+        if not search_text:
+            return queryset
+
+        queryset = search.search_queryset(queryset, search_text)
+        if not request.query_params.get(api_settings.ORDERING_PARAM):
+            queryset = queryset.order_by('-search_rank', '-created_at')
+        return queryset
@@ -0,0 +1,94 @@
+import re
+from importlib import import_module
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.utils.module_loading import module_has_submodule
+
+# SQLite: "SCAN products_product" is a full scan, "SCAN ... USING INDEX ..." is not.
+SQLITE_SCAN = re.compile(r'\bSCAN (?:TABLE )?(\w+)(?!.*\bUSING\b)')
+POSTGRES_SCAN = re.compile(r'\bSeq Scan on (\w+)')
+
+
+def load_query_shapes(app_labels=None):
+    """Collect ``QUERY_SHAPES`` from each installed app's ``query_shapes`` module."""
+    shapes = {}
+    for config in apps.get_app_configs():
+        if app_labels and config.label not in app_labels:
+            continue
+        if module_has_submodule(config.module, 'query_shapes'):
+            module = import_module(f'{config.name}.query_shapes')
+            for name, build in module.QUERY_SHAPES.items():
+                shapes[f'{config.label}: {name}'] = build
+    return shapes
+
+
+def read_sql_file(path):
+    """Captured statements, separated by semicolons at the end of a line."""
+    with open(path) as f:
+        statements = re.split(r';\s*\n', f.read())
+    return [statement.strip().rstrip(';') for statement in statements if statement.strip()]
+
+
+class Command(BaseCommand):
+    help = (
+        "Run EXPLAIN on the API's hot query shapes (each app's query_shapes.py) and "
+        "report full table scans. Exits with an error if any are found."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('app_label', nargs='*', help="Only check shapes from these apps.")
+        parser.add_argument(
+            '--sql', metavar='FILE',
+            help="Also explain captured SQL statements from FILE, e.g. copied from the django.db.backends log."
+        )
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if connection.vendor == 'sqlite':
+            scan_pattern = SQLITE_SCAN
+        elif connection.vendor == 'postgresql':
+            scan_pattern = POSTGRES_SCAN
+        else:
+            raise CommandError(f"Plans from {connection.vendor} are not supported.")
+
+        queries = {
+            name: build().using(options['database'])
+            for name, build in load_query_shapes(options['app_label']).items()
+        }
+        if options['sql']:
+            for number, sql in enumerate(read_sql_file(options['sql']), 1):
+                queries[f'captured #{number}'] = sql
+
+        scans = {}
+        for name, query in queries.items():
+            plan = self.explain(connection, query)
+            tables = sorted(set(scan_pattern.findall(plan)))
+            if tables:
+                scans[name] = tables
+                self.stdout.write(self.style.ERROR(f"{name}: full scan of {', '.join(tables)}"))
+            else:
+                self.stdout.write(f"{name}: ok")
+            if options['verbosity'] > 1:
+                self.stdout.write(plan + '\n')
+
+        if scans:
+            raise CommandError(f"{len(scans)} of {len(queries)} queries scan a whole table.")
+        self.stdout.write(self.style.SUCCESS(f"Checked {len(queries)} queries, no full scans."))
+
+    def explain(self, connection, query):
+        with transaction.atomic(using=connection.alias):
+            if connection.vendor == 'postgresql':
+                # Small development tables are cheaper to scan; ask which index would be used.
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+            if not isinstance(query, str):
+                return query.explain()
+            prefix = 'EXPLAIN QUERY PLAN' if connection.vendor == 'sqlite' else 'EXPLAIN'
+            with connection.cursor() as cursor:
+                cursor.execute(f'{prefix} {query}')
+                rows = cursor.fetchall()
+            # SQLite rows are (id, parent, notused, detail); PostgreSQL rows are one line each.
+            return '\n'.join(str(row[-1]) for row in rows)
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from products import bulk
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = "Export product listings as CSV or JSON Lines."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seller', help="Only export this user's listings.")
+        parser.add_argument('--file-format', choices=bulk.FORMATS, default='csv')
+        parser.add_argument('--output', help="File to write; defaults to standard output.")
+
+    def handle(self, *args, **options):
+        queryset = Product.objects.all()
+        if options['seller']:
+            queryset = queryset.filter(seller__username=options['seller'])
+
+        lines = bulk.export_products(queryset, options['file_format'])
+        if not options['output']:
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+        with open(options['output'], 'w', newline='') as out:
+            out.writelines(lines)
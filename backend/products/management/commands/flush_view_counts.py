@@ -0,0 +1,23 @@
+import time
+from django.core.management.base import BaseCommand
+from products import counters
+
+
+class Command(BaseCommand):
+    help = "Write buffered product view counts to the database."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float, default=0,
+            help="Keep running and flush every INTERVAL seconds instead of flushing once."
+        )
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+        while True:
+            written = counters.flush_views()
+            if options['verbosity'] > 1 or not interval:
+                self.stdout.write(f"Flushed {written} product views.")
+            if not interval:
+                return
+            time.sleep(interval)
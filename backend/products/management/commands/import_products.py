@@ -0,0 +1,35 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from products import bulk
+
+
+class Command(BaseCommand):
+    help = "Import product listings for a seller from a CSV or JSON Lines file."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV or JSON Lines file to import.")
+        parser.add_argument('--seller', required=True, help="Username of the seller the listings belong to.")
+        parser.add_argument('--file-format', choices=bulk.FORMATS, help="Defaults to the file extension.")
+        parser.add_argument('--chunk-size', type=int, default=bulk.CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        try:
+            seller = User.objects.get(username=options['seller'])
+        except User.DoesNotExist:
+            raise CommandError(f"No user named {options['seller']!r}.")
+
+        file_format = options['file_format'] or bulk.detect_format(options['path'])
+        created = failed = 0
+        with open(options['path'], 'rb') as stream:
+            rows = bulk.read_rows(stream, file_format)
+            for result in bulk.import_products(rows, seller, chunk_size=options['chunk_size']):
+                if result['status'] == 'created':
+                    created += 1
+                else:
+                    failed += 1
+                    self.stderr.write(f"Row {result['row']}: {json.dumps(result['errors'])}")
+
+        self.stdout.write(self.style.SUCCESS(f"Imported {created} products; {failed} rows failed."))
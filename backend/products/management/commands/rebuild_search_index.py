@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from products import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the product full-text search index from the product table."
+
+    def handle(self, *args, **options):
+        if not search.is_supported():
+            self.stdout.write(self.style.WARNING("This database has no native search index; nothing to do."))
+            return
+        search.rebuild_index()
+        self.stdout.write(self.style.SUCCESS("Product search index rebuilt."))
@@ -0,0 +1,54 @@
+from django.db import migrations
+
+# The search index as of this migration, with the category still a text
+# column on the product. Kept here rather than imported from products.search,
+# so later changes to that module don't change what this migration does.
+FTS_TABLE = 'products_product_fts'
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+            "title, brand, category, description, tokenize='porter unicode61')"
+        )
+        schema_editor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, title, brand, category, description) "
+            "SELECT id, title, brand, category, description FROM products_product"
+        )
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            "ALTER TABLE products_product ADD COLUMN IF NOT EXISTS search_vector tsvector"
+        )
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS products_product_search_vector_gin "
+            "ON products_product USING gin (search_vector)"
+        )
+        schema_editor.execute(
+            "UPDATE products_product SET search_vector = "
+            "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+            "setweight(to_tsvector('english', coalesce(brand, '')), 'B') || "
+            "setweight(to_tsvector('english', coalesce(category, '')), 'C') || "
+            "setweight(to_tsvector('english', coalesce(description, '')), 'D')"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+    elif vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS products_product_search_vector_gin")
+        schema_editor.execute("ALTER TABLE products_product DROP COLUMN IF EXISTS search_vector")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_alter_productimage_image_payment'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
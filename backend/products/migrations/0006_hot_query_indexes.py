@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:53
+
+import django.db.models.deletion
+import django.db.models.functions.text
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_product_keyset_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='product',
+            name='products_pr_created_3be21c_idx',
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='seller',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='products', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['razorpay_order_id'], name='payment_order_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True), ('is_sold', False)), fields=['created_at', 'id'], name='product_feed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(django.db.models.functions.text.Lower('category'), models.F('created_at'), models.F('id'), condition=models.Q(('is_active', True), ('is_sold', False)), name='product_category_feed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['seller', '-created_at'], name='product_seller_recent_idx'),
+        ),
+    ]
@@ -0,0 +1,108 @@
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils.text import slugify
+
+# The categories the sell and marketplace pages offer.
+DEFAULT_CATEGORIES = [
+    ('Textbooks', 'books'),
+    ('Electronics', 'electronics'),
+    ('Study Notes', 'notes'),
+    ('Furniture', 'furniture'),
+]
+
+
+def backfill_categories(apps, schema_editor):
+    """Point each product at the Category matching its old free-text category."""
+    Category = apps.get_model('products', 'Category')
+    Product = apps.get_model('products', 'Product')
+
+    for name, slug in DEFAULT_CATEGORIES:
+        if not Category.objects.filter(models.Q(name__iexact=name) | models.Q(slug=slug)).exists():
+            Category.objects.create(name=name, slug=slug)
+
+    by_key = {}
+    for category in Category.objects.all():
+        by_key.setdefault(category.slug.lower(), category)
+        by_key[category.name.lower()] = category
+
+    for text in Product.objects.exclude(category_name='').values_list('category_name', flat=True).distinct():
+        name = text.strip()
+        if not name:
+            continue
+        category = by_key.get(name.lower()) or by_key.get(slugify(name))
+        if category is None:
+            slug = base = slugify(name) or 'category'
+            suffix = 1
+            while Category.objects.filter(slug=slug).exists():
+                suffix += 1
+                slug = f'{base}-{suffix}'
+            category = Category.objects.create(name=name[:100], slug=slug)
+            by_key[name.lower()] = by_key[slug] = category
+        Product.objects.filter(category_name=text).update(category=category)
+
+
+def restore_category_names(apps, schema_editor):
+    Category = apps.get_model('products', 'Category')
+    Product = apps.get_model('products', 'Product')
+    for category in Category.objects.all():
+        Product.objects.filter(category=category).update(category_name=category.name)
+
+
+# The search document as of this migration: the category is indexed by the
+# Category's name. Kept here rather than imported from products.search, so
+# later changes to that module don't change what this migration does.
+CATEGORY_NAME_SQL = (
+    "(SELECT name FROM products_category WHERE products_category.id = products_product.category_id)"
+)
+
+
+def rebuild_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute("DELETE FROM products_product_fts")
+        schema_editor.execute(
+            "INSERT INTO products_product_fts (rowid, title, brand, category, description) "
+            f"SELECT id, title, brand, {CATEGORY_NAME_SQL}, description FROM products_product"
+        )
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            "UPDATE products_product SET search_vector = "
+            "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+            "setweight(to_tsvector('english', coalesce(brand, '')), 'B') || "
+            f"setweight(to_tsvector('english', coalesce({CATEGORY_NAME_SQL}, '')), 'C') || "
+            "setweight(to_tsvector('english', coalesce(description, '')), 'D')"
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='product',
+            name='product_category_feed_idx',
+        ),
+        migrations.RenameField(
+            model_name='product',
+            old_name='category',
+            new_name='category_name',
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='category',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='products', to='products.category'),
+        ),
+        migrations.RunPython(backfill_categories, restore_category_names),
+        migrations.RemoveField(
+            model_name='product',
+            name='category_name',
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True), ('is_sold', False)), fields=['category', 'created_at', 'id'], name='product_category_feed_idx'),
+        ),
+        migrations.RunPython(rebuild_search_index, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models import Q
 from django.contrib.auth import get_user_model
 from django.utils.text import slugify
 from django.core.validators import MinValueValidator
@@ -54,15 +55,16 @@ class Product(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
     original_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, validators=[MinValueValidator(0)])
     
-    # --- FIX APPLIED ---
-    # The category field is confirmed as a CharField.
-    # The blank=True and default='' settings are robust for handling this field.
-    category = models.CharField(max_length=100, blank=True, default='')
+    # The API accepts a category name or slug; see products.categories.
+    category = models.ForeignKey(
+        Category, on_delete=models.PROTECT, null=True, blank=True, related_name='products'
+    )
     
     condition = models.CharField(max_length=20, choices=CONDITION_CHOICES)
     brand = models.CharField(max_length=100, blank=True)
     location = models.CharField(max_length=200, blank=True)
-    seller = models.ForeignKey(User, on_delete=models.CASCADE, related_name='products')
+    # Indexed by the (seller, created_at) index below.
+    seller = models.ForeignKey(User, on_delete=models.CASCADE, related_name='products', db_index=False)
     is_active = models.BooleanField(default=True)
     is_sold = models.BooleanField(default=False)
     is_featured = models.BooleanField(default=False)
@@ -74,14 +76,25 @@ class Product(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # The public feed (active, unsold) is paged newest first on
+            # (created_at, id); partial, so sold and hidden listings stay out of it.
+            models.Index(
+                fields=['created_at', 'id'], condition=Q(is_active=True, is_sold=False),
+                name='product_feed_idx',
+            ),
+            # The feed filtered by category.
+            models.Index(
+                fields=['category', 'created_at', 'id'], condition=Q(is_active=True, is_sold=False),
+                name='product_category_feed_idx',
+            ),
+            # A seller's own listings, newest first.
+            models.Index(fields=['seller', '-created_at'], name='product_seller_recent_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
-    def increment_views(self):
-        self.views_count += 1
-        self.save(update_fields=['views_count'])
-
     @property
     def discount_percentage(self):
         if self.original_price and self.original_price > self.price:
@@ -156,5 +169,11 @@ class Payment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Payment verification looks the payment up by Razorpay order id.
+            models.Index(fields=['razorpay_order_id'], name='payment_order_id_idx'),
+        ]
+
     def __str__(self):
         return f"Payment for {self.product.title} by {self.user.username}"
@@ -0,0 +1,19 @@
+"""
+Hot query shapes of the products API, checked for full table scans by
+``manage.py explain_queries``. Add the shape of every new list or lookup
+query here together with the index it needs.
+"""
+from .models import Payment, Product, ProductLike, Wishlist
+
+FEED = {'is_active': True, 'is_sold': False}
+
+QUERY_SHAPES = {
+    'product feed': lambda: Product.objects.filter(**FEED).order_by('-created_at', '-id')[:20],
+    'product feed by category': lambda: (
+        Product.objects.filter(**FEED, category_id=1).order_by('-created_at', '-id')[:20]
+    ),
+    'seller products': lambda: Product.objects.filter(seller_id=1).order_by('-created_at')[:20],
+    'payment by order id': lambda: Payment.objects.filter(razorpay_order_id='order_0'),
+    'wishlist': lambda: Wishlist.objects.filter(user_id=1),
+    'liked products': lambda: ProductLike.objects.filter(user_id=1, product_id__in=[1, 2, 3]),
+}
@@ -0,0 +1,145 @@
+"""
+Full-text search index for products.
+
+SQLite keeps a separate FTS5 table (``products_product_fts``) keyed by the
+product id, while PostgreSQL keeps a weighted ``tsvector`` column on the
+product table backed by a GIN index. Both are created by migration
+``0004_product_search_index`` and kept current by the signal handlers in
+``products.signals``. Any other database vendor falls back to DRF's plain
+``icontains`` search.
+"""
+import re
+
+from django.db import connection
+from django.db.models import BooleanField, FloatField
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'products_product_fts'
+
+# Fields that make up the search document, in weight order (A, B, C, D).
+INDEXED_FIELDS = ('title', 'brand', 'category', 'description')
+
+# SQL giving each field's text; products are indexed by their category's name.
+DOCUMENT_COLUMNS = {
+    'title': 'products_product.title',
+    'brand': 'products_product.brand',
+    'category': '(SELECT name FROM products_category WHERE products_category.id = products_product.category_id)',
+    'description': 'products_product.description',
+}
+
+_TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def is_supported(using=None):
+    """Return True if the current database has a native search index."""
+    return (using or connection).vendor in ('sqlite', 'postgresql')
+
+
+# ============ Index maintenance ============
+
+def _postgres_document_sql():
+    weights = 'ABCD'
+    parts = [
+        f"setweight(to_tsvector('english', coalesce({DOCUMENT_COLUMNS[field]}, '')), '{weights[i]}')"
+        for i, field in enumerate(INDEXED_FIELDS)
+    ]
+    return ' || '.join(parts)
+
+
+def _sqlite_insert_sql(where=''):
+    columns = ', '.join(DOCUMENT_COLUMNS[field] for field in INDEXED_FIELDS)
+    return (
+        f"INSERT INTO {FTS_TABLE} (rowid, {', '.join(INDEXED_FIELDS)}) "
+        f"SELECT products_product.id, {columns} FROM products_product {where}"
+    )
+
+
+def _index_where(where, params):
+    if not is_supported():
+        return
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(
+                f"DELETE FROM {FTS_TABLE} WHERE rowid IN (SELECT products_product.id FROM products_product {where})",
+                params,
+            )
+            cursor.execute(_sqlite_insert_sql(where), params)
+        else:
+            cursor.execute(f"UPDATE products_product SET search_vector = {_postgres_document_sql()} {where}", params)
+
+
+def index_products(product_ids):
+    """(Re)index the given products from their current database rows."""
+    product_ids = list(product_ids)
+    if not product_ids:
+        return
+    placeholders = ', '.join(['%s'] * len(product_ids))
+    _index_where(f"WHERE products_product.id IN ({placeholders})", product_ids)
+
+
+def index_category(category_id):
+    """Reindex the products of a category, e.g. after it was renamed."""
+    _index_where("WHERE products_product.category_id = %s", [category_id])
+
+
+def remove_products(product_ids):
+    """Remove the given products from the index."""
+    product_ids = list(product_ids)
+    if not product_ids or connection.vendor != 'sqlite':
+        # PostgreSQL stores the vector on the row itself, so it goes with it.
+        return
+    placeholders = ', '.join(['%s'] * len(product_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})", product_ids)
+
+
+def rebuild_index():
+    """Rebuild the whole index from the product table."""
+    if not is_supported():
+        return
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+            cursor.execute(_sqlite_insert_sql())
+        else:
+            cursor.execute(f"UPDATE products_product SET search_vector = {_postgres_document_sql()}")
+
+
+# ============ Querying ============
+
+def _fts5_query(terms):
+    # Quote every term so user input can never be parsed as FTS5 syntax, and
+    # match by prefix so partially typed words still find results.
+    return ' '.join('"%s"*' % term.replace('"', '""') for term in terms)
+
+
+def search_queryset(queryset, search_text):
+    """
+    Filter ``queryset`` down to products matching ``search_text`` and annotate
+    each with a ``search_rank`` where higher means more relevant.
+    """
+    terms = _TERM_RE.findall(search_text)
+    if not terms:
+        return queryset
+
+    if connection.vendor == 'sqlite':
+        # Join the FTS table once: MATCH filters through its index and bm25()
+        # ranks the matched row. bm25() is lower for better matches, so it is
+        # negated to sort descending.
+        return queryset.extra(
+            tables=[FTS_TABLE],
+            where=[f"{FTS_TABLE}.rowid = products_product.id", f"{FTS_TABLE} MATCH %s"],
+            params=[_fts5_query(terms)],
+            select={'search_rank': f"-bm25({FTS_TABLE}, 10.0, 5.0, 2.0, 1.0)"},
+        )
+
+    tsquery = ' & '.join(f"{term}:*" for term in terms)
+    matches = RawSQL(
+        "products_product.search_vector @@ to_tsquery('english', %s)",
+        [tsquery], output_field=BooleanField(),
+    )
+    rank = RawSQL(
+        "ts_rank(products_product.search_vector, to_tsquery('english', %s))",
+        [tsquery], output_field=FloatField(),
+    )
+    return queryset.filter(matches).annotate(search_rank=rank)
@@ -7,13 +7,33 @@ from .models import (
 )
 
 # It's better practice to import serializers rather than redefine them
-from users.serializers import UserSerializer
+from users.serializers import PublicUserSerializer
+from . import bulk, categories
 
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
         model = Category
         fields = ['id', 'name', 'slug', 'icon']
 
+class CategoryField(serializers.Field):
+    """
+    A product's category, written as a category name or slug and read back
+    as the category name. Use with ``source='category_id'``.
+    """
+    default_error_messages = {
+        'unknown': 'Unknown category "{value}".',
+    }
+
+    def to_internal_value(self, data):
+        category = categories.resolve(data)
+        if category is None:
+            self.fail('unknown', value=data)
+        return category.id
+
+    def to_representation(self, value):
+        category = categories.get(value)
+        return category.name if category else ''
+
 class ProductImageSerializer(serializers.ModelSerializer):
     """
     Serializer for ProductImage model.
@@ -40,12 +60,12 @@ class ProductTagSerializer(serializers.ModelSerializer):
         fields = ['id', 'name']
 
 class ProductSerializer(serializers.ModelSerializer):
-    seller = UserSerializer(read_only=True)
+    seller = PublicUserSerializer(read_only=True)
     images = ProductImageSerializer(many=True, read_only=True)
     tags = serializers.SerializerMethodField()
     is_in_wishlist = serializers.BooleanField(read_only=True)
     is_liked = serializers.BooleanField(read_only=True)
-    category = serializers.CharField(read_only=True)
+    category = CategoryField(source='category_id', read_only=True)
 
     class Meta:
         model = Product
@@ -64,55 +84,87 @@ class ProductCreateUpdateSerializer(serializers.ModelSerializer):
         child=serializers.ImageField(use_url=False),
         write_only=True, required=False
     )
+    # Existing images to keep, in display order; new ``images`` are added after them.
+    image_ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        write_only=True, required=False
+    )
     tags = serializers.ListField(
         child=serializers.CharField(max_length=50),
         write_only=True, required=False
     )
-    category = serializers.CharField(max_length=100)
+    category = CategoryField(source='category_id')
 
     class Meta:
         model = Product
         fields = [
             'title', 'description', 'price', 'original_price', 'category',
-            'condition', 'brand', 'location', 'images', 'tags'
+            'condition', 'brand', 'location', 'images', 'image_ids', 'tags'
         ]
 
-    def _handle_tags(self, product, tags_data):
+    def _handle_tags(self, product, tags_data, is_new=False):
+        """Only insert and delete the tag relations that changed."""
         if tags_data is None:
             return
-        product.product_tags.all().delete()
-        tag_relations = [
-            ProductTagRelation(product=product, tag=ProductTag.objects.get_or_create(name=tag_name.strip().lower())[0])
-            for tag_name in set(tags_data)
-        ]
-        ProductTagRelation.objects.bulk_create(tag_relations)
-
-    def _handle_images(self, product, images_data):
-        if images_data is None:
-            return
-        product.images.all().delete()
-        image_instances = [
-            ProductImage(product=product, image=image_data, is_primary=(i == 0), order=i)
-            for i, image_data in enumerate(images_data)
-        ]
-        ProductImage.objects.bulk_create(image_instances)
+        wanted = {tag.pk for tag in bulk.get_or_create_tags(tags_data).values()}
+        existing = set() if is_new else set(product.product_tags.values_list('tag_id', flat=True))
+        if existing - wanted:
+            product.product_tags.filter(tag_id__in=existing - wanted).delete()
+        ProductTagRelation.objects.bulk_create([
+            ProductTagRelation(product=product, tag_id=tag_id) for tag_id in wanted - existing
+        ])
+
+    def _handle_images(self, product, images_data, image_ids=None, is_new=False):
+        """
+        Keep the images listed in ``image_ids``, in that order, delete the
+        others and append new uploads after them. Kept images are only
+        written when their position changes. Without ``image_ids``, a given
+        ``images`` list (even an empty one) replaces all existing images.
+        """
+        if image_ids is None:
+            if images_data is None:
+                return
+            if not is_new:
+                product.images.all().delete()
+            kept = []
+        else:
+            existing = {image.pk: image for image in product.images.all()}
+            unknown = [pk for pk in image_ids if pk not in existing]
+            if unknown:
+                raise serializers.ValidationError({'image_ids': [f'Unknown image ids: {unknown}']})
+            kept = [existing[pk] for pk in dict.fromkeys(image_ids)]
+            if existing.keys() - set(image_ids):
+                product.images.filter(pk__in=existing.keys() - set(image_ids)).delete()
+
+        moved = []
+        for order, image in enumerate(kept):
+            if image.order != order or image.is_primary != (order == 0):
+                image.order, image.is_primary = order, order == 0
+                moved.append(image)
+        if moved:
+            ProductImage.objects.bulk_update(moved, ['order', 'is_primary'])
+        ProductImage.objects.bulk_create([
+            ProductImage(product=product, image=image_data, is_primary=(order == 0), order=order)
+            for order, image_data in enumerate(images_data or [], len(kept))
+        ])
 
     @transaction.atomic
     def create(self, validated_data):
         images_data = validated_data.pop('images', [])
+        validated_data.pop('image_ids', None)
         tags_data = validated_data.pop('tags', [])
         product = Product.objects.create(**validated_data)
-        self._handle_images(product, images_data)
-        self._handle_tags(product, tags_data)
+        self._handle_images(product, images_data, is_new=True)
+        self._handle_tags(product, tags_data, is_new=True)
         return product
 
     @transaction.atomic
     def update(self, instance, validated_data):
         images_data = validated_data.pop('images', None)
+        image_ids = validated_data.pop('image_ids', None)
         tags_data = validated_data.pop('tags', None)
         instance = super().update(instance, validated_data)
-        if images_data is not None:
-            self._handle_images(instance, images_data)
+        self._handle_images(instance, images_data, image_ids)
         if tags_data is not None:
             self._handle_tags(instance, tags_data)
         return instance
@@ -0,0 +1,94 @@
+from functools import partial
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import Category, Product, ProductImage, ProductTagRelation, Wishlist, ProductLike
+from . import search
+from . import cache as product_cache
+from . import facets
+from . import categories
+from users import counters
+
+# Counter-only saves don't change anything worth a new cached card.
+UNCACHED_FIELDS = {'views_count'}
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, update_fields=None, **kwargs):
+    """
+    Keep the full-text search index in step with saved products.
+    Saves that only touch non-indexed fields (e.g. view counters) are skipped.
+    """
+    if update_fields is not None and not set(update_fields) & set(search.INDEXED_FIELDS):
+        return
+    search.index_products([instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    """Remove deleted products from the full-text search index."""
+    search.remove_products([instance.pk])
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product_card(sender, instance, update_fields=None, **kwargs):
+    """Invalidate the cached product card when a product changes."""
+    if update_fields is not None and set(update_fields) <= UNCACHED_FIELDS:
+        return
+    # Wait for commit so images/tags written later in the same transaction are included.
+    transaction.on_commit(partial(product_cache.invalidate_product, instance.pk))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_facets(sender, instance, update_fields=None, **kwargs):
+    """Recount the marketplace facets when a product can have moved between them."""
+    if update_fields is not None and not set(update_fields) & facets.FACET_FIELDS:
+        return
+    transaction.on_commit(facets.invalidate)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_changed(sender, instance, created=False, **kwargs):
+    """
+    Reload the category lookup. A renamed category also changes the search
+    document of its products and their cached cards, which are dropped with
+    a single bump of the shared cards version.
+    """
+    transaction.on_commit(categories.invalidate)
+    if kwargs['signal'] is post_save and not created:
+        search.index_category(instance.pk)
+        transaction.on_commit(product_cache.invalidate_all)
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_save, sender=ProductTagRelation)
+@receiver(post_delete, sender=ProductTagRelation)
+def invalidate_related_product_card(sender, instance, **kwargs):
+    """Invalidate the cached product card when its images or tags change."""
+    transaction.on_commit(partial(product_cache.invalidate_product, instance.product_id))
+
+
+@receiver(post_save, sender=Wishlist)
+def wishlist_item_added(sender, instance, created, **kwargs):
+    """Bump the user's wishlist badge counter."""
+    if created:
+        counters.changed([instance.user_id], wishlist=1)
+
+
+@receiver(post_delete, sender=Wishlist)
+def wishlist_item_removed(sender, instance, **kwargs):
+    """Lower the user's wishlist badge counter."""
+    counters.changed([instance.user_id], wishlist=-1)
+
+
+@receiver(post_save, sender=Wishlist)
+@receiver(post_delete, sender=Wishlist)
+@receiver(post_save, sender=ProductLike)
+@receiver(post_delete, sender=ProductLike)
+def invalidate_user_flags(sender, instance, **kwargs):
+    """Invalidate the user's cached wishlist/like overlay."""
+    transaction.on_commit(partial(product_cache.invalidate_user_flags, instance.user_id))
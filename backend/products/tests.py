@@ -0,0 +1,223 @@
+import json
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from users.models import User
+from .models import Category, Product, ProductImage, ProductTag, ProductTagRelation
+from .views import ProductImportView
+
+
+class BulkImportExportTests(TestCase):
+    """Exported listings import again unchanged, in both formats."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user('seller', 'seller@example.com', 'password')
+        cls.buyer = User.objects.create_user('importer', 'importer@example.com', 'password')
+        books = Category.objects.get_or_create(slug='books', defaults={'name': 'Textbooks'})[0]
+        furniture = Category.objects.get_or_create(slug='furniture', defaults={'name': 'Furniture'})[0]
+        physics = ProductTag.objects.create(name='physics', slug='physics')
+        semester = ProductTag.objects.create(name='first year', slug='first-year')
+
+        textbook = Product.objects.create(
+            title='Physics, Vol. 1', description='Some "notes" in the margins,\nno missing pages',
+            price='450.00', original_price='900.00', category=books, condition='like_new',
+            brand='Wiley', location='Hostel 4', seller=cls.seller,
+        )
+        ProductTagRelation.objects.create(product=textbook, tag=physics)
+        ProductTagRelation.objects.create(product=textbook, tag=semester)
+        Product.objects.create(
+            title='Study table', description='Sturdy', price='1200.00', category=furniture,
+            condition='fair', seller=cls.seller,
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def export(self, file_format):
+        response = self.client_for(self.seller).get('/api/products/export/', {'file_format': file_format})
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def import_file(self, content, name):
+        response = self.client_for(self.buyer).post(
+            '/api/products/import/', {'file': SimpleUploadedFile(name, content)}, format='multipart'
+        )
+        self.assertEqual(response.status_code, 200)
+        return [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+
+    def listing(self, product):
+        return {
+            'title': product.title,
+            'description': product.description,
+            'price': product.price,
+            'original_price': product.original_price,
+            'category': product.category_id,
+            'condition': product.condition,
+            'brand': product.brand,
+            'location': product.location,
+            'tags': sorted(relation.tag.name for relation in product.product_tags.all()),
+        }
+
+    def assert_round_trip(self, file_format):
+        lines = self.import_file(self.export(file_format), f'listings.{file_format}')
+        self.assertEqual(lines[-1], {'summary': {'created': 2, 'failed': 0, 'truncated': False}})
+        self.assertTrue(all(line['status'] == 'created' for line in lines[:-1]))
+
+        exported = Product.objects.filter(seller=self.seller).order_by('pk')
+        imported = Product.objects.filter(seller=self.buyer).order_by('pk')
+        self.assertEqual([self.listing(product) for product in imported], [self.listing(product) for product in exported])
+
+    def test_csv_round_trip(self):
+        self.assert_round_trip('csv')
+
+    def test_jsonl_round_trip(self):
+        self.assert_round_trip('jsonl')
+
+    def test_import_stops_after_max_rows(self):
+        rows = [
+            json.dumps({'title': f'Item {number}', 'description': 'Used', 'price': '10', 'category': 'books', 'condition': 'good'})
+            for number in range(5)
+        ]
+        with mock.patch.object(ProductImportView, 'max_rows', 3):
+            lines = self.import_file('\n'.join(rows).encode(), 'listings.jsonl')
+
+        self.assertEqual([line.get('status') for line in lines[:-1]], ['created', 'created', 'created', 'truncated'])
+        self.assertEqual(lines[3]['row'], 4)
+        self.assertEqual(lines[-1], {'summary': {'created': 3, 'failed': 0, 'truncated': True}})
+        self.assertEqual(Product.objects.filter(seller=self.buyer).count(), 3)
+
+
+class ProductImageUpdateTests(TestCase):
+    """Updating a product's images with ``images`` and ``image_ids``."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user('seller', 'seller@example.com', 'password')
+        books = Category.objects.get_or_create(slug='books', defaults={'name': 'Textbooks'})[0]
+        cls.product = Product.objects.create(
+            title='Physics, Vol. 1', description='Used', price='450.00', category=books,
+            condition='good', seller=cls.seller,
+        )
+        cls.images = [
+            ProductImage.objects.create(product=cls.product, image=f'image-{order}', order=order, is_primary=order == 0)
+            for order in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.seller)
+
+    def update(self, data):
+        response = self.client.patch(f'/api/products/{self.product.pk}/update/', data, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+
+    def image_rows(self):
+        return list(self.product.images.order_by('order').values_list('pk', 'order', 'is_primary'))
+
+    def test_omitting_images_keeps_them(self):
+        self.update({'title': 'Physics, Vol. 2'})
+        self.assertEqual(len(self.image_rows()), 3)
+
+    def test_empty_images_list_removes_all_images(self):
+        self.update({'images': []})
+        self.assertEqual(self.image_rows(), [])
+
+    def test_empty_image_ids_list_removes_all_images(self):
+        self.update({'image_ids': []})
+        self.assertEqual(self.image_rows(), [])
+
+    def test_image_ids_keep_and_reorder(self):
+        first, _, third = self.images
+        self.update({'image_ids': [third.pk, first.pk]})
+        self.assertEqual(self.image_rows(), [(third.pk, 0, True), (first.pk, 1, False)])
+
+    def test_unknown_image_id_is_rejected(self):
+        response = self.client.patch(
+            f'/api/products/{self.product.pk}/update/', {'image_ids': [0]}, format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(len(self.image_rows()), 3)
+
+
+@mock.patch('backend.pagination.KeysetPagination.page_size', 2)
+class ProductListKeysetTests(TestCase):
+    """Cursor pagination of the product list."""
+
+    @classmethod
+    def setUpTestData(cls):
+        seller = User.objects.create_user('seller', 'seller@example.com', 'password')
+        books = Category.objects.get_or_create(slug='books', defaults={'name': 'Textbooks'})[0]
+        cls.products = [
+            Product.objects.create(
+                title=f'Book {i}', description='Used', price='100.00', category=books,
+                condition='good', seller=seller,
+            )
+            for i in range(5)
+        ]
+        # Newest first: ids 4, 3, 2, 1, 0.
+        cls.newest_first = [product.pk for product in reversed(cls.products)]
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def ids(self, data):
+        return [product['id'] for product in data['results']]
+
+    def test_older_and_newer_links_walk_the_feed(self):
+        first = self.get('/api/products/?cursor=')
+        self.assertNotIn('count', first)
+        self.assertEqual(self.ids(first), self.newest_first[:2])
+
+        second = self.get(first['older'])
+        self.assertEqual(self.ids(second), self.newest_first[2:4])
+
+        last = self.get(second['older'])
+        self.assertEqual(self.ids(last), self.newest_first[4:])
+        self.assertIsNone(last['older'])
+
+        back = self.get(second['newer'])
+        self.assertEqual(self.ids(back), self.newest_first[:2])
+
+    def test_newer_link_picks_up_new_products(self):
+        first = self.get('/api/products/?cursor=')
+        self.assertEqual(self.ids(self.get(first['newer'])), [])
+
+        product = Product.objects.create(
+            title='Book 5', description='Used', price='100.00', category=self.products[0].category,
+            condition='good', seller=self.products[0].seller,
+        )
+        cache.clear()
+        self.assertEqual(self.ids(self.get(first['newer'])), [product.pk])
+
+    def test_bad_cursor_is_not_found(self):
+        for cursor in ('not-base64!', 'WzFd', 'WyJub3QtYS1kYXRlIiwgMV0='):
+            with self.subTest(cursor=cursor):
+                response = self.client.get(f'/api/products/?cursor={cursor}')
+                self.assertEqual(response.status_code, 404)
+
+    def test_other_orderings_fall_back_to_page_numbers(self):
+        for ordering in ('created_at', 'price'):
+            with self.subTest(ordering=ordering):
+                data = self.get(f'/api/products/?cursor=&ordering={ordering}')
+                self.assertEqual(data['count'], 5)
+                self.assertNotIn('older', data)
+
+        data = self.get('/api/products/?cursor=&ordering=-created_at')
+        self.assertEqual(self.ids(data), self.newest_first[:2])
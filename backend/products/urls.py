@@ -3,7 +3,10 @@ from . import views
 
 urlpatterns = [
     path('products/', views.ProductListView.as_view(), name='product-list'),
+    path('products/facets/', views.ProductFacetsView.as_view(), name='product-facets'),
     path('products/create/', views.ProductCreateView.as_view(), name='product-create'),
+    path('products/import/', views.ProductImportView.as_view(), name='product-import'),
+    path('products/export/', views.ProductExportView.as_view(), name='product-export'),
     path('products/my-listings/', views.UserProductsView.as_view(), name='user-products'),
     path('products/<int:pk>/', views.ProductDetailView.as_view(), name='product-detail'),
     path('products/<int:pk>/update/', views.ProductUpdateView.as_view(), name='product-update'),
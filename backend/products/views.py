@@ -1,9 +1,12 @@
-from rest_framework import generics, status, filters
+import json
+from rest_framework import generics, status, filters, serializers
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly,AllowAny
 from rest_framework.views import APIView
+from rest_framework.parsers import MultiPartParser
 from django.shortcuts import get_object_or_404
-from django.db.models import Exists, OuterRef, Value, BooleanField
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Value, BooleanField, F
 from .models import Product, Category, Wishlist, ProductLike, ProductReport
 from .serializers import (
     ProductSerializer, ProductCreateUpdateSerializer, CategorySerializer, 
@@ -13,72 +16,139 @@ from django.conf import settings
 import razorpay
 from .models import Payment
 from .serializers import PaymentSerializer
+from .filters import ProductSearchFilter
+from backend.pagination import KeysetPagination
+from . import cache as product_cache
+from . import counters
+from . import facets
+from . import categories
+from . import bulk
 from notifications.views import notify_product_liked, notify_product_sold
 from django.utils.decorators import method_decorator
 from django.views.decorators.cache import cache_page
+from django.http import StreamingHttpResponse
+class CachedProductListMixin:
+    """
+    Serves product list pages from the layered product cache.
+
+    The queryset is only used to pick and order the ids on the page; the
+    shared product cards come from ``products.cache`` and the requesting
+    user's wishlist/like flags are merged in afterwards.
+    """
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        products = page if page is not None else queryset
+        cards = product_cache.get_product_cards(
+            [product.pk for product in products], self.get_serializer_context()
+        )
+        data = product_cache.apply_user_flags(cards, request.user)
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+
+
+def _condition_values(query_params):
+    """
+    The frontend sends condition display names (e.g., "Like New"), but the DB
+    stores values (e.g., "like_new"); map the display names to the values.
+    """
+    condition_map = {display: value for value, display in Product.CONDITION_CHOICES}
+    return [condition_map[c] for c in query_params.getlist('condition', []) if c in condition_map]
+
+
+def _filter_price_range(queryset, query_params):
+    """Apply ``min_price``/``max_price``; a value that isn't a number is a 400."""
+    price_field = serializers.DecimalField(max_digits=None, decimal_places=None)
+    for param, lookup in (('min_price', 'price__gte'), ('max_price', 'price__lte')):
+        value = query_params.get(param, None)
+        if not value:
+            continue
+        try:
+            value = price_field.to_internal_value(value)
+        except serializers.ValidationError as error:
+            raise serializers.ValidationError({param: error.detail})
+        queryset = queryset.filter(**{lookup: value})
+    return queryset
+
+
+def _category_id(query_params):
+    """
+    The id of the requested category (name or slug), or None for all
+    categories. An unknown category gives 0, which matches no product.
+    """
+    category_param = query_params.get('category', None)
+    if not category_param or category_param.lower() == 'all':
+        return None
+    category = categories.resolve(category_param)
+    return category.id if category else 0
+
+
 # Note: We are now handling filtering manually, so ProductFilter is no longer used here.
-@method_decorator(cache_page(60 * 2), name='dispatch') 
-class ProductListView(generics.ListAPIView):
+class ProductListView(CachedProductListMixin, generics.ListAPIView):
     """
     Lists products with manual filtering to ensure correct database queries.
     """
     serializer_class = ProductSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
-    # We will use SearchFilter and OrderingFilter, but handle other filters manually.
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
-    search_fields = ['title', 'description', 'brand', 'category']
+    pagination_class = KeysetPagination
+    # Full-text search and ordering run as filter backends; other filters are handled manually.
+    # The search backend runs last so it can order by relevance when no ordering is requested.
+    filter_backends = [filters.OrderingFilter, ProductSearchFilter]
+    search_fields = ['title', 'description', 'brand', 'category__name']
     ordering_fields = ['created_at', 'price', 'views_count', 'likes_count']
     ordering = ['-created_at']
 
     def get_queryset(self):
-        user = self.request.user
-        queryset = Product.objects.filter(is_active=True, is_sold=False).select_related('seller').prefetch_related('images', 'product_tags__tag')
+        # Only ids are needed here; product cards are loaded through the product cache.
+        queryset = Product.objects.filter(is_active=True, is_sold=False)
 
         # Manually apply filters from query parameters to bypass the previous FieldError.
+        query_params = self.request.query_params
         
         # Category Filter
-        category_param = self.request.query_params.get('category', None)
-        if category_param and category_param.lower() != 'all':
-            # Filter directly on the 'category' CharField with a case-insensitive match.
-            queryset = queryset.filter(category__iexact=category_param)
+        category_id = _category_id(query_params)
+        if category_id is not None:
+            # Resolved through the in-process category cache; product_category_feed_idx covers it.
+            queryset = queryset.filter(category_id=category_id)
 
-        # --- FIX APPLIED ---
         # Condition Filter (handles multiple values)
-        condition_params = self.request.query_params.getlist('condition', [])
-        if condition_params:
-            # The frontend sends display names (e.g., "Like New"), but the DB stores values (e.g., "like_new").
-            # We need to map the display names to the values before filtering.
-            condition_map = {display: value for value, display in Product.CONDITION_CHOICES}
-            db_conditions = [condition_map.get(c) for c in condition_params if c in condition_map]
-            
-            if db_conditions:
-                queryset = queryset.filter(condition__in=db_conditions)
+        db_conditions = _condition_values(query_params)
+        if db_conditions:
+            queryset = queryset.filter(condition__in=db_conditions)
             
         # Price Range Filter
-        min_price = self.request.query_params.get('min_price', None)
-        if min_price:
-            queryset = queryset.filter(price__gte=min_price)
-        
-        max_price = self.request.query_params.get('max_price', None)
-        if max_price:
-            queryset = queryset.filter(price__lte=max_price)
+        queryset = _filter_price_range(queryset, query_params)
 
-        # Annotate queryset with user-specific data (wishlist and likes)
-        if user.is_authenticated:
-            wishlist_subquery = Wishlist.objects.filter(user=user, product=OuterRef('pk'))
-            likes_subquery = ProductLike.objects.filter(user=user, product=OuterRef('pk'))
-            queryset = queryset.annotate(
-                is_in_wishlist=Exists(wishlist_subquery),
-                is_liked=Exists(likes_subquery)
-            )
-        else:
-            queryset = queryset.annotate(
-                is_in_wishlist=Value(False, output_field=BooleanField()), 
-                is_liked=Value(False, output_field=BooleanField())
-            )
-            
+        # User-specific data (wishlist and likes) is merged in by CachedProductListMixin.
         return queryset
 
+class ProductFacetsView(generics.GenericAPIView):
+    """
+    Counts per category, condition and price bucket for the marketplace
+    filters, taking the same query parameters as ``ProductListView``. Each
+    facet is counted with the other active filters applied.
+    """
+    permission_classes = [AllowAny]
+    filter_backends = [ProductSearchFilter]
+    search_fields = ProductListView.search_fields
+
+    def get(self, request, *args, **kwargs):
+        query_params = request.query_params
+        # Search and price range narrow the cube itself; category and condition are applied to it.
+        queryset = Product.objects.filter(is_active=True, is_sold=False)
+        queryset = self.filter_queryset(_filter_price_range(queryset, query_params))
+        cube = facets.get_cube(queryset, {
+            name: query_params.get(name, '').strip() for name in ('search', 'min_price', 'max_price')
+        })
+        return Response(facets.facet_counts(
+            cube,
+            category_id=_category_id(query_params),
+            conditions=_condition_values(query_params),
+            condition_choices=Product.CONDITION_CHOICES,
+        ))
+
 class ProductCreateView(generics.CreateAPIView):
     """
     Handles the creation of a new product. This view remains unchanged
@@ -91,6 +161,52 @@ class ProductCreateView(generics.CreateAPIView):
     def perform_create(self, serializer):
         serializer.save(seller=self.request.user)
 
+class ProductImportView(APIView):
+    """
+    Import listings for the current user from an uploaded CSV or JSON Lines
+    ``file``. The response streams one JSON line per row as chunks are
+    saved, followed by a summary line.
+    """
+    permission_classes = [IsAuthenticated]
+    parser_classes = [MultiPartParser]
+    max_rows = 1000
+
+    def post(self, request, *args, **kwargs):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'error': 'Upload a CSV or JSON Lines file as "file".'}, status=status.HTTP_400_BAD_REQUEST)
+        file_format = request.data.get('file_format') or bulk.detect_format(upload.name, upload.content_type or '')
+        if file_format not in bulk.FORMATS:
+            return Response({'error': f'file_format must be one of {", ".join(bulk.FORMATS)}.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        def report():
+            summary = {'created': 0, 'failed': 0, 'truncated': False}
+            rows = bulk.read_rows(upload, file_format)
+            for result in bulk.import_products(rows, request.user, max_rows=self.max_rows):
+                if result['status'] == 'truncated':
+                    summary['truncated'] = True
+                else:
+                    summary['created' if result['status'] == 'created' else 'failed'] += 1
+                yield json.dumps(result) + '\n'
+            yield json.dumps({'summary': summary}) + '\n'
+
+        return StreamingHttpResponse(report(), content_type='application/x-ndjson')
+
+class ProductExportView(APIView):
+    """Stream the current user's listings as CSV or JSON Lines (``?file_format=``)."""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        file_format = request.query_params.get('file_format', 'csv')
+        if file_format not in bulk.FORMATS:
+            return Response({'error': f'file_format must be one of {", ".join(bulk.FORMATS)}.'}, status=status.HTTP_400_BAD_REQUEST)
+        content_type = 'text/csv' if file_format == 'csv' else 'application/x-ndjson'
+        response = StreamingHttpResponse(
+            bulk.export_products(Product.objects.filter(seller=request.user), file_format), content_type=content_type
+        )
+        response['Content-Disposition'] = f'attachment; filename="listings.{file_format}"'
+        return response
+
 class ProductDetailView(generics.RetrieveAPIView):
     queryset = Product.objects.filter(is_active=True)
     serializer_class = ProductSerializer
@@ -112,7 +228,8 @@ class ProductDetailView(generics.RetrieveAPIView):
 
     def retrieve(self, request, *args, **kwargs):
         instance = self.get_object()
-        instance.increment_views()
+        # Views are buffered and flushed in batches by the flush_view_counts command.
+        instance.views_count += counters.record_view(instance.pk)
         serializer = self.get_serializer(instance)
         return Response(serializer.data)
 
@@ -131,20 +248,12 @@ class ProductDeleteView(generics.DestroyAPIView):
     def get_queryset(self):
         return self.queryset.filter(seller=self.request.user)
 
-@method_decorator(cache_page(60 * 2), name='dispatch') 
-class UserProductsView(generics.ListAPIView):
+class UserProductsView(CachedProductListMixin, generics.ListAPIView):
     serializer_class = ProductSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        user = self.request.user
-        wishlist_subquery = Wishlist.objects.filter(user=user, product=OuterRef('pk'))
-        likes_subquery = ProductLike.objects.filter(user=user, product=OuterRef('pk'))
-        
-        return Product.objects.filter(seller=user).select_related('seller').prefetch_related('images', 'product_tags__tag').annotate(
-            is_in_wishlist=Exists(wishlist_subquery),
-            is_liked=Exists(likes_subquery)
-        ).order_by('-created_at')
+        return Product.objects.filter(seller=self.request.user).order_by('-created_at')
 
 @method_decorator(cache_page(60 * 60), name='dispatch') 
 class CategoryListView(generics.ListAPIView):
@@ -168,17 +277,22 @@ class ProductLikeToggleView(APIView):
 
     def post(self, request, pk):
         product = get_object_or_404(Product, pk=pk)
-        like, created = ProductLike.objects.get_or_create(user=request.user, product=product)
+        # The like row and the counter change together, and the counter is
+        # updated in SQL so concurrent toggles can't lose updates.
+        with transaction.atomic():
+            like, created = ProductLike.objects.get_or_create(user=request.user, product=product)
+            if created:
+                Product.objects.filter(pk=pk).update(likes_count=F('likes_count') + 1)
+                message, liked_status = 'Product liked', True
+            else:
+                like.delete()
+                Product.objects.filter(pk=pk, likes_count__gt=0).update(likes_count=F('likes_count') - 1)
+                message, liked_status = 'Product unliked', False
+            transaction.on_commit(lambda: product_cache.invalidate_product(pk))
+        product.refresh_from_db(fields=['likes_count'])
         if created:
-            product.likes_count += 1
-            message, liked_status = 'Product liked', True
             # Notify seller about the like
             notify_product_liked(product, request.user)
-        else:
-            like.delete()
-            product.likes_count = max(0, product.likes_count - 1)
-            message, liked_status = 'Product unliked', False
-        product.save(update_fields=['likes_count'])
         return Response({'message': message, 'liked': liked_status, 'likes_count': product.likes_count})
 
 class ProductReportView(generics.CreateAPIView):
@@ -286,7 +400,6 @@ class WishlistCountView(APIView):
 # yourapp/views.py
 
 import os
-import json
 import google.generativeai as genai
 from django.http import JsonResponse
 from django.views.decorators.http import require_http_methods
@@ -0,0 +1,29 @@
+"""
+JWT authentication backed by the cached auth snapshot.
+
+For hot, read-only endpoints (e.g. the header badge counters): the token is
+validated without a database query, and the user is checked to still be
+active against the snapshot cache that ``users.signals`` clears whenever a
+user is saved. Only a cache miss loads the user.
+"""
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .snapshots import get_active_user_snapshot
+
+
+class CachedSnapshotJWTAuthentication(JWTStatelessUserAuthentication):
+    """Sets ``request.user`` to the active user's ``UserSnapshot``."""
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        snapshot = get_active_user_snapshot(user_id)
+        if snapshot is None:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        return snapshot
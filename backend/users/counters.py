@@ -0,0 +1,131 @@
+"""
+Header badge counters: wishlist items, unread messages and unread notifications.
+
+Each user has a counters version in the cache. The counters themselves are
+cached under that version and the version doubles as the ETag, so a client
+revalidating unchanged counters costs a single cache read. Code that changes
+a counter calls ``changed()``, which (after commit) bumps the versions in
+one Redis pipeline and queues the deltas for the users' WebSocket groups
+and Pusher channels on the delivery queue (``notifications.delivery``).
+
+Versions expire with the cached counters, so a change that bypassed
+``changed()`` is picked up within ``COUNTERS_TIMEOUT``; an expired version
+is re-seeded from the clock and never repeats an old ETag.
+"""
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Sum
+
+from notifications import delivery
+
+COUNTERS_TIMEOUT = 60 * 60
+VERSION_TIMEOUT = COUNTERS_TIMEOUT
+
+
+def _version_key(user_id):
+    return f'counters:version:{user_id}'
+
+
+def _counters_key(user_id, version):
+    return f'counters:{user_id}:{version}'
+
+
+def get_version(user_id):
+    """Return the user's current counters version."""
+    version = cache.get(_version_key(user_id))
+    if version is None:
+        # Seeded from the clock so a version lost from the cache is never reused.
+        cache.add(_version_key(user_id), int(time.time() * 1000), VERSION_TIMEOUT)
+        version = cache.get(_version_key(user_id))
+    return version
+
+
+def etag(user_id, version):
+    return f'"counters-{user_id}-{version}"'
+
+
+def compute_counters(user_id):
+    from chat.models import ConversationParticipant
+    from notifications.models import Notification
+    from products.models import Wishlist
+
+    return {
+        'wishlist': Wishlist.objects.filter(user_id=user_id).count(),
+        'unread_messages': ConversationParticipant.objects.filter(
+            user_id=user_id
+        ).aggregate(total=Sum('unread_count'))['total'] or 0,
+        'unread_notifications': Notification.objects.filter(recipient_id=user_id, is_read=False).count(),
+    }
+
+
+def get_counters(user_id):
+    """Return ``(version, counters)`` for a user, computing the counters on a cache miss."""
+    version = get_version(user_id)
+    key = _counters_key(user_id, version)
+    counters = cache.get(key)
+    if counters is None:
+        counters = compute_counters(user_id)
+        cache.set(key, counters, COUNTERS_TIMEOUT)
+    return version, counters
+
+
+def changed(user_ids, **deltas):
+    """
+    Record counter changes, e.g. ``changed([user.id], unread_messages=1)``.
+    After commit each user's version is bumped and the deltas are pushed.
+    """
+    user_ids = list(user_ids)
+    deltas = {name: delta for name, delta in deltas.items() if delta}
+    if user_ids and deltas:
+        transaction.on_commit(lambda: publish(user_ids, deltas))
+
+
+def _redis_client():
+    """The raw Redis client behind the default cache, or None for other backends."""
+    try:
+        from django_redis import get_redis_connection
+        return get_redis_connection('default')
+    except (ImportError, NotImplementedError):
+        return None
+
+
+def bump_versions(user_ids):
+    """Increment the users' versions, in one round trip on Redis. Returns ``{user_id: version}``."""
+    client = _redis_client()
+    if client is None:
+        versions = {}
+        for user_id in user_ids:
+            try:
+                versions[user_id] = cache.incr(_version_key(user_id))
+                cache.touch(_version_key(user_id), VERSION_TIMEOUT)
+            except ValueError:
+                versions[user_id] = get_version(user_id)
+        return versions
+
+    pipe = client.pipeline(transaction=False)
+    for user_id in user_ids:
+        key = cache.make_key(_version_key(user_id))
+        pipe.incr(key)
+        pipe.expire(key, VERSION_TIMEOUT)
+    versions = dict(zip(user_ids, pipe.execute()[::2]))
+    for user_id, version in versions.items():
+        if version == 1:
+            # The version had expired and INCR restarted it, which could
+            # repeat an old ETag; re-seed it from the clock instead.
+            cache.delete(_version_key(user_id))
+            versions[user_id] = get_version(user_id)
+    return versions
+
+
+def publish(user_ids, deltas):
+    versions = bump_versions(list(dict.fromkeys(user_ids)))
+    group_sends, pusher_events = [], []
+    for user_id, version in versions.items():
+        event = {'version': version, 'deltas': deltas}
+        group_sends.append((f'user_{user_id}', {'type': 'counters_updated', **event}))
+        pusher_events.append((f'private-notifications-{user_id}', 'counters-updated', event))
+    delivery.enqueue_group_sends(group_sends)
+    if delivery.pusher_enabled():
+        delivery.enqueue_many(pusher_events)
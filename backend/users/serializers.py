@@ -2,6 +2,7 @@ from rest_framework import serializers
 from django.contrib.auth import authenticate
 from rest_framework_simplejwt.tokens import RefreshToken
 from .models import User, Review, UserProfile
+from .snapshots import avatar_url
 
 
 class UserRegistrationSerializer(serializers.ModelSerializer):
@@ -82,6 +83,22 @@ class UserSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'rating', 'review_count', 'is_verified', 'created_at']
 
 
+class PublicUserSerializer(serializers.ModelSerializer):
+    """Slim public user data embedded in product cards and chat payloads"""
+    
+    name = serializers.CharField(source='full_name', read_only=True)
+    # Same URL as UserSnapshot.as_dict(), with or without a request
+    avatar = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = User
+        fields = ['id', 'username', 'name', 'first_name', 'last_name', 'avatar', 'rating', 'college']
+        read_only_fields = fields
+    
+    def get_avatar(self, obj):
+        return avatar_url(obj.avatar)
+
+
 class UserProfileSerializer(serializers.ModelSerializer):
     """Serializer for user profile"""
     
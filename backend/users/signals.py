@@ -0,0 +1,14 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import User
+from .snapshots import invalidate_user_snapshot
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, update_fields=None, **kwargs):
+    """Drop the cached public and WebSocket auth snapshots when a user changes."""
+    # Login bookkeeping doesn't touch any public field.
+    if update_fields is not None and set(update_fields) <= {'last_login', 'last_active'}:
+        return
+    invalidate_user_snapshot(instance.pk)
@@ -0,0 +1,147 @@
+"""
+Compact, cacheable snapshots of a user's public profile.
+
+Used wherever only the public face of a user is needed (WebSocket consumers,
+broadcast payloads) instead of holding or serializing a full ``User``.
+Snapshots are cached by user id and invalidated when the user is saved.
+"""
+from urllib.parse import urljoin
+
+from django.conf import settings
+from django.core.cache import cache
+
+SNAPSHOT_TIMEOUT = 60 * 60
+
+
+def avatar_url(avatar):
+    """
+    Absolute URL of an avatar file. Built without a request, so REST,
+    WebSocket and Pusher payloads all carry the same URL.
+    """
+    if not avatar:
+        return None
+    return urljoin(settings.MEDIA_BASE_URL, avatar.url)
+
+
+class UserSnapshot:
+    """Public fields of a user. Quacks enough like a user for consumer code."""
+
+    __slots__ = ('id', 'username', 'first_name', 'last_name', 'avatar', 'rating', 'college')
+
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, id, username, first_name='', last_name='', avatar=None, rating=None, college=''):
+        self.id = id
+        self.username = username
+        self.first_name = first_name
+        self.last_name = last_name
+        self.avatar = avatar
+        self.rating = rating
+        self.college = college
+
+    @classmethod
+    def from_user(cls, user):
+        return cls(
+            id=user.id,
+            username=user.username,
+            first_name=user.first_name,
+            last_name=user.last_name,
+            avatar=avatar_url(user.avatar),
+            rating=user.rating,
+            college=user.college,
+        )
+
+    @property
+    def pk(self):
+        return self.id
+
+    @property
+    def name(self):
+        return f"{self.first_name} {self.last_name}".strip()
+
+    def get_full_name(self):
+        return self.name
+
+    def as_dict(self):
+        """Payload matching PublicUserSerializer."""
+        return {
+            'id': self.id,
+            'username': self.username,
+            'name': self.name,
+            'first_name': self.first_name,
+            'last_name': self.last_name,
+            'avatar': self.avatar,
+            'rating': self.rating,
+            'college': self.college,
+        }
+
+    def __getstate__(self):
+        return tuple(getattr(self, slot) for slot in self.__slots__)
+
+    def __setstate__(self, state):
+        for slot, value in zip(self.__slots__, state):
+            setattr(self, slot, value)
+
+    def __eq__(self, other):
+        return isinstance(other, UserSnapshot) and other.id == self.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def __repr__(self):
+        return f"<UserSnapshot {self.id}: {self.username}>"
+
+
+def _cache_key(user_id):
+    return f'user:snapshot:{user_id}'
+
+
+def get_auth_snapshot_key(user_id):
+    """
+    Cache key for the snapshot of an *active* user, kept by the WebSocket
+    auth middleware and ``users.authentication``.
+    """
+    return f'user:auth-snapshot:{user_id}'
+
+
+def get_active_user_snapshot(user_id):
+    """Return the UserSnapshot of an active user from the auth cache, or None."""
+    from .models import User
+
+    key = get_auth_snapshot_key(user_id)
+    snapshot = cache.get(key)
+    if snapshot is None:
+        user = User.objects.filter(id=user_id, is_active=True).first()
+        if user is None:
+            return None
+        snapshot = UserSnapshot.from_user(user)
+        cache.set(key, snapshot, getattr(settings, 'WEBSOCKET_AUTH_CACHE_TTL', 300))
+    return snapshot
+
+
+def get_user_snapshots(user_ids):
+    """Return ``{user_id: UserSnapshot}`` for the given ids, loading misses in one query."""
+    from .models import User
+
+    user_ids = set(user_ids)
+    cached = cache.get_many([_cache_key(user_id) for user_id in user_ids])
+    snapshots = {snapshot.id: snapshot for snapshot in cached.values()}
+    missing = user_ids - snapshots.keys()
+    if missing:
+        fresh = {}
+        for user in User.objects.filter(id__in=missing):
+            snapshot = UserSnapshot.from_user(user)
+            snapshots[user.id] = snapshot
+            fresh[_cache_key(user.id)] = snapshot
+        cache.set_many(fresh, SNAPSHOT_TIMEOUT)
+    return snapshots
+
+
+def get_user_snapshot(user_id):
+    """Return the UserSnapshot for a user id, or None if there is no such user."""
+    return get_user_snapshots([user_id]).get(user_id)
+
+
+def invalidate_user_snapshot(user_id):
+    cache.delete_many([_cache_key(user_id), get_auth_snapshot_key(user_id)])
@@ -17,6 +17,7 @@ urlpatterns = [
     path('users/<int:pk>/', views.UserDetailView.as_view(), name='user-detail'),
     path('users/<int:user_id>/reviews/', views.UserReviewListView.as_view(), name='user-reviews'),
     path('profile/', views.MyProfileView.as_view(), name='my-profile'),
+    path('users/me/counters/', views.badge_counters, name='badge-counters'),
     
     # Statistics
     path('users/stats/', views.user_stats, name='user-stats'),
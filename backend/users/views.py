@@ -1,9 +1,11 @@
 from rest_framework import generics, status, permissions
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, authentication_classes, permission_classes
 from rest_framework.response import Response
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import authenticate
 from django.db.models import Count, Sum
+from . import counters
+from .authentication import CachedSnapshotJWTAuthentication
 from .models import User, Review, UserProfile
 from .serializers import (
     UserRegistrationSerializer, UserLoginSerializer, UserSerializer,
@@ -203,3 +205,24 @@ class MyProfileView(generics.RetrieveAPIView):
 
     def get_object(self):
         return UserProfile.objects.get(user=self.request.user)
+
+
+@api_view(['GET'])
+@authentication_classes([CachedSnapshotJWTAuthentication])
+@permission_classes([permissions.IsAuthenticated])
+def badge_counters(request):
+    """
+    Get the header badge counters (wishlist, unread messages, unread
+    notifications) in one request. Send the ETag back in ``If-None-Match``:
+    unchanged counters return 304 without a database query.
+    """
+    # The user comes from the cached auth snapshot, not the database.
+    user_id = request.user.id
+    tag = counters.etag(user_id, counters.get_version(user_id))
+    headers = {'ETag': tag, 'Cache-Control': 'private, no-cache'}
+    if tag in [value.strip() for value in request.headers.get('If-None-Match', '').split(',')]:
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    version, values = counters.get_counters(user_id)
+    headers['ETag'] = counters.etag(user_id, version)
+    return Response({**values, 'version': version}, headers=headers)
@@ -3,8 +3,8 @@
 import { useState, useEffect, useRef, Suspense } from 'react';
 import { useAuth } from '@/components/auth-provider';
 import { getMyChats, getChatMessages, createMessage } from '@/utils/api';
+import { getPusher } from '@/utils/pusher';
 import { useRouter, useSearchParams } from 'next/navigation';
-import Pusher from 'pusher-js';
 import { Send, MessageSquare, Zap, ArrowRight, Activity, Terminal } from 'lucide-react';
 import { toast } from '@/hooks/use-toast';
 import Header from '@/components/header';
@@ -74,15 +74,7 @@ function ChatPageContent() {
         }
 
         if (!pusherRef.current) {
-            pusherRef.current = new Pusher(process.env.NEXT_PUBLIC_PUSHER_KEY, {
-                cluster: process.env.NEXT_PUBLIC_PUSHER_CLUSTER,
-                authEndpoint: 'http://localhost:8000/api/pusher/auth/',
-                auth: {
-                    headers: {
-                        Authorization: `Bearer ${localStorage.getItem("auth_token")}`
-                    }
-                }
-            });
+            pusherRef.current = getPusher();
         }
 
         const channelName = `private-conversation-${selectedChat.id}`;
@@ -6,7 +6,7 @@ import Footer from "@/components/footer"
 import {
   Filter, Grid, List, Heart, MessageCircle, Star, Search, BookOpen, Smartphone, FileText, Sofa, Loader2, X
 } from "lucide-react"
-import { fetchProducts, fetchCategories, addToWishlist, removeFromWishlist, startConversation } from "@/utils/api"
+import { fetchProducts, fetchProductFacets, fetchCategories, addToWishlist, removeFromWishlist, startConversation } from "@/utils/api"
 import { useToast } from "@/hooks/use-toast"
 import { useAuth } from "@/components/auth-provider"
 
@@ -44,6 +44,7 @@ export default function MarketplacePage() {
   const [hasMore, setHasMore] = useState(true)
   const [currentPage, setCurrentPage] = useState(1)
   const [totalCount, setTotalCount] = useState(0)
+  const [facets, setFacets] = useState(null)
 
   const [searchInput, setSearchInput] = useState(searchParams.get("search") || "")
   const debouncedSearch = useDebounce(searchInput, 500)
@@ -104,6 +105,29 @@ export default function MarketplacePage() {
     loadProducts(true)
   }, [filters.category, filters.condition, filters.priceRange, filters.sortBy, filters.search])
 
+  // Facet counts don't depend on sorting, so they are only reloaded when a filter changes
+  useEffect(() => {
+    fetchProductFacets({
+      search: filters.search || undefined,
+      category: filters.category !== "all" ? filters.category : undefined,
+      condition: filters.condition.length > 0 ? filters.condition : undefined,
+      min_price: filters.priceRange[0] > 0 ? filters.priceRange[0] : undefined,
+      max_price: filters.priceRange[1] < 100000 ? filters.priceRange[1] : undefined,
+    }).then(setFacets).catch(() => setFacets(null))
+  }, [filters.category, filters.condition, filters.priceRange, filters.search])
+
+  const categoryCounts = useMemo(() => {
+    const counts = {}
+    facets?.category.forEach((facet) => { counts[facet.value] = facet.count })
+    return counts
+  }, [facets])
+
+  const conditionCounts = useMemo(() => {
+    const counts = {}
+    facets?.condition.forEach((facet) => { counts[facet.label] = facet.count })
+    return counts
+  }, [facets])
+
   const loadProducts = useCallback(async (reset = false) => {
     try {
       if (reset) {
@@ -314,6 +338,9 @@ export default function MarketplacePage() {
                     >
                       <cat.icon className="h-4 w-4 mr-3" />
                       {cat.name}
+                      {facets && (
+                        <span className="ml-auto">[{cat.id === "all" ? facets.category.reduce((sum, facet) => sum + facet.count, 0) : categoryCounts[String(cat.id).toLowerCase()] || 0}]</span>
+                      )}
                     </button>
                   ))}
                 </div>
@@ -332,6 +359,9 @@ export default function MarketplacePage() {
                         className="appearance-none w-5 h-5 border-[3px] border-black checked:bg-[#CCFF00] relative checked:after:content-['✓'] checked:after:absolute checked:after:text-black checked:after:font-bold checked:after:text-xs checked:after:top-[-2px] checked:after:left-[2px]"
                       />
                       <span className="font-mono font-bold text-xs text-gray-700 uppercase group-hover:text-black transition-colors">{condition.toUpperCase()}</span>
+                      {facets && (
+                        <span className="ml-auto font-mono font-bold text-xs text-gray-500">{conditionCounts[condition] || 0}</span>
+                      )}
                     </label>
                   ))}
                 </div>
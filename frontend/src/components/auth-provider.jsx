@@ -1,6 +1,7 @@
 "use client"
 import { createContext, useContext, useState, useEffect } from "react"
 import { loginUser, registerUser, logoutUser, getCurrentUser } from "@/utils/api"
+import { disconnectPusher } from "@/utils/pusher"
 import { useRouter } from "next/navigation"
 
 const AuthContext = createContext()
@@ -75,6 +76,7 @@ export function AuthProvider({ children }) {
   const logout = () => {
     console.log("🔍 Logging out user")
     logoutUser()
+    disconnectPusher()
     setUser(null)
     router.push("/login")
   }
@@ -13,7 +13,11 @@ import {
 } from "@/components/ui/dropdown-menu"
 import { Sheet, SheetContent, SheetTrigger, SheetTitle, SheetDescription } from "@/components/ui/sheet"
 import { useAuth } from "@/components/auth-provider"
-import { fetchWishlistCount, fetchUnreadMessagesCount } from "@/utils/api"
+import { fetchBadgeCounters } from "@/utils/api"
+import { getPusher } from "@/utils/pusher"
+
+// Counters are pushed as they change; this slow refresh only resyncs missed events.
+const COUNTERS_REFRESH_INTERVAL = 5 * 60 * 1000
 
 export default function Header() {
   const { user, logout, isAuthenticated } = useAuth()
@@ -23,24 +27,30 @@ export default function Header() {
   const [unreadMessages, setUnreadMessages] = useState(0);
 
   useEffect(() => {
-    if (isAuthenticated) {
+    if (isAuthenticated && user) {
       const fetchCounts = async () => {
-        try {
-          const [wishlistNum, messagesNum] = await Promise.all([
-            fetchWishlistCount(),
-            fetchUnreadMessagesCount()
-          ]);
-          setWishlistCount(wishlistNum);
-          setUnreadMessages(messagesNum);
-        } catch (e) {
-          console.error(e)
+        const counters = await fetchBadgeCounters();
+        if (counters) {
+          setWishlistCount(counters.wishlist);
+          setUnreadMessages(counters.unread_messages);
         }
       };
       fetchCounts();
-      const interval = setInterval(fetchCounts, 30000);
-      return () => clearInterval(interval);
+      const interval = setInterval(fetchCounts, COUNTERS_REFRESH_INTERVAL);
+
+      const pusher = getPusher();
+      const channel = pusher.subscribe(`private-notifications-${user.id}`);
+      channel.bind('counters-updated', ({ deltas }) => {
+        if (deltas.wishlist) setWishlistCount(count => Math.max(0, count + deltas.wishlist));
+        if (deltas.unread_messages) setUnreadMessages(count => Math.max(0, count + deltas.unread_messages));
+      });
+
+      return () => {
+        clearInterval(interval);
+        pusher.unsubscribe(`private-notifications-${user.id}`);
+      };
     }
-  }, [isAuthenticated]);
+  }, [isAuthenticated, user]);
 
   const handleSellClick = () => {
     if (isAuthenticated) {
@@ -1,7 +1,7 @@
 import axios from "axios"
 
 // API base URL - replace with your Django backend URL
-const API_BASE_URL = process.env.NEXT_PUBLIC_API_URL || "http://localhost:8000/api"
+export const API_BASE_URL = process.env.NEXT_PUBLIC_API_URL || "http://localhost:8000/api"
 
 // Create axios instance
 const api = axios.create({
@@ -229,6 +229,19 @@ export async function fetchProducts(filters = {}) {
   }
 }
 
+/**
+ * Fetch facet counts (category, condition, price bucket) for the same filters as fetchProducts
+ */
+export async function fetchProductFacets(filters = {}) {
+  try {
+    const response = await api.get("/products/facets/", { params: filters });
+    return response.data;
+  } catch (error) {
+    console.error("Error fetching product facets:", error.response?.data || error.message);
+    throw new Error("Failed to fetch product facets.");
+  }
+}
+
 /**
  * Fetch product by ID
  */
@@ -326,27 +339,38 @@ export async function createProduct(productData) {
  * Update product
  */
 export async function updateProduct(id, productData) {
-  const formData = new FormData();
+  const fields = {};
   for (const key in productData) {
     if (key !== 'images' && productData[key] !== null && productData[key] !== undefined) {
-      if (key === 'tags' && Array.isArray(productData[key])) {
-        productData[key].forEach(tag => formData.append('tags', tag));
+      fields[key] = productData[key];
+    }
+  }
+  // When images are being edited, `image_ids` lists the existing images to keep, in order
+  // (an empty list removes them all); new files are uploaded after them.
+  const images = Array.isArray(productData.images) ? productData.images : null;
+  const newFiles = images ? images.filter(imageObj => imageObj.file) : [];
+  if (images) {
+    fields.image_ids = images.filter(imageObj => !imageObj.file && imageObj.id).map(imageObj => imageObj.id);
+  }
+
+  let body = fields;
+  let headers = {};
+  // Multipart can't carry an empty list, so send JSON unless there are files to upload.
+  if (newFiles.length > 0) {
+    body = new FormData();
+    for (const key in fields) {
+      if (Array.isArray(fields[key])) {
+        fields[key].forEach(value => body.append(key, value));
       } else {
-        formData.append(key, productData[key]);
+        body.append(key, fields[key]);
       }
     }
-  }
-  // Note: Handling of existing vs. new images might need more complex logic here.
-  if (productData.images && productData.images.length > 0) {
-    productData.images.forEach(imageObj => {
-      if (imageObj.file) formData.append("images", imageObj.file, imageObj.file.name);
-    });
+    newFiles.forEach(imageObj => body.append("images", imageObj.file, imageObj.file.name));
+    headers = { "Content-Type": "multipart/form-data" };
   }
   try {
     // UPDATED LOGIC: Changed endpoint to match backend urls.py
-    const response = await api.patch(`/products/${id}/update/`, formData, {
-      headers: { "Content-Type": "multipart/form-data" },
-    });
+    const response = await api.patch(`/products/${id}/update/`, body, { headers });
     return response.data;
   } catch (error) {
     console.error(`Error updating product ${id}:`, error.response?.data || error.message);
@@ -639,6 +663,20 @@ export async function fetchUnreadMessagesCount() {
     return 0; // Return 0 on error
   }
 }
+/**
+ * Fetch all header badge counters (wishlist, unread messages, unread notifications).
+ * The endpoint sends an ETag, so the browser revalidates unchanged counters cheaply.
+ */
+export async function fetchBadgeCounters() {
+  try {
+    const response = await api.get("/users/me/counters/");
+    return response.data;
+  } catch (error) {
+    console.error("Error fetching badge counters:", error);
+    return null;
+  }
+}
+
 /**
  * Fetch user notifications
  */
@@ -0,0 +1,33 @@
+// utils/pusher.js
+
+import Pusher from "pusher-js"
+import { API_BASE_URL } from "./api"
+
+let pusher = null;
+
+// One connection per tab, shared by the header counters and the chat page.
+// Channels are subscribed and unsubscribed by their owners; the connection
+// itself is only closed on logout.
+export function getPusher() {
+  if (!pusher) {
+    pusher = new Pusher(process.env.NEXT_PUBLIC_PUSHER_KEY, {
+      cluster: process.env.NEXT_PUBLIC_PUSHER_CLUSTER,
+      channelAuthorization: {
+        endpoint: `${API_BASE_URL}/pusher/auth/`,
+        transport: "ajax",
+        // Read at subscribe time, so a refreshed token is picked up.
+        headersProvider: () => ({
+          Authorization: `Bearer ${localStorage.getItem("auth_token")}`,
+        }),
+      },
+    });
+  }
+  return pusher;
+}
+
+export function disconnectPusher() {
+  if (pusher) {
+    pusher.disconnect();
+    pusher = null;
+  }
+}
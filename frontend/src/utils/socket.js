@@ -2,6 +2,11 @@
 
 let socket = null;
 let messageListener = null;
+let heartbeatTimer = null;
+
+// Keeps the user "online". The server refreshes presence at most every
+// CHAT_PRESENCE_TIMEOUT / 3 (20s), so beat well inside that window.
+const HEARTBEAT_INTERVAL = 10000;
 
 // Use environment variables for WebSocket URL
 const WS_URL = process.env.NEXT_PUBLIC_WS_URL || "ws://localhost:8000/ws/chat/";
@@ -19,6 +24,7 @@ export function initializeSocket(authToken) {
 
   socket.onopen = () => {
     console.log("✅ WebSocket connection established.");
+    heartbeatTimer = setInterval(() => send({ type: 'heartbeat' }), HEARTBEAT_INTERVAL);
   };
 
   socket.onmessage = (event) => {
@@ -34,6 +40,8 @@ export function initializeSocket(authToken) {
 
   socket.onclose = (event) => {
     console.warn("WebSocket connection closed:", event.reason);
+    clearInterval(heartbeatTimer);
+    heartbeatTimer = null;
     socket = null; // Clear the instance for re-initialization
   };
 
@@ -76,8 +84,11 @@ export function leaveConversation() {
   send({ type: 'leave_conversation' });
 }
 
-export function sendSocketMessage(conversationId, content) {
-  send({ type: 'send_message', conversation_id: conversationId, content: content });
+// `clientId` is a temporary id (up to 64 characters). The saved message is broadcast as
+// `new_message` with its real `id` and this `client_id`, and the sender also gets `message_ack`.
+// `attachmentIds` are ids of uploads completed via /api/chat/attachments/.
+export function sendSocketMessage(conversationId, content, clientId, attachmentIds = []) {
+  send({ type: 'send_message', conversation_id: conversationId, content: content, client_id: clientId, attachment_ids: attachmentIds });
 }
 
 export function sendTyping(conversationId, isTyping) {
@@ -88,6 +99,27 @@ export function markMessageAsRead(messageId) {
   send({ type: 'mark_read', message_id: messageId });
 }
 
+// Marks every message up to and including `messageId` as read in one receipt.
+export function markReadUpTo(conversationId, messageId) {
+  send({ type: 'mark_read_up_to', conversation_id: conversationId, message_id: messageId });
+}
+
+export function subscribeConversations(conversationIds) {
+  send({ type: 'subscribe_conversations', conversation_ids: conversationIds });
+}
+
+export function unsubscribeConversations(conversationIds) {
+  send({ type: 'unsubscribe_conversations', conversation_ids: conversationIds });
+}
+
+export function subscribePresence(userIds) {
+  send({ type: 'subscribe_presence', user_ids: userIds });
+}
+
+export function unsubscribePresence(userIds) {
+  send({ type: 'unsubscribe_presence', user_ids: userIds });
+}
+
 // --- Event Listeners ---
 
 export function onMessage(callback) {